@@ -1,10 +1,18 @@
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import numpy as np
-from PIL import Image
 import io
 import uuid
+import codecs
+import json
+import base64
+import hashlib
+import asyncio
+import threading
 from datetime import datetime
+from typing import Optional, List, Dict, Any
+from pydantic import BaseModel
 import sys
 import os
 from dotenv import load_dotenv
@@ -24,6 +32,10 @@ from .services.tts_service import CloudTTSService
 from .services.vision_service import VisionService
 from .services.ollama_service import OllamaService
 from .services.story_video_service import StoryVideoService
+from .services.audit_store import get_audit_store
+from .services.executors import run_io, run_cpu, run_model
+from .services import executors, image_ingest, image_pipelines
+from .services.stage_graph import Stage, StageGraph
 
 
 app = FastAPI(title="Nexus AI Healthcare Backend", version="2.0.0")
@@ -53,8 +65,6 @@ vision_service = VisionService()
 ollama_service = OllamaService()
 story_video_service = StoryVideoService()
 
-# In-memory audit log for demo / doctor dashboard
-audit_logs: list[dict] = []
 
 @app.get("/")
 async def root():
@@ -64,6 +74,188 @@ async def root():
 async def health_check():
     return {"status": "healthy", "model": "Seva AI v2.0"}
 
+# Per-stage deadlines (seconds) for the model calls in /api/diagnose
+DIAGNOSE_LLM_TIMEOUT = float(os.getenv("DIAGNOSE_LLM_TIMEOUT", "8"))
+DIAGNOSE_STORY_TIMEOUT = float(os.getenv("DIAGNOSE_STORY_TIMEOUT", "10"))
+
+
+async def _diagnosis_stage(ctx):
+    # In a thread: the first call loads the registry models (TensorFlow import, X-ray inference)
+    return await run_io(fusion_model.predict, ctx["image"], ctx["patient_data"])
+
+
+async def _fairness_stage(ctx):
+    demographics = ctx["patient_data"]["demographics"]
+    return fairness_auditor.audit(demographics["age"], demographics["gender"])
+
+
+async def _loan_stage(ctx):
+    return loan_checker.check_eligibility(ctx["patient_data"]["income"], ctx["diagnosis"]["treatment_cost"])
+
+
+async def _translation_stage(ctx):
+    return await run_model(llm_service.analyze_and_translate, ctx["diagnosis"], ctx["patient_data"], ctx["language"])
+
+
+async def _farm_story_stage(ctx):
+    return await run_model(ollama_service.generate_farm_story, ctx["diagnosis"], ctx["language"])
+
+
+async def _audit_stage(ctx):
+    diagnosis, patient_data = ctx["diagnosis"], ctx["patient_data"]
+    get_audit_store().record(
+        {
+            "patient_id": ctx["patient_id"],
+            "timestamp": ctx["timestamp"],
+            "risk": diagnosis["risk_level"],
+            "risk_score": diagnosis["risk_score"],
+            "confidence": diagnosis["confidence"],
+            "diseases": diagnosis["diseases"],
+            "demographics": patient_data["demographics"],
+            "district": ctx["district"],
+            "symptoms": patient_data["symptoms"],
+        }
+    )
+    try:
+        from .services import analytics
+        await run_io(analytics.record_diagnosis, diagnosis, ctx["district"],
+                     patient_data["demographics"]["age"], ctx["timestamp"])
+    except Exception as e:
+        print(f"⚠️ Analytics rollup update failed: {e}")
+
+
+async def _farm_story_stream_stage(ctx):
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+
+    def emit_token(text):
+        # Tokens that arrive after the stage finished (deadline, fallback) are dropped
+        if not stop.is_set():
+            ctx["emit"]("farmStoryToken", {"text": text})
+
+    def on_token(text):
+        # Called from the io thread
+        loop.call_soon_threadsafe(emit_token, text)
+
+    try:
+        return await run_model(ollama_service.stream_farm_story, ctx["diagnosis"], ctx["language"], on_token, stop)
+    finally:
+        # Done, past the deadline, or the client went away: the io thread stops reading the stream
+        stop.set()
+
+
+async def _triage_stage(ctx):
+    return _triage_fields(ctx)
+
+
+def _diagnose_graph(name, farm_story_stage, extra_stages=()):
+    # The two model calls only need the diagnosis, so they run side by side with the
+    # audit write; when one misses its deadline its template output is used instead
+    return StageGraph(name, [
+        Stage("diagnosis", _diagnosis_stage),
+        Stage("fairness", _fairness_stage),
+        Stage("loan", _loan_stage, after=("diagnosis",)),
+        *extra_stages,
+        Stage("translation", _translation_stage, after=("diagnosis",), timeout=DIAGNOSE_LLM_TIMEOUT,
+              fallback=lambda ctx: llm_service._smart_mock_response(ctx["diagnosis"], ctx["language"])),
+        Stage("farm_story", farm_story_stage, after=("diagnosis",), timeout=DIAGNOSE_STORY_TIMEOUT,
+              fallback=lambda ctx: ollama_service._fallback_story(ctx["diagnosis"], ctx["language"])),
+        Stage("audit", _audit_stage, after=("diagnosis",)),
+    ])
+
+
+diagnose_graph = _diagnose_graph("diagnose", _farm_story_stage)
+# /api/diagnose/stream: triage goes out as soon as the rule-based stages are done, the story token by token
+diagnose_stream_graph = _diagnose_graph("diagnose_stream", _farm_story_stream_stage,
+                                        [Stage("triage", _triage_stage, after=("diagnosis", "fairness", "loan"))])
+
+
+async def _diagnose_context(image, lab_report, glucose, heart_rate, systolic, diastolic, spo2, temperature,
+                            age, gender, symptoms, income, language, district):
+    """Stage graph input for one diagnose request (decodes the image upload)"""
+    image_array = None
+    if image:
+        contents = await image.read()
+        image_array, ingest = await run_io(image_ingest.decode, contents, image_ingest.MAX_SIDES["fusion"])
+        print(f"📷 Image uploaded: {image.filename}, source {ingest['source_size']}, "
+              f"decoded {image_array.shape} in {ingest['decode_ms']} ms")
+    
+    # Mock Lab Report Processing
+    lab_data = {}
+    if lab_report:
+        lab_data['abnormal'] = 'abnormal' in lab_report.filename.lower()
+        print(f"📄 Lab report uploaded: {lab_report.filename}")
+    
+    patient_data = {
+        "vitals": {
+            "glucose": glucose,
+            "heart_rate": heart_rate,
+            "blood_pressure": {"systolic": systolic, "diastolic": diastolic},
+            "spo2": spo2,
+            "temperature": temperature
+        },
+        "demographics": {
+            "age": age,
+            "gender": gender
+        },
+        "symptoms": symptoms,
+        "income": income,
+        "lab_data": lab_data
+    }
+    return {
+        "image": image_array, "patient_data": patient_data, "language": language, "district": district,
+        "patient_id": f"PAT-{uuid.uuid4().hex[:8].upper()}", "timestamp": datetime.now().isoformat(),
+    }
+
+
+def _triage_fields(ctx):
+    """Rule-based part of the diagnose response (everything except the model-written text)"""
+    diagnosis = ctx["diagnosis"]
+    detailed_explanation = []
+    for d in diagnosis['diseases']:
+        detailed_explanation.append(f"- {d['name']} ({int(d['probability']*100)}% confidence)")
+
+    # Extract diet recommendations for Thali (Feature 3)
+    eat_foods = ["bajra roti", "palak sabzi", "dahi", "moong dal"]
+    avoid_foods = ["white chawal", "aloo", "mithai", "tel"]
+    
+    if diagnosis['risk_level'] == 'high':
+        eat_foods = ["khichdi", "dalia", "nimbu pani", "tulsi chai"]
+        avoid_foods = ["heavy food", "spicy", "fried", "cold drinks"]
+
+    return {
+        "patient_id": ctx["patient_id"],
+        "risk": diagnosis['risk_level'],
+        "risk_score": diagnosis['risk_score'],
+        "confidence": diagnosis['confidence'],
+        "triage": diagnosis['triage'],
+        "detailedExplanation": detailed_explanation,
+        "featureImportance": [
+            {"name": k, "value": v, "color": "#3b82f6"}
+            for k, v in diagnosis['feature_importance'].items()
+        ],
+        "diseases": diagnosis['diseases'],
+        "treatmentPlan": diagnosis['treatment_plan'],
+        "fairnessMetrics": ctx["fairness"],
+        "loanEligibility": ctx["loan"],
+        "timestamp": ctx["timestamp"],
+        "recommended_foods": eat_foods,
+        "avoid_foods": avoid_foods,
+        "severity": diagnosis.get('risk_score', 5),
+    }
+
+
+def _explanation_fields(ctx):
+    """LLM-written part of the diagnose response"""
+    translated_analysis = ctx["translation"]
+    return {
+        # Use translated explanation if available
+        "explanation": translated_analysis.get("explanation", ctx["diagnosis"]['risk_level']),
+        "dietTips": translated_analysis.get("diet_tips", []),
+        "medicationGuide": translated_analysis.get("medication_guide", ""),
+    }
+
+
 @app.post("/api/diagnose")
 async def diagnose(
     image: UploadFile = File(None),
@@ -78,110 +270,24 @@ async def diagnose(
     gender: str = Form("Female"),
     symptoms: str = Form(""),
     income: float = Form(25000),
-    language: str = Form("en")
+    language: str = Form("en"),
+    district: str = Form("")
 ):
     try:
         print(f"🔍 Diagnosis request received - Language: {language}, Symptoms: {symptoms}")
-        
-        image_array = None
-        if image:
-            contents = await image.read()
-            pil_image = Image.open(io.BytesIO(contents)).convert('RGB')
-            image_array = np.array(pil_image)
-            print(f"📷 Image uploaded: {image.filename}, shape: {image_array.shape}")
-        
-        # Mock Lab Report Processing
-        lab_data = {}
-        if lab_report:
-            lab_data['abnormal'] = 'abnormal' in lab_report.filename.lower()
-            print(f"📄 Lab report uploaded: {lab_report.filename}")
-        
-        patient_data = {
-            "vitals": {
-                "glucose": glucose,
-                "heart_rate": heart_rate,
-                "blood_pressure": {"systolic": systolic, "diastolic": diastolic},
-                "spo2": spo2,
-                "temperature": temperature
-            },
-            "demographics": {
-                "age": age,
-                "gender": gender
-            },
-            "symptoms": symptoms,
-            "income": income,
-            "lab_data": lab_data
-        }
-        
-        print(f"🏥 Running diagnosis with patient data...")
-        diagnosis = fusion_model.predict(image_array, patient_data)
-        fairness_report = fairness_auditor.audit(age, gender)
-        loan_eligibility = loan_checker.check_eligibility(income, diagnosis["treatment_cost"])
-        
-        print(f"🤖 Running LLM translation to {language}...")
-        translated_analysis = llm_service.analyze_and_translate(diagnosis, patient_data, language)
+        ctx = await _diagnose_context(image, lab_report, glucose, heart_rate, systolic, diastolic, spo2,
+                                      temperature, age, gender, symptoms, income, language, district)
 
-        patient_id = f"PAT-{uuid.uuid4().hex[:8].upper()}"
-        timestamp = datetime.now().isoformat()
+        print(f"🏥 Running diagnosis stages (LLM translation to {language})...")
+        results, stages = await diagnose_graph.run(ctx)
 
-        # Use translated explanation if available
-        explanation = translated_analysis.get("explanation", diagnosis['risk_level'])
-        
-        detailed_explanation = []
-        for d in diagnosis['diseases']:
-            detailed_explanation.append(f"- {d['name']} ({int(d['probability']*100)}% confidence)")
-        
         response = {
-            "patient_id": patient_id,
-            "risk": diagnosis['risk_level'],
-            "risk_score": diagnosis['risk_score'],
-            "confidence": diagnosis['confidence'],
-            "explanation": explanation,
-            "dietTips": translated_analysis.get("diet_tips", []),
-            "medicationGuide": translated_analysis.get("medication_guide", ""),
-            "detailedExplanation": detailed_explanation,
-            "featureImportance": [
-                {"name": k, "value": v, "color": "#3b82f6"}
-                for k, v in diagnosis['feature_importance'].items()
-            ],
-            "diseases": diagnosis['diseases'],
-            "treatmentPlan": diagnosis['treatment_plan'],
-            "fairnessMetrics": fairness_report,
-            "loanEligibility": loan_eligibility,
-            "timestamp": timestamp,
+            **_triage_fields(results),
+            **_explanation_fields(results),
+            "farmStory": results["farm_story"],
+            "stages": stages,
         }
-
-        audit_logs.append(
-            {
-                "patient_id": patient_id,
-                "timestamp": timestamp,
-                "risk": diagnosis["risk_level"],
-                "risk_score": diagnosis["risk_score"],
-                "confidence": diagnosis["confidence"],
-                "diseases": diagnosis["diseases"],
-                "demographics": patient_data["demographics"],
-                "symptoms": symptoms,
-            }
-        )
-        
-        print(f"✅ Diagnosis complete for {patient_id} - Risk: {diagnosis['risk_level']}")
-        # Generate Farm Story using Ollama (Feature 2)
-        farm_story = ollama_service.generate_farm_story(diagnosis, language)
-        
-        # Extract diet recommendations for Thali (Feature 3)
-        eat_foods = ["bajra roti", "palak sabzi", "dahi", "moong dal"]
-        avoid_foods = ["white chawal", "aloo", "mithai", "tel"]
-        
-        if diagnosis['risk_level'] == 'high':
-            eat_foods = ["khichdi", "dalia", "nimbu pani", "tulsi chai"]
-            avoid_foods = ["heavy food", "spicy", "fried", "cold drinks"]
-        
-        # Add farm story and diet to response
-        response["farmStory"] = farm_story
-        response["recommended_foods"] = eat_foods
-        response["avoid_foods"] = avoid_foods
-        response["severity"] = diagnosis.get('risk_score', 5)
-        
+        print(f"✅ Diagnosis complete for {response['patient_id']} - Risk: {response['risk']}")
         return response
         
     except Exception as e:
@@ -198,6 +304,129 @@ async def diagnose(
             "treatmentPlan": {}
         }
 
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/diagnose/stream")
+async def diagnose_stream(
+    image: UploadFile = File(None),
+    lab_report: UploadFile = File(None),
+    glucose: float = Form(120),
+    heart_rate: float = Form(80),
+    systolic: float = Form(120),
+    diastolic: float = Form(80),
+    spo2: float = Form(98),
+    temperature: float = Form(98.6),
+    age: int = Form(45),
+    gender: str = Form("Female"),
+    symptoms: str = Form(""),
+    income: float = Form(25000),
+    language: str = Form("en"),
+    district: str = Form("")
+):
+    """
+    /api/diagnose as server-sent events. `triage` (risk, triage colour, diseases, treatment
+    plan, fairness, loan) is sent as soon as the rule-based stages finish; `explanation`
+    (explanation, dietTips, medicationGuide) and `farmStory` follow when their models
+    answer, with `farmStoryToken` chunks in between while Ollama streams. `done` carries
+    the stage timings; `error` replaces everything after a failure.
+    """
+    try:
+        print(f"🔍 Streaming diagnosis request received - Language: {language}, Symptoms: {symptoms}")
+        ctx = await _diagnose_context(image, lab_report, glucose, heart_rate, systolic, diastolic, spo2,
+                                      temperature, age, gender, symptoms, income, language, district)
+    except Exception as e:
+        print(f"❌ Error in diagnosis: {str(e)}")
+        return {"error": str(e), "patient_id": "ERROR", "risk": "unknown"}
+
+    queue: asyncio.Queue = asyncio.Queue()
+    ctx["emit"] = lambda event, data: queue.put_nowait((event, data))
+
+    def on_stage(name, result, report):
+        if name == "triage":
+            ctx["emit"]("triage", result)
+        elif name == "translation":
+            ctx["emit"]("explanation", {**_explanation_fields(ctx), "status": report["status"]})
+        elif name == "farm_story":
+            ctx["emit"]("farmStory", {"farmStory": result, "status": report["status"]})
+
+    async def run_stages():
+        try:
+            _, stages = await diagnose_stream_graph.run(ctx, on_stage)
+            print(f"✅ Streamed diagnosis complete for {ctx['patient_id']} - Risk: {ctx['diagnosis']['risk_level']}")
+            ctx["emit"]("done", {"patient_id": ctx["patient_id"], "stages": stages})
+        except Exception as e:
+            print(f"❌ Error in streaming diagnosis: {str(e)}")
+            ctx["emit"]("error", {"error": str(e), "patient_id": ctx["patient_id"]})
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        task = asyncio.create_task(run_stages())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # Client went away: stop waiting on the model stages
+            task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+MAX_BATCH_PATIENTS = int(os.getenv("MAX_BATCH_PATIENTS", "100000"))
+
+
+def _score_batch(request: dict) -> dict:
+    columns = ("glucose", "heart_rate", "spo2", "systolic", "lab_abnormal", "images")
+    if any(len(request.get(name) or ()) > MAX_BATCH_PATIENTS for name in columns):
+        raise ValueError(f"At most {MAX_BATCH_PATIENTS} patients per batch")
+    vitals = {name: request[name] for name in columns[:4] if name in request}
+    images = request.get("images")
+    if images is not None:
+        images = [image_ingest.decode(base64.b64decode(data), image_ingest.MAX_SIDES["fusion"])[0] if data else None
+                  for data in images]
+    batch = fusion_model.predict_batch(vitals, images=images, lab_abnormal=request.get("lab_abnormal"))
+
+    codes = list(batch["flags"])
+    flag_rows = np.column_stack([batch["flags"][code] for code in codes]) if batch["count"] else []
+    response = {
+        "count": batch["count"],
+        "patient_ids": request.get("patient_ids"),
+        "risk_score": batch["risk_score"].tolist(),
+        "risk_level": batch["risk_level"].tolist(),
+        "triage_color": batch["triage_color"].tolist(),
+        "confidence": batch["confidence"].tolist(),
+        "treatment_cost": batch["treatment_cost"].tolist(),
+        "icd10": [[code for code, flag in zip(codes, row) if flag] or ["Z00.00"] for row in flag_rows],
+        "summary": {level: int((batch["risk_level"] == level).sum()) for level in ("HIGH", "MEDIUM", "LOW")},
+    }
+    if request.get("detail") == "full":
+        response["predictions"] = fusion_model.batch_rows(batch)
+    return response
+
+
+@app.post("/api/diagnose/batch")
+async def diagnose_batch(request: dict):
+    """
+    Screening-camp triage for many patients in one call. Columnar JSON: glucose, heart_rate,
+    spo2, systolic and lab_abnormal arrays (one entry per patient; missing columns use the
+    single-patient defaults), optional `images` (base64 or null per patient), optional
+    `patient_ids`, and "detail": "full" for the complete per-patient prediction.
+    """
+    try:
+        print("🔍 Batch diagnosis request received")
+        response = await run_io(_score_batch, request)
+        print(f"✅ Batch diagnosis complete for {response['count']} patients - {response['summary']}")
+        return response
+    except Exception as e:
+        print(f"❌ Error in batch diagnosis: {str(e)}")
+        return {"error": str(e), "count": 0}
+
 @app.post("/api/analyze-report")
 async def analyze_medical_report(
     file: UploadFile = File(...),
@@ -252,7 +481,7 @@ async def generate_farm_story(
         if isinstance(diagnosis, str):
             diagnosis = json.loads(diagnosis)
         
-        story = ollama_service.generate_farm_story(diagnosis, language)
+        story = await run_model(ollama_service.generate_farm_story, diagnosis, language)
         
         return {
             "success": True,
@@ -279,7 +508,7 @@ async def generate_story_video(request: dict):
         language = request.get('language', 'en')
         
         # Generate story video using Ollama
-        story_video = story_video_service.generate_story_video(diagnosis, language)
+        story_video = await run_model(story_video_service.generate_story_video, diagnosis, language)
         
         print(f"✅ Story video generated: {story_video.get('title')}")
         
@@ -305,7 +534,7 @@ async def text_to_speech(text: str = Form(...), language: str = Form("en-IN")):
     Convert text to speech using Google Cloud TTS
     Returns base64-encoded MP3 audio
     """
-    result = tts_service.synthesize_speech(text, language)
+    result = await run_model(tts_service.synthesize_speech, text, language)
     return result
 
 @app.get("/api/fairness-report/{demographic}")
@@ -318,14 +547,40 @@ async def get_fairness_report(demographic: str = "all"):
 async def get_audit_logs():
     """Return recent diagnosis audit logs for doctor dashboard."""
     # Return latest first
-    return list(reversed(audit_logs[-50:]))
+    return get_audit_store().recent(50)
+
+
+def _collect_metrics() -> dict:
+    # Opens the vector store and embedding cache on first use, so it runs in run_io
+    from .services.vector_db import get_vector_db, get_embedding_cache, embedding_batcher
+    from .services import medical_db
+    from .models.registry import registry
+    return {
+        "vector_db": get_vector_db().stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "executors": executors.stats(),
+        "sqlite_pool": medical_db.pool.stats(),
+        "history_cache": medical_db.history_cache.stats(),
+        "audit_store": get_audit_store().stats(),
+        "models": registry.stats(),
+        "image_ingest": image_ingest.stats(),
+        "diagnose_stages": diagnose_graph.stats(),
+        "diagnose_stream_stages": diagnose_stream_graph.stats(),
+    }
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime counters for the embedding pipeline, worker pools, stores and models."""
+    return await run_io(_collect_metrics)
 
 
 @app.get("/api/patient/{patient_id}")
 async def get_patient_summary(patient_id: str):
-    for entry in audit_logs:
-        if entry["patient_id"] == patient_id:
-            return entry
+    entry = await run_io(get_audit_store().get_patient, patient_id)
+    if entry is not None:
+        return entry
     return {"error": "Patient not found"}
 
 
@@ -333,28 +588,6 @@ async def get_patient_summary(patient_id: str):
 # MERGED ENDPOINTS — from nexmed_ai and NEXUS_2 projects
 # ═══════════════════════════════════════════════════════════════════
 
-import cv2
-import base64
-import json
-import hashlib
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel
-from scipy.ndimage import sobel
-from scipy.signal import find_peaks
-
-
-def _image_to_base64(img):
-    """Convert OpenCV image to base64 string"""
-    _, buffer = cv2.imencode('.jpg', img)
-    return base64.b64encode(buffer).decode('utf-8')
-
-
-def _read_image_from_upload(file_data):
-    """Convert uploaded file bytes to OpenCV image"""
-    nparr = np.frombuffer(file_data, np.uint8)
-    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-
 # ──────── ANEMIA EYE SCANNER (from nexmed_ai) ────────
 @app.post("/api/anemia-eye-scanner")
 async def anemia_eye_scanner(file: UploadFile = File(...)):
@@ -364,90 +597,7 @@ async def anemia_eye_scanner(file: UploadFile = File(...)):
     """
     try:
         contents = await file.read()
-        img = _read_image_from_upload(contents)
-        if img is None:
-            return {"error": "Failed to process image", "status": "failed"}
-
-        # Image quality check
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        brightness = float(np.mean(gray))
-        laplacian_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-
-        quality_score = "Good"
-        lighting_status = "Optimal"
-        confidence = "High"
-
-        if brightness < 60:
-            lighting_status = "Too Dark - Results may be inaccurate"
-            confidence = "Low"
-        elif brightness > 200:
-            lighting_status = "Too Bright (glare detected)"
-            confidence = "Low"
-        if laplacian_var < 50:
-            quality_score = "Blurry"
-            confidence = "Low"
-
-        # CLAHE enhancement in LAB color space
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        l, a, b_channel = cv2.split(lab)
-        cl = clahe.apply(l)
-        enhanced_img = cv2.cvtColor(cv2.merge((cl, a, b_channel)), cv2.COLOR_LAB2BGR)
-
-        # ROI analysis
-        resize_img = cv2.resize(enhanced_img, (400, 300))
-        h, w = resize_img.shape[:2]
-        roi = resize_img[int(h * 0.3):int(h * 0.7), int(w * 0.25):int(w * 0.75)]
-        b_val, g_val, r_val = cv2.split(roi)
-        red_mean = float(np.mean(r_val))
-        green_mean = float(np.mean(g_val))
-        erythema_index = red_mean - green_mean
-
-        # Diagnostic logic
-        if erythema_index > 45:
-            hemoglobin_status, severity, risk_level, hgb_estimate = "NORMAL (Healthy)", "No pallor detected", "Low", 14.5
-        elif erythema_index > 25:
-            hemoglobin_status, severity, risk_level, hgb_estimate = "MILD / BORDERLINE", "Slight conjunctival pallor", "Medium", 11.2
-        elif erythema_index > 10:
-            hemoglobin_status, severity, risk_level, hgb_estimate = "MODERATE ANEMIA", "Visible pallor - Iron deficiency likely", "High", 9.0
-        else:
-            hemoglobin_status, severity, risk_level, hgb_estimate = "SEVERE ANEMIA", "Critical pallor (Ghostly white)", "Critical", 6.5
-            confidence = "High"
-
-        # Recommendations
-        if hgb_estimate >= 12:
-            recommendations = ["Continue regular health monitoring", "Maintain balanced iron-rich diet", "Annual blood tests recommended"]
-        elif hgb_estimate >= 9:
-            recommendations = ["Increase iron-rich food intake (spinach, meat, beans)", "Consider iron supplements", "Schedule blood test within 1 week"]
-        elif hgb_estimate >= 6:
-            recommendations = ["URGENT: Consult physician immediately", "Prescribed iron supplementation needed", "May require transfusion assessment"]
-        else:
-            recommendations = ["CRITICAL: Emergency medical intervention required", "Likely needs immediate transfusion", "Contact emergency services immediately"]
-
-        # Visualization
-        heatmap_img = resize_img.copy()
-        color = (0, 255, 0) if risk_level == "Low" else (0, 0, 255)
-        cv2.rectangle(heatmap_img, (int(w * 0.25), int(h * 0.3)), (int(w * 0.75), int(h * 0.7)), color, 2)
-        img_str = _image_to_base64(heatmap_img)
-
-        return {
-            "status": "success",
-            "hemoglobin_status": hemoglobin_status,
-            "estimated_hemoglobin": hgb_estimate,
-            "severity": severity,
-            "risk_level": risk_level,
-            "hgb_estimate": hgb_estimate,
-            "confidence_score": confidence,
-            "image_quality": {"lighting": lighting_status, "sharpness": quality_score},
-            "erythema_index": round(erythema_index, 2),
-            "color_analysis": {
-                "red_intensity": round(red_mean, 2),
-                "green_intensity": round(green_mean, 2),
-                "color_ratio": round(red_mean / max(green_mean, 1), 3)
-            },
-            "recommendations": recommendations,
-            "processed_image": img_str
-        }
+        return await run_cpu(image_pipelines.anemia_eye_scan, contents)
     except Exception as e:
         print(f"❌ Anemia scanner error: {e}")
         return {"error": str(e), "status": "failed"}
@@ -547,21 +697,7 @@ async def vein_finder(file: UploadFile = File(...)):
     """
     try:
         contents = await file.read()
-        img = _read_image_from_upload(contents)
-        if img is None:
-            return {"error": "Failed to process image", "status": "failed"}
-
-        img = cv2.resize(img, (600, int(600 * img.shape[0] / img.shape[1])))
-        b, g, r = cv2.split(img)
-        clahe = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(g)
-        enhanced = clahe.apply(enhanced)  # Double pass for X-ray look
-        inverted = cv2.bitwise_not(enhanced)
-        vein_map = cv2.applyColorMap(inverted, cv2.COLORMAP_OCEAN)
-        final_view = cv2.addWeighted(img, 0.6, vein_map, 0.4, 0)
-
-        img_str = _image_to_base64(final_view)
-        return {"status": "success", "image": f"data:image/jpeg;base64,{img_str}"}
+        return await run_cpu(image_pipelines.vein_map, contents)
     except Exception as e:
         print(f"❌ Vein finder error: {e}")
         return {"error": str(e), "status": "failed"}
@@ -575,20 +711,7 @@ async def risk_projection(file: UploadFile = File(...), days: int = Form(7)):
     """
     try:
         contents = await file.read()
-        img = _read_image_from_upload(contents)
-        if img is None:
-            return {"error": "Failed to process image", "status": "failed"}
-
-        rows, cols, _ = img.shape
-        heatmap = np.zeros_like(img)
-        radius = int(min(rows, cols) * (0.1 + (days / 50.0)))
-        cv2.circle(heatmap, (cols // 2, rows // 2), radius, (0, 0, 255), -1)
-        heatmap = cv2.GaussianBlur(heatmap, (101, 101), 0)
-        alpha = min(0.1 + (days / 40.0), 0.8)
-        final_view = cv2.addWeighted(img, 1, heatmap, alpha, 0)
-
-        img_str = _image_to_base64(final_view)
-        return {"status": "success", "image": f"data:image/jpeg;base64,{img_str}", "days": days}
+        return await run_cpu(image_pipelines.risk_projection, contents, days)
     except Exception as e:
         print(f"❌ Risk projection error: {e}")
         return {"error": str(e), "status": "failed"}
@@ -603,53 +726,13 @@ async def xray_analyze(file: UploadFile = File(...), symptoms: str = Form("")):
     """
     try:
         contents = await file.read()
-        img = Image.open(io.BytesIO(contents)).convert('L')
-        img_array = np.array(img)
-
-        # Sobel edge detection
-        dy = sobel(img_array, axis=0)
-        dx = sobel(img_array, axis=1)
-        grad = np.sqrt(dx ** 2 + dy ** 2)
-        row_grad = np.mean(np.abs(dy), axis=1)
-        row_grad = row_grad / np.max(row_grad) if np.max(row_grad) > 0 else row_grad
-
-        peaks, properties = find_peaks(row_grad, prominence=0.15, distance=img.height * 0.03, width=5)
-
-        if len(peaks) > 0:
-            prominences = properties['prominences']
-            sort_idx = np.argsort(prominences)[::-1]
-            peaks = peaks[sort_idx]
-
-        # Attention targets
-        attention_targets = []
-        labels = ["Fracture Site", "Bone Fragment", "Cortical Break"]
-        col_mean = np.mean(img_array, axis=0)
-        bone_center_x = int(np.argmax(col_mean))
-
-        for i, peak_row in enumerate(peaks[:3]):
-            row_slice = np.abs(dy[peak_row, :])
-            edge_peaks, _ = find_peaks(row_slice, prominence=np.max(row_slice) * 0.15 if np.max(row_slice) > 0 else 0.1, distance=30, width=10)
-
-            if len(edge_peaks) >= 2:
-                x = float(np.mean(edge_peaks[:2]))
-            elif len(edge_peaks) == 1:
-                x = float(edge_peaks[0])
-            else:
-                x = float(np.argmax(row_slice)) if np.max(row_slice) > 0 else bone_center_x
-
-            if abs(x - bone_center_x) > img.width * 0.2:
-                x = bone_center_x
-
-            attention_targets.append({
-                "x": round((x / img.width) * 100, 1),
-                "y": round((peak_row / img.height) * 100, 1),
-                "label": labels[i % len(labels)]
-            })
+        scan = await run_cpu(image_pipelines.xray_fracture_scan, contents)
+        fracture_sites = scan["fracture_sites"]
 
-        is_fracture = len(peaks) > 0
-        confidence = 94.2 if not is_fracture else min(99.0, 70 + len(peaks) * 10)
-        diagnosis_text = "No abnormality detected" if not is_fracture else f"Fracture detected ({len(peaks)} potential sites)"
-        is_severe = is_fracture and len(peaks) > 1
+        is_fracture = fracture_sites > 0
+        confidence = 94.2 if not is_fracture else min(99.0, 70 + fracture_sites * 10)
+        diagnosis_text = "No abnormality detected" if not is_fracture else f"Fracture detected ({fracture_sites} potential sites)"
+        is_severe = is_fracture and fracture_sites > 1
 
         # Default precautions
         precautions = []
@@ -665,10 +748,11 @@ async def xray_analyze(file: UploadFile = File(...), symptoms: str = Form("")):
         # Semantic search for similar cases (if vector_db available)
         similar_cases = []
         try:
-            from .services.vector_db import vector_db, generate_embedding
+            from .services.vector_db import get_vector_db, generate_embedding_async
             if symptoms:
-                query_embedding = generate_embedding(symptoms)
-                results = vector_db.search(query_embedding, top_k=3)
+                vector_db = await run_io(get_vector_db)
+                query_embedding = await generate_embedding_async(symptoms)
+                results = await run_io(vector_db.search, query_embedding, top_k=3)
                 for result in results:
                     meta = result["metadata"]
                     similar_cases.append({
@@ -685,8 +769,8 @@ async def xray_analyze(file: UploadFile = File(...), symptoms: str = Form("")):
             "confidence": confidence,
             "is_severe": is_severe,
             "is_fracture": is_fracture,
-            "fracture_sites": len(peaks),
-            "attention_targets": attention_targets,
+            "fracture_sites": fracture_sites,
+            "attention_targets": scan["attention_targets"],
             "precautions": precautions,
             "similar_cases": similar_cases
         }
@@ -807,20 +891,31 @@ async def clinical_intelligence(
 
 
 # ──────── SEMANTIC SEARCH (from NEXUS_2) ────────
+def _search_filters(request: dict) -> dict:
+    """Metadata predicates pushed down into vector_db.search"""
+    return {key: request.get(key) for key in ("patient_id", "type", "doctor_name", "date_from", "date_to")}
+
+
+async def _find_cases(request: dict, text: str, top_k: int):
+    """Vector search, or vector + bm25 rank fusion when the request has mode=hybrid"""
+    from .services.vector_db import get_vector_db, generate_embedding_async
+    # The first call opens the store (memmap, WAL replay); keep that off the event loop
+    vector_db = await run_io(get_vector_db)
+    query_embedding = await generate_embedding_async(text)
+    if request.get("mode", "vector") == "hybrid":
+        return await run_io(vector_db.hybrid_search, text, query_embedding, top_k=top_k,
+                            filters=_search_filters(request))
+    return await run_io(vector_db.search, query_embedding, top_k=top_k, filters=_search_filters(request))
+
+
 @app.post("/api/semantic-search")
 async def semantic_search(request: dict):
     """Search for similar medical cases using vector embeddings"""
     try:
-        from .services.vector_db import vector_db, generate_embedding
         query = request.get("query", "")
         top_k = request.get("top_k", 5)
-        patient_id = request.get("patient_id")
-
-        query_embedding = generate_embedding(query)
-        results = vector_db.search(query_embedding, top_k=top_k)
 
-        if patient_id:
-            results = [r for r in results if r["metadata"].get("patient_id") == patient_id]
+        results = await _find_cases(request, query, top_k)
 
         return {"query": query, "results": results, "count": len(results)}
     except Exception as e:
@@ -833,12 +928,10 @@ async def semantic_search(request: dict):
 async def get_similar_cases(request: dict):
     """Find similar medical cases"""
     try:
-        from .services.vector_db import vector_db, generate_embedding
         symptoms = request.get("symptoms", "")
         top_k = request.get("top_k", 5)
 
-        query_embedding = generate_embedding(symptoms)
-        results = vector_db.search(query_embedding, top_k=top_k)
+        results = await _find_cases(request, symptoms, top_k)
 
         formatted = []
         for r in results:
@@ -859,6 +952,11 @@ async def get_similar_cases(request: dict):
 
 
 # ──────── PRESCRIPTION UPLOAD (from NEXUS_2) ────────
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
 @app.post("/api/prescription/upload")
 async def upload_prescription(
     image: UploadFile = File(...),
@@ -867,43 +965,43 @@ async def upload_prescription(
     hospital_name: str = Form(...),
     diagnosis: str = Form(...),
     symptoms: str = Form(...),
-    medicines: str = Form(...)  # JSON string
+    medicines: str = Form(...),  # JSON string
+    district: str = Form(None)
 ):
     """Upload prescription with medicines and generate embeddings for learning"""
     try:
-        from .services.vector_db import vector_db, generate_embedding
+        from .services.vector_db import (get_vector_db, generate_embedding_async,
+                                         prescription_embedding_text, prescription_metadata)
         from .services import medical_db
 
-        contents = await file.read()
+        contents = await image.read()
 
         # Save image
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         vault_base = os.getenv("VAULT_BASE", "./nexus_vault")
         os.makedirs(f"{vault_base}/prescriptions", exist_ok=True)
         image_path = f"{vault_base}/prescriptions/{patient_id}_{timestamp}.jpg"
-        with open(image_path, "wb") as f:
-            f.write(contents)
+        await run_io(_write_file, image_path, contents)
 
         medicines_list = json.loads(medicines)
         embedding_id = str(uuid.uuid4())
 
         # Store in SQLite
-        medical_db.ensure_patient(patient_id)
-        prescription_id = medical_db.add_prescription(
+        await run_io(medical_db.ensure_patient, patient_id, location=district or None)
+        prescription_id = await run_io(
+            medical_db.add_prescription,
             patient_id, doctor_name, hospital_name,
             diagnosis, symptoms, medicines_list,
             image_path=image_path, embedding_id=embedding_id
         )
 
         # Generate embedding and store in vector DB
-        text_for_embedding = f"Symptoms: {symptoms} Diagnosis: {diagnosis} Medicines: {', '.join([m['name'] for m in medicines_list])}"
-        embedding = generate_embedding(text_for_embedding)
-        vector_db.add(embedding, {
-            "patient_id": patient_id, "diagnosis": diagnosis, "symptoms": symptoms,
-            "medicines": medicines_list, "doctor_name": doctor_name,
-            "date": datetime.now().isoformat(), "type": "prescription",
-            "precautions": [m.get("instructions", "") for m in medicines_list]
-        })
+        text_for_embedding = prescription_embedding_text(symptoms, diagnosis, medicines_list)
+        embedding = await generate_embedding_async(text_for_embedding)
+        vector_db = await run_io(get_vector_db)
+        await run_io(vector_db.add, embedding, prescription_metadata(
+            patient_id, diagnosis, symptoms, medicines_list, doctor_name, datetime.now().isoformat(), embedding_id
+        ))
 
         return {"success": True, "prescription_id": prescription_id, "patient_id": patient_id, "embedding_id": embedding_id}
     except Exception as e:
@@ -911,6 +1009,31 @@ async def upload_prescription(
         return {"success": False, "error": str(e)}
 
 
+# ──────── VECTOR BACKFILL ────────
+@app.post("/api/vector-db/backfill")
+async def start_vector_backfill(request: dict):
+    """Embed SQLite prescriptions/learning data into the vector store in the background"""
+    try:
+        from .services import vector_backfill
+        job = vector_backfill.start_backfill(
+            rebuild=request.get("rebuild", False),
+            page_size=request.get("page_size", 1000),
+            encode_batch_size=request.get("encode_batch_size", 64),
+        )
+        return {"success": True, **job.report()}
+    except Exception as e:
+        print(f"❌ Vector backfill error: {e}")
+        return {"success": False, "error": str(e)}
+
+
+@app.get("/api/vector-db/backfill")
+async def get_vector_backfill():
+    """Progress (rows, rows/sec) of the current or last backfill"""
+    from .services import vector_backfill
+    job = vector_backfill.current_backfill()
+    return job.report() if job else {"state": "idle"}
+
+
 # ──────── MEDICAL HISTORY (from NEXUS_2) ────────
 @app.post("/api/medical-history")
 async def get_medical_history_endpoint(request: dict):
@@ -918,12 +1041,88 @@ async def get_medical_history_endpoint(request: dict):
     try:
         from .services import medical_db
         patient_id = request.get("patient_id", "")
-        history = medical_db.get_medical_history(patient_id)
+        history = await run_io(medical_db.get_medical_history, patient_id)
         return history
     except Exception as e:
         return {"patient_id": request.get("patient_id", ""), "prescriptions": [], "error": str(e)}
 
 
+def _history_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated projection, e.g. ?fields=date,diagnosis,medicines"""
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+@app.get("/api/medical-history/{patient_id}/prescriptions")
+async def get_prescriptions_page(patient_id: str, limit: int = 20, cursor: Optional[str] = None,
+                                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                 fields: Optional[str] = None):
+    """Newest-first page of prescriptions; pass `next_cursor` back as `cursor` for the next page"""
+    try:
+        from .services import medical_db
+        return await run_io(medical_db.get_prescriptions_page, patient_id, limit=limit, cursor=cursor,
+                            date_from=date_from, date_to=date_to, fields=_history_fields(fields))
+    except Exception as e:
+        return {"patient_id": patient_id, "prescriptions": [], "next_cursor": None, "error": str(e)}
+
+
+@app.get("/api/medical-history/{patient_id}/stream")
+async def stream_prescriptions(patient_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                               fields: Optional[str] = None, page_size: int = 100):
+    """NDJSON stream of every prescription (newest first), read one keyset page at a time"""
+    from .services import medical_db
+    projection = _history_fields(fields)
+
+    async def lines():
+        cursor = None
+        try:
+            while True:
+                page = await run_io(medical_db.get_prescriptions_page, patient_id, limit=page_size,
+                                    cursor=cursor, date_from=date_from, date_to=date_to, fields=projection)
+                for prescription in page["prescriptions"]:
+                    yield json.dumps(prescription) + "\n"
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+        except Exception as e:
+            print(f"❌ Medical history stream error: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# ──────── FULL-TEXT SEARCH ────────
+@app.get("/api/search")
+async def text_search(q: str = "", limit: int = 10, cursor: Optional[str] = None,
+                      patient_id: Optional[str] = None, kind: Optional[str] = None):
+    """Ranked full-text search over prescriptions, medicines and learning data (search-as-you-type)"""
+    try:
+        from .services import text_search as fts
+        return await run_io(fts.search, q, limit=limit, cursor=cursor, patient_id=patient_id, kind=kind)
+    except Exception as e:
+        return {"query": q, "results": [], "count": 0, "next_cursor": None, "error": str(e)}
+
+
+# ──────── BULK PRESCRIPTION IMPORT ────────
+@app.post("/api/prescriptions/import")
+async def import_prescriptions(
+    file: UploadFile = File(...),
+    format: str = Form(None),
+    batch_size: int = Form(5000)
+):
+    """Bulk-load a CSV/JSONL file of historical prescriptions (embed afterwards via /api/vector-db/backfill)"""
+    try:
+        from .services import prescription_import
+        fmt = format or prescription_import.detect_format(file.filename or "")
+        # Decode line by line: SpooledTemporaryFile cannot be wrapped in TextIOWrapper on Python 3.9
+        lines = codecs.iterdecode(file.file, "utf-8")
+        report = await run_io(prescription_import.import_prescriptions, lines, fmt, batch_size=batch_size)
+        print(f"📥 Imported {report['imported']} prescriptions ({report['rejected']} rejected)")
+        return {"success": True, **report}
+    except Exception as e:
+        print(f"❌ Prescription import error: {e}")
+        return {"success": False, "error": str(e)}
+
+
 # ──────── SMS GATEWAY (from nexmed_ai) ────────
 @app.post("/api/send-sms")
 async def send_sms(request: dict):
@@ -975,7 +1174,7 @@ async def send_sms(request: dict):
 async def learn_from_data(request: dict):
     """Store user data and generate embeddings for future learning"""
     try:
-        from .services.vector_db import vector_db, generate_embedding
+        from .services.vector_db import get_vector_db, generate_embedding_async, learning_metadata
         from .services import medical_db
 
         patient_id = request.get("patient_id", f"patient_{uuid.uuid4().hex[:8]}")
@@ -984,16 +1183,16 @@ async def learn_from_data(request: dict):
         confidence_val = request.get("confidence", 70.0)
         verified = request.get("verified", False)
 
-        embedding = generate_embedding(input_text)
+        embedding = await generate_embedding_async(input_text)
         embedding_id = str(uuid.uuid4())
 
-        vector_db.add(embedding, {
-            "patient_id": patient_id, "input_text": input_text,
-            "diagnosis": diagnosis, "confidence": confidence_val,
-            "timestamp": datetime.now().isoformat(), "type": "learning_data"
-        })
+        vector_db = await run_io(get_vector_db)
+        await run_io(vector_db.add, embedding, learning_metadata(
+            patient_id, input_text, diagnosis, confidence_val, datetime.now().isoformat(), embedding_id
+        ))
 
-        medical_db.add_learning_data(patient_id, input_text, diagnosis, confidence_val, verified, embedding_id)
+        await run_io(medical_db.add_learning_data, patient_id, input_text, diagnosis, confidence_val,
+                     verified, embedding_id)
 
         return {"success": True, "message": "Learning data stored successfully", "embedding_id": embedding_id}
     except Exception as e:
@@ -1001,6 +1200,41 @@ async def learn_from_data(request: dict):
         return {"success": False, "error": str(e)}
 
 
+@app.get("/api/analytics/dashboard")
+async def analytics_dashboard(district: Optional[str] = None, weeks: int = 12):
+    """Diagnosis and prescription counts by ICD-10 code, risk level, age band and week."""
+    try:
+        from .services import analytics
+        return await run_io(analytics.dashboard, district, max(1, min(weeks, 104)))
+    except Exception as e:
+        print(f"❌ Analytics dashboard error: {e}")
+        return {"error": str(e)}
+
+
+@app.on_event("startup")
+async def open_stores():
+    # Databases are created and migrated here rather than at import time
+    from .services import medical_db
+    await run_io(medical_db.init_database)
+    await run_io(get_audit_store)
+    from .services.vector_db import get_vector_db, StoreLockedError
+    try:
+        # Warm the vector store so the first search does not pay for opening it
+        await run_io(get_vector_db)
+    except StoreLockedError as e:
+        # A second worker (or the backfill CLI) holds the store: refuse to start rather
+        # than serve without vector search
+        print(f"❌ {e}")
+        raise
+    except Exception as e:
+        print(f"⚠️ Vector DB not loaded at startup: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    executors.shutdown()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
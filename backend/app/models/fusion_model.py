@@ -1,7 +1,48 @@
-﻿import numpy as np
+﻿import os
+import logging
+import numpy as np
 import cv2
 from sklearn.ensemble import GradientBoostingClassifier
 
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Images per forward pass of the chest X-ray model (CPU)
+XRAY_BATCH_SIZE = int(os.getenv("XRAY_BATCH_SIZE", "32"))
+
+# Risk level -> (triage colour, confidence, action)
+TRIAGE = {
+    'HIGH': ('RED', 0.89, "Immediate Hospitalization"),
+    'MEDIUM': ('YELLOW', 0.76, "Specialist Consultation"),
+    'LOW': ('GREEN', 0.94, "Routine Checkup"),
+}
+
+DISEASES = {
+    "J15.9": {"name": "Community Acquired Pneumonia", "probability": 0.87, "icd10": "J15.9"},
+    "E11.65": {"name": "Type 2 Diabetes - Uncontrolled", "probability": 0.92, "icd10": "E11.65"},
+    "E11.9": {"name": "Type 2 Diabetes Mellitus", "probability": 0.82, "icd10": "E11.9"},
+    "I10": {"name": "Essential Hypertension", "probability": 0.85, "icd10": "I10"},
+    "R09.02": {"name": "Hypoxemia / Respiratory Insufficiency", "probability": 0.91, "icd10": "R09.02"},
+    "Z00.00": {"name": "No Acute Pathology", "probability": 0.94, "icd10": "Z00.00"},
+}
+# Order diseases are listed in a prediction
+DISEASE_ORDER = ("J15.9", "E11.65", "E11.9", "I10", "R09.02")
+
+RISK_LEVELS = np.array(['LOW', 'MEDIUM', 'HIGH'])
+
+# Columns accepted by predict_batch and their scalar-path defaults
+BATCH_DEFAULTS = {"glucose": 120, "heart_rate": 80, "spo2": 98, "systolic": 120}
+
+# diabetes_model feature names (feature_names_in_, lower-cased) we can fill from vitals
+FEATURE_COLUMNS = {
+    "glucose": "glucose", "blood_glucose": "glucose",
+    "heart_rate": "heart_rate", "heartrate": "heart_rate",
+    "spo2": "spo2",
+    "systolic": "systolic", "systolic_bp": "systolic", "bloodpressure": "systolic", "blood_pressure": "systolic",
+}
+
+
 class MultiModalFusion:
     def __init__(self):
         self.tabular_model = GradientBoostingClassifier(
@@ -20,17 +61,65 @@ class MultiModalFusion:
             return img
         return None
     
-    def predict(self, image, patient_data):
-        # Image risk
+    def image_risks(self, images):
+        """
+        Image risk per entry (0.12 without an image): from the chest X-ray model, run in
+        batches on CPU, when it is available, otherwise from image brightness
+        """
+        risks = np.full(len(images), 0.12)
+        present = [i for i, image in enumerate(images) if image is not None]
+        if not present:
+            return risks
+        model = registry.get("chest_xray_model")
+        if model is not None:
+            try:
+                risks[present] = 0.3 + self._xray_probabilities(model, [images[i] for i in present]) * 0.5
+                return risks
+            except Exception as e:
+                logger.error(f"Chest X-ray model inference failed, using brightness: {e}")
+        for i in present:
+            risks[i] = self.image_risk(images[i])
+        return risks
+
+    def _xray_probabilities(self, model, images):
+        probabilities = []
+        for start in range(0, len(images), XRAY_BATCH_SIZE):
+            chunk = [cv2.cvtColor(image, cv2.COLOR_GRAY2RGB) if image.ndim == 2 else image
+                     for image in images[start:start + XRAY_BATCH_SIZE]]
+            inputs = np.stack([self.preprocess_image(image) for image in chunk]).astype(np.float32)
+            outputs = np.asarray(model.predict(inputs, verbose=0), dtype=np.float64)
+            probabilities.append(outputs.reshape(len(chunk), -1)[:, -1])
+        return np.concatenate(probabilities)
+
+    def diabetes_probabilities(self, columns):
+        """diabetes_model probability per patient (columns of values or scalars), or None when unavailable"""
+        model = registry.get("diabetes_model")
+        names = getattr(model, "feature_names_in_", None)
+        if model is None or names is None or not hasattr(model, "predict_proba"):
+            return None
+        sources = [FEATURE_COLUMNS.get(str(name).lower()) for name in names]
+        if None in sources:
+            return None
+        import pandas as pd
+        features = pd.DataFrame({name: np.atleast_1d(np.asarray(columns[source], dtype=np.float64))
+                                 for name, source in zip(names, sources)})
+        return np.asarray(model.predict_proba(features), dtype=np.float64)[:, -1]
+
+    @staticmethod
+    def image_risk(image):
+        """Brightness heuristic used when the X-ray model is unavailable"""
         if image is not None:
             if len(image.shape) == 3:
                 gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
             else:
                 gray = image
             mean_brightness = np.mean(gray)
-            image_risk = 0.3 + (mean_brightness / 255) * 0.5
-        else:
-            image_risk = 0.12
+            return 0.3 + (mean_brightness / 255) * 0.5
+        return 0.12
+
+    def predict(self, image, patient_data):
+        # Image risk
+        image_risk = float(self.image_risks([image])[0])
         
         # Get vitals
         glucose = patient_data['vitals'].get('glucose', 120)
@@ -78,38 +167,39 @@ class MultiModalFusion:
         # Risk level & Triage
         if fusion_score > 0.6:
             risk_level = 'HIGH'
-            triage_color = 'RED'
-            confidence = 0.89
-            action = "Immediate Hospitalization"
         elif fusion_score > 0.35:
             risk_level = 'MEDIUM'
-            triage_color = 'YELLOW'
-            confidence = 0.76
-            action = "Specialist Consultation"
         else:
             risk_level = 'LOW'
-            triage_color = 'GREEN'
-            confidence = 0.94
-            action = "Routine Checkup"
         
         # Diseases
-        diseases = []
+        flags = set()
         if image is not None and fusion_score > 0.6:
-            diseases.append({"name": "Community Acquired Pneumonia", "probability": 0.87, "icd10": "J15.9"})
+            flags.add("J15.9")
         if glucose > 200:
-            diseases.append({"name": "Type 2 Diabetes - Uncontrolled", "probability": 0.92, "icd10": "E11.65"})
+            flags.add("E11.65")
         elif glucose > 126:
-            diseases.append({"name": "Type 2 Diabetes Mellitus", "probability": 0.82, "icd10": "E11.9"})
+            flags.add("E11.9")
         
         sys_bp = patient_data['vitals']['blood_pressure']['systolic']
         if sys_bp > 140:
-             diseases.append({"name": "Essential Hypertension", "probability": 0.85, "icd10": "I10"})
+             flags.add("I10")
              
         if spo2 < 90:
-             diseases.append({"name": "Hypoxemia / Respiratory Insufficiency", "probability": 0.91, "icd10": "R09.02"})
+             flags.add("R09.02")
+
+        diabetes = self.diabetes_probabilities({"glucose": glucose, "heart_rate": heart_rate, "spo2": spo2,
+                                                "systolic": sys_bp})
+        return self._assemble(risk_level, fusion_score, flags, image_risk, glucose_risk, heart_risk, spo2_risk, sys_bp,
+                              None if diabetes is None else float(diabetes[0]))
 
+    def _assemble(self, risk_level, fusion_score, flags, image_risk, glucose_risk, heart_risk, spo2_risk, sys_bp,
+                  diabetes_probability=None):
+        """Full prediction for one patient from its scores (shared by predict and predict_batch)"""
+        triage_color, confidence, action = TRIAGE[risk_level]
+        diseases = [dict(DISEASES[code]) for code in DISEASE_ORDER if code in flags]
         if not diseases:
-            diseases.append({"name": "No Acute Pathology", "probability": 0.94, "icd10": "Z00.00"})
+            diseases.append(dict(DISEASES["Z00.00"]))
         
         # Feature importance
         feature_importance = {
@@ -167,7 +257,7 @@ class MultiModalFusion:
             }
         }
         
-        return {
+        prediction = {
             "risk_score": float(fusion_score),
             "risk_level": risk_level,
             "triage": {"color": triage_color, "action": action},
@@ -177,3 +267,91 @@ class MultiModalFusion:
             "treatment_plan": treatment_plan,
             "treatment_cost": treatment_plan['cost_estimate']['total']
         }
+        if diabetes_probability is not None:
+            prediction["model_scores"] = {"diabetes_probability": round(diabetes_probability, 4)}
+        return prediction
+
+    def predict_batch(self, vitals, images=None, lab_abnormal=None):
+        """
+        Score many patients at once. `vitals` maps glucose, heart_rate, spo2 and systolic
+        to equal-length sequences (missing columns take the same defaults as predict);
+        `images` is an optional list with an array or None per patient. Returns columns
+        (NumPy arrays) that match predict() patient by patient; batch_row() expands one
+        patient into the full predict() result.
+        """
+        columns = {name: np.asarray(vitals[name], dtype=np.float64) for name in BATCH_DEFAULTS if name in vitals}
+        sizes = {len(column) for column in columns.values()}
+        if images is not None:
+            sizes.add(len(images))
+        if lab_abnormal is not None:
+            sizes.add(len(lab_abnormal))
+        if len(sizes) > 1:
+            raise ValueError("All batch columns must have the same length")
+        n = sizes.pop() if sizes else 0
+        for name, default in BATCH_DEFAULTS.items():
+            if name not in columns:
+                columns[name] = np.full(n, default, dtype=np.float64)
+        glucose, heart_rate, spo2, systolic = (columns[name] for name in ("glucose", "heart_rate", "spo2", "systolic"))
+
+        has_image = np.array([image is not None for image in images], dtype=bool) if images else np.zeros(n, dtype=bool)
+        image_risk = self.image_risks(images) if images else np.full(n, 0.12)
+
+        # Same thresholds, comparison order and NaN behaviour as the ladders in predict
+        glucose_risk = np.select([glucose < 100, glucose < 126, glucose < 200], [0.10, 0.35, 0.70], 0.90)
+        heart_risk = np.select([heart_rate <= 100, heart_rate <= 120, heart_rate <= 140], [0.10, 0.45, 0.70], 0.90)
+        spo2_risk = np.select([spo2 >= 95, spo2 >= 90, spo2 >= 80], [0.10, 0.60, 0.85], 0.98)
+        lab_risk = np.where(np.asarray(lab_abnormal, dtype=bool), 0.6, 0.0) if lab_abnormal is not None else np.zeros(n)
+
+        fusion_score = (image_risk * 0.35 + glucose_risk * 0.25 + heart_risk * 0.15 + spo2_risk * 0.15 + lab_risk * 0.1)
+        level = np.select([fusion_score > 0.6, fusion_score > 0.35], [2, 1], 0)
+        high, medium = level == 2, level == 1
+
+        flags = {
+            "J15.9": has_image & high,
+            "E11.65": glucose > 200,
+            "E11.9": ~(glucose > 200) & (glucose > 126),
+            "I10": systolic > 140,
+            "R09.02": spo2 < 90,
+        }
+        medications = 2 * flags["J15.9"] + (flags["E11.65"] | flags["E11.9"]) + flags["I10"]
+        medications = np.where(medications == 0, 1, medications)
+        medication_cost = medications * 150 * np.where(high, 30, 10)
+        lab_tests = np.where(high, 2500, np.where(medium, 800, 0))
+
+        risk_level = RISK_LEVELS[level]
+        return {
+            "count": n,
+            "risk_score": fusion_score,
+            "risk_level": risk_level,
+            "triage_color": np.array([TRIAGE[name][0] for name in RISK_LEVELS])[level],
+            "confidence": np.array([TRIAGE[name][1] for name in RISK_LEVELS])[level],
+            "flags": flags,
+            "treatment_cost": 500 + medication_cost + lab_tests,
+            "image_risk": image_risk,
+            "glucose_risk": glucose_risk,
+            "heart_risk": heart_risk,
+            "spo2_risk": spo2_risk,
+            "systolic": systolic,
+            "diabetes_probability": self.diabetes_probabilities(columns) if n else None,
+        }
+
+    def batch_row(self, batch, i):
+        """The predict() result for patient `i` of a predict_batch() result"""
+        flags = {code for code, column in batch["flags"].items() if column[i]}
+        diabetes = batch["diabetes_probability"]
+        return self._assemble(str(batch["risk_level"][i]), float(batch["risk_score"][i]), flags,
+                              float(batch["image_risk"][i]), float(batch["glucose_risk"][i]),
+                              float(batch["heart_risk"][i]), float(batch["spo2_risk"][i]),
+                              float(batch["systolic"][i]), None if diabetes is None else float(diabetes[i]))
+
+    def batch_rows(self, batch):
+        """predict() results for every patient of a predict_batch() result, in order"""
+        codes = list(batch["flags"])
+        flag_rows = zip(*(batch["flags"][code].tolist() for code in codes)) if codes else ()
+        diabetes = batch["diabetes_probability"]
+        columns = zip(batch["risk_level"].tolist(), batch["risk_score"].tolist(), flag_rows,
+                      batch["image_risk"].tolist(), batch["glucose_risk"].tolist(), batch["heart_risk"].tolist(),
+                      batch["spo2_risk"].tolist(), batch["systolic"].tolist(),
+                      diabetes.tolist() if diabetes is not None else [None] * batch["count"])
+        return [self._assemble(level, score, {code for code, flag in zip(codes, flags) if flag}, *risks)
+                for level, score, flags, *risks in columns]
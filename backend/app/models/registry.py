@@ -0,0 +1,127 @@
+"""
+Model Registry — Lazy loading of the artifacts in ml_models/.
+Each model is loaded on first use, once per process. joblib artifacts are opened with
+mmap_mode="r", so their NumPy arrays are file-backed pages shared by every worker
+process instead of a private copy per worker. A model that fails to load (missing
+file, placeholder content, framework not installed) is reported as unavailable and
+callers fall back to the rule-based path. `stats()` reports load time and the resident
+memory each load added.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _default_model_dir() -> str:
+    # Docker mounts ml_models/ next to the app; in a checkout it sits beside backend/
+    for candidate in (os.path.join(_BACKEND_DIR, "ml_models"), os.path.join(os.path.dirname(_BACKEND_DIR), "ml_models")):
+        if os.path.isdir(candidate):
+            return candidate
+    return os.path.join(_BACKEND_DIR, "ml_models")
+
+
+MODEL_DIR = os.getenv("ML_MODELS_DIR") or _default_model_dir()
+
+
+def _resident_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def load_joblib(path: str):
+    return joblib.load(path, mmap_mode="r")
+
+
+def load_keras(path: str):
+    from tensorflow import keras  # optional dependency, only needed for the X-ray model
+    return keras.models.load_model(path, compile=False)
+
+
+class ModelEntry:
+    def __init__(self, name: str, filename: str, loader: Callable[[str], Any]):
+        self.name = name
+        self.filename = filename
+        self.loader = loader
+        self.model = None
+        self.status = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_ms: Optional[float] = None
+        self.rss_delta_bytes: Optional[int] = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self._entries: Dict[str, ModelEntry] = {}
+
+    def register(self, name: str, filename: str, loader: Callable[[str], Any] = load_joblib):
+        self._entries[name] = ModelEntry(name, filename, loader)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.model_dir, self._entries[name].filename)
+
+    def get(self, name: str):
+        """The loaded model, or None if it is unavailable (the failure is logged once)"""
+        entry = self._entries[name]
+        if entry.status == "not_loaded":
+            with entry.lock:
+                if entry.status == "not_loaded":
+                    self._load(entry)
+        return entry.model
+
+    def _load(self, entry: ModelEntry):
+        path = self.path(entry.name)
+        rss_before = _resident_bytes()
+        started = time.perf_counter()
+        try:
+            model = entry.loader(path)
+        except Exception as e:
+            entry.status = "unavailable"
+            entry.error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Model {entry.name} unavailable ({path}): {entry.error}")
+            return
+        entry.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        rss_after = _resident_bytes()
+        if rss_before is not None and rss_after is not None:
+            entry.rss_delta_bytes = rss_after - rss_before
+        entry.model = model
+        entry.status = "loaded"
+        logger.info(f"Loaded model {entry.name} in {entry.load_ms} ms")
+
+    def reload(self, name: str):
+        """Drop a model (loaded or failed) so the next get() loads it again"""
+        entry = self._entries[name]
+        with entry.lock:
+            entry.model, entry.status, entry.error = None, "not_loaded", None
+            entry.load_ms = entry.rss_delta_bytes = None
+
+    def stats(self) -> Dict[str, Any]:
+        report = {}
+        for name, entry in self._entries.items():
+            path = self.path(name)
+            report[name] = {
+                "status": entry.status,
+                "path": path,
+                "file_bytes": os.path.getsize(path) if os.path.exists(path) else None,
+                "load_ms": entry.load_ms,
+                "rss_delta_bytes": entry.rss_delta_bytes,
+                "error": entry.error,
+            }
+        return report
+
+
+registry = ModelRegistry(MODEL_DIR)
+registry.register("chest_xray_model", "chest_xray_model.h5", load_keras)
+registry.register("diabetes_model", "diabetes_model.pkl")
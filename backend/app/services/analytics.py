@@ -0,0 +1,177 @@
+"""
+Analytics — District-level population rollups for the dashboard.
+Two rollup tables in medical_history.db hold running counts, so dashboard queries read
+a few hundred aggregate rows instead of grouping the full history on every load:
+
+  diagnosis_rollup     (district, week, icd10, risk_level, age_band) -> count
+                       one row per predicted disease, updated by record_diagnosis()
+                       from the diagnose endpoint; only summed per ICD-10 code
+  diagnosis_case_rollup (district, week, risk_level, age_band) -> count
+                       one row per diagnosis, for the risk/age/week totals (a
+                       diagnosis with several codes is still one case)
+  prescription_rollup  (district, week, diagnosis, age_band) -> count
+                       maintained by triggers on prescriptions (insert/update/delete)
+
+`week` is the Monday of the ISO week (YYYY-MM-DD); age bands and the SQL used by the
+triggers live in migrations.py. The district is the patient's location.
+
+Rebuild the tables from the source data (after a backfill or a schema change):
+    python -m app.services.analytics rebuild
+"""
+import json
+import logging
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from . import medical_db
+from .migrations import AGE_BANDS, PRESCRIPTION_ROLLUP_REBUILD
+
+logger = logging.getLogger(__name__)
+
+UNSPECIFIED_CODE = "unspecified"
+DEFAULT_WEEKS = 12
+TOP_DIAGNOSES = 20
+
+
+def age_band(age) -> str:
+    """Same bands as migrations.age_band_sql"""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    for low, label in AGE_BANDS:
+        if age >= low:
+            return label
+    return "unknown"
+
+
+def week_start(timestamp: str) -> str:
+    """Same as migrations.week_sql: Monday of the timestamp's week"""
+    try:
+        day = date.fromisoformat(str(timestamp)[:10])
+    except ValueError:
+        return "unknown"
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def diagnosis_keys(diagnosis: Dict[str, Any], district: Optional[str], age, timestamp: str) -> List[tuple]:
+    """Rollup keys for one fusion_model.predict result (one per distinct ICD-10 code)"""
+    codes = sorted({d.get("icd10") or UNSPECIFIED_CODE for d in diagnosis.get("diseases") or []})
+    base = ((district or "").strip(), week_start(timestamp))
+    tail = (str(diagnosis.get("risk_level") or "unknown"), age_band(age))
+    return [base + (code,) + tail for code in codes or [UNSPECIFIED_CODE]]
+
+
+def case_key(key: tuple) -> tuple:
+    """diagnosis_case_rollup key from a diagnosis_rollup key (drops the ICD-10 code)"""
+    return key[:2] + key[3:]
+
+
+def record_diagnosis(diagnosis: Dict[str, Any], district: Optional[str], age, timestamp: str):
+    """Count one diagnosis in diagnosis_rollup (per code) and diagnosis_case_rollup (once)"""
+    keys = diagnosis_keys(diagnosis, district, age, timestamp)
+    with medical_db.get_pool().write() as conn:
+        conn.executemany('''INSERT INTO diagnosis_rollup (district, week, icd10, risk_level, age_band, count)
+                            VALUES (?, ?, ?, ?, ?, 1)
+                            ON CONFLICT(district, week, icd10, risk_level, age_band)
+                            DO UPDATE SET count = count + 1''', keys)
+        conn.execute('''INSERT INTO diagnosis_case_rollup (district, week, risk_level, age_band, count)
+                        VALUES (?, ?, ?, ?, 1)
+                        ON CONFLICT(district, week, risk_level, age_band)
+                        DO UPDATE SET count = count + 1''', case_key(keys[0]))
+
+
+def _grouped(conn, table: str, column: str, where: str, params: list, limit: Optional[int] = None):
+    sql = f'''SELECT {column}, SUM(count) AS n FROM {table} WHERE {where}
+              GROUP BY {column} ORDER BY {"n DESC" if limit else column}'''
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return [{column: value, "count": n} for value, n in conn.execute(sql, params).fetchall()]
+
+
+def dashboard(district: Optional[str] = None, weeks: int = DEFAULT_WEEKS) -> Dict[str, Any]:
+    """Aggregates for the last `weeks` weeks, for one district or all of them"""
+    since = week_start((datetime.now() - timedelta(weeks=max(weeks, 1) - 1)).isoformat())
+    clauses, params = ["week >= ?"], [since]
+    if district is not None:
+        clauses.insert(0, "district = ?")
+        params.insert(0, district)
+    where = " AND ".join(clauses)
+
+    with medical_db.get_pool().connection() as conn:
+        return {
+            "district": district,
+            "since": since,
+            "diagnoses": {
+                "by_icd10": _grouped(conn, "diagnosis_rollup", "icd10", where, params),
+                "by_risk_level": _grouped(conn, "diagnosis_case_rollup", "risk_level", where, params),
+                "by_age_band": _grouped(conn, "diagnosis_case_rollup", "age_band", where, params),
+                "by_week": _grouped(conn, "diagnosis_case_rollup", "week", where, params),
+            },
+            "prescriptions": {
+                "by_diagnosis": _grouped(conn, "prescription_rollup", "diagnosis", where, params, TOP_DIAGNOSES),
+                "by_age_band": _grouped(conn, "prescription_rollup", "age_band", where, params),
+                "by_week": _grouped(conn, "prescription_rollup", "week", where, params),
+            },
+            "districts": [row[0] for row in conn.execute(
+                "SELECT DISTINCT district FROM diagnosis_rollup UNION SELECT DISTINCT district FROM prescription_rollup "
+                "ORDER BY 1").fetchall()],
+        }
+
+
+def rebuild() -> Dict[str, int]:
+    """
+    Recompute the rollups from prescriptions and the diagnosis audit log. Diagnoses
+    still queued in another process's audit writer when this runs are not counted.
+    """
+    from .audit_store import get_audit_store
+
+    counts: Counter = Counter()
+    cases: Counter = Counter()
+    diagnoses = 0
+    for entry in get_audit_store().iter_entries():
+        demographics = entry.get("demographics") or {}
+        keys = diagnosis_keys({"diseases": entry.get("diseases"), "risk_level": entry.get("risk")},
+                              entry.get("district"), demographics.get("age"), entry.get("timestamp", ""))
+        for key in keys:
+            counts[key] += 1
+        cases[case_key(keys[0])] += 1
+        diagnoses += 1
+
+    with medical_db.get_pool().write() as conn:
+        conn.execute("DELETE FROM diagnosis_rollup")
+        conn.executemany('''INSERT INTO diagnosis_rollup (district, week, icd10, risk_level, age_band, count)
+                            VALUES (?, ?, ?, ?, ?, ?)''', [key + (n,) for key, n in counts.items()])
+        conn.execute("DELETE FROM diagnosis_case_rollup")
+        conn.executemany('''INSERT INTO diagnosis_case_rollup (district, week, risk_level, age_band, count)
+                            VALUES (?, ?, ?, ?, ?)''', [key + (n,) for key, n in cases.items()])
+        conn.execute("DELETE FROM prescription_rollup")
+        conn.execute(PRESCRIPTION_ROLLUP_REBUILD)
+        prescription_rows = conn.execute("SELECT COUNT(*) FROM prescription_rollup").fetchone()[0]
+
+    report = {"diagnoses": diagnoses, "diagnosis_rollup_rows": len(counts),
+              "diagnosis_case_rollup_rows": len(cases), "prescription_rollup_rows": prescription_rows}
+    logger.info(f"Rebuilt analytics rollups: {report}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Population analytics rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recompute the rollup tables from the source data")
+    show = sub.add_parser("dashboard", help="print the dashboard aggregates")
+    show.add_argument("--district")
+    show.add_argument("--weeks", type=int, default=DEFAULT_WEEKS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "rebuild":
+        print(json.dumps(rebuild(), indent=2))
+    else:
+        print(json.dumps(dashboard(args.district, args.weeks), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+ANN Index — Inverted-file (IVF) approximate nearest-neighbour index in NumPy.
+Spherical k-means centroids partition the normalized rows of a VectorStore; a query
+only scores the rows in its `nprobe` closest partitions.
+"""
+import os
+import logging
+import threading
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class IVFIndex:
+    """
+    Inverted-file index over cosine similarity.
+
+    `nlist` controls the number of partitions (defaults to ~2*sqrt(n) at training
+    time) and `nprobe` how many of them a query scans: raising nprobe trades latency
+    for recall. Rows added after training are assigned to their nearest centroid,
+    and the index should be retrained (`needs_training`) once the store has grown
+    `retrain_factor` times. Training is O(N); the owner runs it on a fresh copy
+    (`untrained_copy`) off its lock and swaps the result in.
+    """
+
+    def __init__(self, path: str, nlist: Optional[int] = None, nprobe: int = 16,
+                 min_train_size: int = 4096, retrain_factor: int = 4, load: bool = True):
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+
+        self.centroids = None
+        self.trained_size = 0
+        self.count = 0          # rows [0, count) of the store are assigned
+        self._lists = []
+        self._sizes = None
+        self._save_lock = threading.Lock()
+        if load:
+            self.load()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def stats(self) -> dict:
+        sizes = self._sizes if self._sizes is not None else np.zeros(0)
+        return {
+            "type": "ivf",
+            "trained": self.is_trained,
+            "nlist": len(sizes),
+            "nprobe": self.nprobe,
+            "indexed_rows": self.count,
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+        }
+
+    # ── Training ──
+    def train(self, matrix: np.ndarray, iterations: int = 10, seed: int = 42):
+        """Cluster `matrix` (normalized rows) and assign every row to a list"""
+        n = len(matrix)
+        nlist = self.nlist or int(np.clip(2 * np.sqrt(n), 16, 4096))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, max(nlist * 64, 10000))
+        sample = np.asarray(matrix[np.sort(rng.choice(n, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty clusters from random sample rows
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self._lists = [np.empty(16, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+        self.count = 0
+        self.trained_size = n
+        self.add(matrix, 0)
+        logger.info(f"IVF index trained: {n} rows, {nlist} lists")
+
+    def needs_training(self, n: int) -> bool:
+        """Whether a store of `n` rows has crossed the (re)training thresholds"""
+        if n < self.min_train_size:
+            return False
+        return not self.is_trained or n >= self.trained_size * self.retrain_factor
+
+    def untrained_copy(self) -> "IVFIndex":
+        """Empty index with the same settings and file, to train and then swap in"""
+        return IVFIndex(self.path, nlist=self.nlist, nprobe=self.nprobe, min_train_size=self.min_train_size,
+                        retrain_factor=self.retrain_factor, load=False)
+
+    # ── Inserts ──
+    def add(self, matrix: np.ndarray, start: int, chunk_size: int = 65536):
+        """Assign rows [start, len(matrix)) to their nearest centroid"""
+        if not self.is_trained:
+            return
+        for chunk_start in range(start, len(matrix), chunk_size):
+            rows = np.asarray(matrix[chunk_start:chunk_start + chunk_size])
+            assign = np.argmax(rows @ self.centroids.T, axis=1)
+            row_ids = np.arange(chunk_start, chunk_start + len(rows), dtype=np.int64)
+            order = np.argsort(assign, kind="stable")
+            lists, bounds = np.unique(assign[order], return_index=True)
+            for list_id, ids in zip(lists, np.split(row_ids[order], bounds[1:])):
+                self._append(int(list_id), ids)
+        self.count = len(matrix)
+
+    def _append(self, list_id: int, ids: np.ndarray):
+        size = self._sizes[list_id]
+        buf = self._lists[list_id]
+        if size + len(ids) > len(buf):
+            grown = np.empty(max(len(buf) * 2, size + len(ids)), dtype=np.int64)
+            grown[:size] = buf[:size]
+            self._lists[list_id] = buf = grown
+        buf[size:size + len(ids)] = ids
+        self._sizes[list_id] = size + len(ids)
+
+    # ── Search ──
+    def candidates(self, query: np.ndarray, total_rows: int, nprobe: Optional[int] = None) -> np.ndarray:
+        """Sorted row ids in the `nprobe` lists closest to a normalized query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = top_k_indices(self.centroids @ query, nprobe)
+        ids = np.concatenate([self._lists[i][:self._sizes[i]] for i in probe])
+        # Rows appended since the last assignment are scanned exactly
+        if self.count < total_rows:
+            ids = np.concatenate([ids, np.arange(self.count, total_rows, dtype=np.int64)])
+        ids.sort()
+        # Lists can already hold rows past a reader's snapshot of the store
+        return ids[:np.searchsorted(ids, total_rows)]
+
+    def search(self, query: np.ndarray, matrix: np.ndarray, top_k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k row ids and their cosine similarities for a normalized query"""
+        ids = self.candidates(query, len(matrix), nprobe)
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        scores = matrix[ids] @ query
+        best = top_k_indices(scores, top_k)
+        return ids[best], scores[best]
+
+    # ── Persistence ──
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Consistent view of the lists for `save`, O(nlist) so it can be taken under the
+        caller's lock. List buffers are only appended past their size or replaced when
+        they grow, so the referenced prefixes never change afterwards.
+        """
+        if not self.is_trained:
+            return None
+        return {"centroids": self.centroids, "lists": list(self._lists), "sizes": self._sizes.copy(),
+                "count": self.count, "trained_size": self.trained_size}
+
+    def save(self, snapshot: Optional[Dict[str, Any]] = None):
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        if snapshot is None:
+            return
+        with self._save_lock:
+            if snapshot["centroids"] is not self.centroids:
+                return  # retrained since the snapshot, which saved the newer lists
+            sizes = snapshot["sizes"]
+            offsets = np.concatenate([[0], np.cumsum(sizes)])
+            ids = np.concatenate([snapshot["lists"][i][:sizes[i]] for i in range(len(sizes))])
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(tmp_path, centroids=snapshot["centroids"], ids=ids, offsets=offsets,
+                     count=snapshot["count"], trained_size=snapshot["trained_size"])
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                self.centroids = data["centroids"]
+                ids, offsets = data["ids"], data["offsets"]
+                self.count = int(data["count"])
+                self.trained_size = int(data["trained_size"])
+            self._sizes = np.diff(offsets)
+            self._lists = [ids[offsets[i]:offsets[i + 1]].copy() for i in range(len(self._sizes))]
+            logger.info(f"IVF index loaded: {self.count} rows, {len(self._sizes)} lists")
+        except Exception as e:
+            logger.error(f"Failed to load IVF index, it will be retrained: {e}")
+            self.reset()
+
+    def reset(self):
+        self.centroids = None
+        self._lists = []
+        self._sizes = None
+        self.count = 0
+        self.trained_size = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,169 @@
+"""
+Audit Store — Durable diagnosis audit log for the doctor dashboard.
+Entries are appended to an in-memory ring (served by /api/audit-logs) and queued for a
+background writer that inserts them into SQLite in batches. The table is indexed by
+patient_id and by timestamp, so patient lookups are index seeks and memory stays flat
+however long the process runs.
+"""
+import os
+import json
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Iterator, List, Optional
+
+from .sqlite_pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+VAULT_BASE = os.getenv("VAULT_BASE", "./nexus_vault")
+AUDIT_DB_PATH = f"{VAULT_BASE}/audit_log.db"
+AUDIT_RING_SIZE = int(os.getenv("AUDIT_RING_SIZE", "200"))
+AUDIT_FLUSH_BATCH = int(os.getenv("AUDIT_FLUSH_BATCH", "256"))
+AUDIT_FLUSH_MS = float(os.getenv("AUDIT_FLUSH_MS", "200"))
+
+
+class AuditStore:
+    """
+    The ring is warmed from the newest rows on startup. With several workers, each ring
+    holds that worker's recent writes on top of the warm start; patient lookups always
+    go to the shared database.
+    """
+
+    def __init__(self, path: str, ring_size: int = 200, flush_batch: int = 256, flush_interval_ms: float = 200):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.pool = SQLitePool(path, size=4, cache_size_mb=8, mmap_size_mb=64)
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.ring: deque = deque(maxlen=ring_size)
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+        with self.pool.write() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS audit_log
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             patient_id TEXT NOT NULL,
+                             timestamp TEXT NOT NULL,
+                             risk TEXT,
+                             risk_score REAL,
+                             entry TEXT NOT NULL)''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_patient ON audit_log(patient_id, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp)")
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT entry FROM audit_log ORDER BY id DESC LIMIT ?", (ring_size,)).fetchall()
+        self.ring.extend(json.loads(row[0]) for row in reversed(rows))
+
+        self._writer = threading.Thread(target=self._writer_loop, name="audit-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def record(self, entry: Dict[str, Any]):
+        """Constant-time append; the row reaches SQLite with the next batch"""
+        with self._lock:
+            self.ring.append(entry)
+            self._pending.append(entry)
+            if len(self._pending) >= self.flush_batch:
+                self._wakeup.set()
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest first"""
+        with self._lock:
+            entries = list(self.ring)
+        return entries[::-1][:limit]
+
+    def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Latest entry for a patient (recent and unflushed entries from memory, then the patient_id index)"""
+        with self._lock:
+            for entry in reversed(self._pending):
+                if entry.get("patient_id") == patient_id:
+                    return entry
+            for entry in reversed(self.ring):
+                if entry.get("patient_id") == patient_id:
+                    return entry
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT entry FROM audit_log WHERE patient_id = ?
+                                  ORDER BY timestamp DESC LIMIT 1''', (patient_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def between(self, start: str, end: str, limit: int = 500) -> List[Dict[str, Any]]:
+        """Entries with start <= timestamp < end, newest first (timestamp index range scan)"""
+        self.flush()
+        with self.pool.connection() as conn:
+            rows = conn.execute('''SELECT entry FROM audit_log WHERE timestamp >= ? AND timestamp < ?
+                                   ORDER BY timestamp DESC LIMIT ?''', (start, end, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_entries(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Every stored entry, oldest first, read in id-ordered pages"""
+        self.flush()
+        last_id = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute("SELECT id, entry FROM audit_log WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for _, entry in rows:
+                yield json.loads(entry)
+            last_id = rows[-1][0]
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            with self.pool.write() as conn:
+                conn.executemany('''INSERT INTO audit_log (patient_id, timestamp, risk, risk_score, entry)
+                                    VALUES (?, ?, ?, ?, ?)''',
+                                 [(e.get("patient_id", ""), e.get("timestamp", ""), e.get("risk"),
+                                   e.get("risk_score"), json.dumps(e, default=str)) for e in batch])
+        except Exception as e:
+            logger.error(f"Audit log flush of {len(batch)} entries failed, will retry: {e}")
+            self.failed_flushes += 1
+            with self._lock:
+                self._pending[:0] = batch
+            return
+        self.written += len(batch)
+        self.flushes += 1
+
+    def _writer_loop(self):
+        while True:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ring_entries": len(self.ring),
+            "pending": len(self._pending),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+# Singleton instance, opened on first use
+_audit_store: Optional[AuditStore] = None
+_audit_store_lock = threading.Lock()
+
+
+def get_audit_store() -> AuditStore:
+    global _audit_store
+    if _audit_store is None:
+        with _audit_store_lock:
+            if _audit_store is None:
+                _audit_store = AuditStore(AUDIT_DB_PATH, ring_size=AUDIT_RING_SIZE, flush_batch=AUDIT_FLUSH_BATCH,
+                                          flush_interval_ms=AUDIT_FLUSH_MS)
+    return _audit_store
+
+
+def __getattr__(name):
+    if name == "audit_store":
+        return get_audit_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
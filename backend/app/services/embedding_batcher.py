@@ -0,0 +1,127 @@
+"""
+Embedding Batcher — Coalesces concurrent embedding requests into single encoder batches.
+A worker thread waits up to `max_wait_ms` after the first request for more to arrive,
+encodes up to `max_batch_size` texts in one call and resolves each caller's future.
+"""
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+
+def _bucket(size: int) -> str:
+    """Power-of-two histogram bucket label for a batch size"""
+    low = 1 << (size.bit_length() - 1)
+    high = (low << 1) - 1
+    return str(low) if low == high else f"{low}-{high}"
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode_batch: Callable[[List[str]], Any],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._requests = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._histogram: Dict[str, int] = {}
+        self._queue_wait_total = 0.0
+        self._encode_total = 0.0
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding; the future resolves to its embedding as a list"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def embed_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._encode(batch)
+            except Exception as e:
+                # Never let one batch end the worker; every later embed would hang
+                logger.error(f"Embedding batcher error on a batch of {len(batch)}: {e}")
+
+    def _encode(self, batch: list):
+        started = time.perf_counter()
+        # Callers cancelled while queued (wait_for timeout, client disconnect) are dropped;
+        # the rest are marked running so a later cancel() can no longer race set_result
+        live = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if live:
+            try:
+                embeddings = self.encode_batch([text for text, _, _ in live])
+                for (_, future, _), embedding in zip(live, embeddings):
+                    future.set_result(embedding.tolist())
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(live)} failed: {e}")
+                for _, future, _ in live:
+                    if not future.done():
+                        future.set_exception(e)
+        self._record(batch, started, time.perf_counter())
+
+    def _record(self, batch: list, started: float, finished: float):
+        size = len(batch)
+        with self._lock:
+            self._requests += size
+            self._batches += 1
+            self._largest_batch = max(self._largest_batch, size)
+            label = _bucket(size)
+            self._histogram[label] = self._histogram.get(label, 0) + 1
+            self._queue_wait_total += sum(started - queued for _, _, queued in batch)
+            self._encode_total += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = max(self._batches, 1)
+            requests = max(self._requests, 1)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "requests": self._requests,
+                "batches": self._batches,
+                "pending": self._queue.qsize(),
+                "avg_batch_size": round(self._requests / batches, 2),
+                "largest_batch": self._largest_batch,
+                "batch_size_histogram": dict(sorted(self._histogram.items(), key=lambda kv: int(kv[0].split("-")[0]))),
+                "avg_queue_wait_ms": round(self._queue_wait_total / requests * 1000, 3),
+                "avg_encode_ms": round(self._encode_total / batches * 1000, 3),
+            }
@@ -0,0 +1,102 @@
+"""
+Embedding Cache — Bounded in-memory LRU in front of a persistent SQLite store.
+Keys are a hash of the model name and the normalized text, so switching models
+never serves stale vectors.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share a key"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str, capacity: int = 10000):
+        self.path = path
+        self.model_name = model_name
+        self.capacity = capacity
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS embeddings
+                            (key TEXT PRIMARY KEY,
+                             model TEXT,
+                             vector BLOB)''')
+        self._conn.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self.disk_hits += 1
+            self._remember(key, vector)
+            return vector.tolist()
+
+    def put(self, text: str, embedding: List[float]):
+        key = self.key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                                   (key, self.model_name, vector.tobytes()))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist cached embedding: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model": self.model_name,
+                "capacity": self.capacity,
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,155 @@
+"""
+Executors — Bounded worker pools for blocking work called from async endpoints.
+`run_io` hands network/disk calls (SQLite, vector search, file writes) to a thread
+pool; `run_model` gives slow model calls (LLM, Ollama, TTS) a pool of their own, so
+calls abandoned at a stage deadline keep running there without starving `run_io`;
+`run_cpu` sends picklable, GIL-holding work (OpenCV/SciPy image pipelines) to a
+process pool. Each pool tracks queue depth and time spent waiting for a worker, so
+saturation shows up in /api/metrics before latency does.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "8"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict) -> Tuple[float, float, Any]:
+    """Runs in the worker (thread or child process): wall-clock start/end around fn"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, time.time(), result
+
+
+class ManagedPool:
+    """
+    Wraps an executor with a fixed worker count and records per-call queue wait
+    (submit -> start) and run time (start -> finish). The executor is created on
+    first use, so importing this module never forks or spawns anything.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int):
+        self.name = name
+        self.workers = workers
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._factory()
+                    logger.info(f"Started {self.name} pool with {self.workers} workers")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker"""
+        return max(0, self.running - self.workers)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        submitted_at = time.time()
+        with self._lock:
+            self.submitted += 1
+            self.running += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        future = self.executor.submit(_timed_call, fn, args, kwargs)
+        try:
+            started, finished, result = await asyncio.wrap_future(future)
+        except BaseException as e:
+            with self._lock:
+                self.failed += 1
+                self.running -= 1
+                if isinstance(e, BrokenProcessPool) and self._executor is not None:
+                    # A crashed worker poisons the whole pool; start a fresh one next call
+                    logger.error(f"{self.name} pool broke ({e}); restarting on next submit")
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            raise
+        wait_ms = max(0.0, started - submitted_at) * 1000
+        with self._lock:
+            self.completed += 1
+            self.running -= 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.total_run_ms += (finished - started) * 1000
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.completed or 1
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.running,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": round(self.total_wait_ms / done, 2),
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "avg_run_ms": round(self.total_run_ms / done, 2),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+io_pool = ManagedPool(
+    "io", lambda: ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io"), IO_WORKERS)
+
+model_pool = ManagedPool(
+    "model", lambda: ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model"), MODEL_WORKERS)
+
+# "spawn" keeps children clear of the parent's threads (WAL compactor, embedding batcher)
+cpu_pool = ManagedPool(
+    "cpu", lambda: ProcessPoolExecutor(max_workers=CPU_WORKERS,
+                                       mp_context=multiprocessing.get_context("spawn")), CPU_WORKERS)
+
+
+async def run_io(fn: Callable, *args, **kwargs):
+    """Run a blocking network/disk call without stalling the event loop"""
+    return await io_pool.run(fn, *args, **kwargs)
+
+
+async def run_model(fn: Callable, *args, **kwargs):
+    """Run a slow, blocking model call (LLM, Ollama, TTS) on the bounded model pool"""
+    return await model_pool.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable, *args, **kwargs):
+    """Run a CPU-bound, picklable module-level function in a worker process"""
+    return await cpu_pool.run(fn, *args, **kwargs)
+
+
+def stats() -> Dict[str, Any]:
+    return {"io": io_pool.stats(), "model": model_pool.stats(), "cpu": cpu_pool.stats()}
+
+
+def shutdown():
+    io_pool.shutdown()
+    model_pool.shutdown()
+    cpu_pool.shutdown()
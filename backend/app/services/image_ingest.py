@@ -0,0 +1,125 @@
+"""
+Image Ingest — Decode uploads at the resolution each consumer actually uses.
+A 12 MP phone photo is ~36 MB of RGB once decoded, while the fusion model only needs a
+224px view and the scanners work on a few hundred pixels. JPEGs are decoded with PIL
+draft mode, which lets libjpeg scale by 1/2, 1/4 or 1/8 inside the DCT, so the full
+resolution image is never materialized; other formats are decoded and then reduced.
+The header is checked against MAX_IMAGE_PIXELS before any pixel data is decoded.
+
+Counters (decode time, bytes not materialized) are per process: /api/metrics shows the
+API process, and the scanner pipelines also return their own `ingest` report.
+"""
+import io
+import os
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))
+
+# Longest side each consumer works at
+MAX_SIDES = {
+    "fusion": 256,       # brightness + 224x224 X-ray model input
+    "anemia": 800,       # ROI is analysed at 400x300
+    "vein": 800,         # resized to 600px wide (portrait 3:4 included)
+    "projection": 1024,  # returned to the browser as a JPEG
+    "xray": 1600,        # Sobel row profile, keeps thin cortical lines
+    "vision": 1536,      # sent to Gemini, which tiles at 768px
+}
+
+_CHANNELS = {"L": 1, "RGB": 3, "BGR": 3}
+
+_lock = threading.Lock()
+_counters = {
+    "decodes": 0,
+    "draft_decodes": 0,
+    "rejected": 0,
+    "failed": 0,
+    "decode_ms": 0.0,
+    "source_bytes": 0,
+    "decoded_bytes": 0,
+}
+
+
+def _record(**deltas):
+    with _lock:
+        for key, delta in deltas.items():
+            _counters[key] += delta
+
+
+def load(data: bytes, max_side: int, mode: str = "RGB") -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    PIL image (mode "L" or "RGB") whose longest side is at most `max_side`, and a report
+    of the decode. Raises ValueError over the pixel limit and OSError for undecodable data.
+    """
+    started = time.perf_counter()
+    pil_mode = "L" if mode == "L" else "RGB"
+    try:
+        img = Image.open(io.BytesIO(data))
+    except OSError:
+        _record(failed=1)
+        raise
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS:
+        _record(rejected=1)
+        logger.warning(f"Rejected {width}x{height} upload (MAX_IMAGE_PIXELS={MAX_IMAGE_PIXELS})")
+        raise ValueError(f"Image is {width}x{height}, over the {MAX_IMAGE_PIXELS} pixel limit")
+
+    scale = max_side / max(width, height)
+    if scale < 1:
+        # JPEG only (a no-op elsewhere): picks the smallest DCT scale still >= the request
+        img.draft(pil_mode, (math.ceil(width * scale), math.ceil(height * scale)))
+    drafted = img.size != (width, height)
+    try:
+        img = img.convert(pil_mode)
+    except OSError:
+        _record(failed=1)
+        raise
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+
+    channels = _CHANNELS[mode]
+    source_bytes = width * height * channels
+    decoded_bytes = img.width * img.height * channels
+    decode_ms = (time.perf_counter() - started) * 1000
+    _record(decodes=1, draft_decodes=int(drafted), decode_ms=decode_ms,
+            source_bytes=source_bytes, decoded_bytes=decoded_bytes)
+    return img, {
+        "source_size": [width, height],
+        "decoded_size": [img.width, img.height],
+        "draft": drafted,
+        "decode_ms": round(decode_ms, 2),
+        "bytes_saved": source_bytes - decoded_bytes,
+    }
+
+
+def decode(data: bytes, max_side: int, mode: str = "RGB") -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Like `load`, as a NumPy array; mode "BGR" gives OpenCV channel order"""
+    img, report = load(data, max_side, mode)
+    array = np.array(img)
+    if mode == "BGR":
+        array = np.ascontiguousarray(array[:, :, ::-1])
+    return array, report
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        counters = dict(_counters)
+    done = counters["decodes"] or 1
+    return {
+        "max_image_pixels": MAX_IMAGE_PIXELS,
+        "decodes": counters["decodes"],
+        "draft_decodes": counters["draft_decodes"],
+        "rejected": counters["rejected"],
+        "failed": counters["failed"],
+        "avg_decode_ms": round(counters["decode_ms"] / done, 2),
+        "decoded_mb": round(counters["decoded_bytes"] / 1e6, 1),
+        "saved_mb": round((counters["source_bytes"] - counters["decoded_bytes"]) / 1e6, 1),
+    }
@@ -0,0 +1,200 @@
+"""
+Image Pipelines — OpenCV/SciPy analysis behind the scanner endpoints.
+Each pipeline takes the raw upload bytes and returns a JSON-ready dict, so it can be
+shipped to a worker process with executors.run_cpu instead of running on the event loop.
+Uploads are decoded through image_ingest at the size each pipeline works at, and the
+decode report is returned under `ingest`.
+"""
+import base64
+import cv2
+import numpy as np
+from scipy.ndimage import sobel
+from scipy.signal import find_peaks
+
+from . import image_ingest
+
+
+def image_to_base64(img):
+    """Convert OpenCV image to base64 string"""
+    _, buffer = cv2.imencode('.jpg', img)
+    return base64.b64encode(buffer).decode('utf-8')
+
+
+def read_image_from_upload(file_data, max_side: int = image_ingest.MAX_SIDES["projection"]):
+    """Convert uploaded file bytes to an OpenCV (BGR) image, downscaled on decode; (None, None) if undecodable"""
+    try:
+        return image_ingest.decode(file_data, max_side, "BGR")
+    except OSError:
+        return None, None
+
+
+def anemia_eye_scan(contents: bytes) -> dict:
+    """Conjunctiva pallor estimate via CLAHE + LAB color space"""
+    img, ingest = read_image_from_upload(contents, image_ingest.MAX_SIDES["anemia"])
+    if img is None:
+        return {"error": "Failed to process image", "status": "failed"}
+
+    # Image quality check
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    brightness = float(np.mean(gray))
+    laplacian_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    quality_score = "Good"
+    lighting_status = "Optimal"
+    confidence = "High"
+
+    if brightness < 60:
+        lighting_status = "Too Dark - Results may be inaccurate"
+        confidence = "Low"
+    elif brightness > 200:
+        lighting_status = "Too Bright (glare detected)"
+        confidence = "Low"
+    if laplacian_var < 50:
+        quality_score = "Blurry"
+        confidence = "Low"
+
+    # CLAHE enhancement in LAB color space
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    l, a, b_channel = cv2.split(lab)
+    cl = clahe.apply(l)
+    enhanced_img = cv2.cvtColor(cv2.merge((cl, a, b_channel)), cv2.COLOR_LAB2BGR)
+
+    # ROI analysis
+    resize_img = cv2.resize(enhanced_img, (400, 300))
+    h, w = resize_img.shape[:2]
+    roi = resize_img[int(h * 0.3):int(h * 0.7), int(w * 0.25):int(w * 0.75)]
+    b_val, g_val, r_val = cv2.split(roi)
+    red_mean = float(np.mean(r_val))
+    green_mean = float(np.mean(g_val))
+    erythema_index = red_mean - green_mean
+
+    # Diagnostic logic
+    if erythema_index > 45:
+        hemoglobin_status, severity, risk_level, hgb_estimate = "NORMAL (Healthy)", "No pallor detected", "Low", 14.5
+    elif erythema_index > 25:
+        hemoglobin_status, severity, risk_level, hgb_estimate = "MILD / BORDERLINE", "Slight conjunctival pallor", "Medium", 11.2
+    elif erythema_index > 10:
+        hemoglobin_status, severity, risk_level, hgb_estimate = "MODERATE ANEMIA", "Visible pallor - Iron deficiency likely", "High", 9.0
+    else:
+        hemoglobin_status, severity, risk_level, hgb_estimate = "SEVERE ANEMIA", "Critical pallor (Ghostly white)", "Critical", 6.5
+        confidence = "High"
+
+    # Recommendations
+    if hgb_estimate >= 12:
+        recommendations = ["Continue regular health monitoring", "Maintain balanced iron-rich diet", "Annual blood tests recommended"]
+    elif hgb_estimate >= 9:
+        recommendations = ["Increase iron-rich food intake (spinach, meat, beans)", "Consider iron supplements", "Schedule blood test within 1 week"]
+    elif hgb_estimate >= 6:
+        recommendations = ["URGENT: Consult physician immediately", "Prescribed iron supplementation needed", "May require transfusion assessment"]
+    else:
+        recommendations = ["CRITICAL: Emergency medical intervention required", "Likely needs immediate transfusion", "Contact emergency services immediately"]
+
+    # Visualization
+    heatmap_img = resize_img.copy()
+    color = (0, 255, 0) if risk_level == "Low" else (0, 0, 255)
+    cv2.rectangle(heatmap_img, (int(w * 0.25), int(h * 0.3)), (int(w * 0.75), int(h * 0.7)), color, 2)
+    img_str = image_to_base64(heatmap_img)
+
+    return {
+        "status": "success",
+        "hemoglobin_status": hemoglobin_status,
+        "estimated_hemoglobin": hgb_estimate,
+        "severity": severity,
+        "risk_level": risk_level,
+        "hgb_estimate": hgb_estimate,
+        "confidence_score": confidence,
+        "image_quality": {"lighting": lighting_status, "sharpness": quality_score},
+        "erythema_index": round(erythema_index, 2),
+        "color_analysis": {
+            "red_intensity": round(red_mean, 2),
+            "green_intensity": round(green_mean, 2),
+            "color_ratio": round(red_mean / max(green_mean, 1), 3)
+        },
+        "recommendations": recommendations,
+        "processed_image": img_str,
+        "ingest": ingest
+    }
+
+
+def vein_map(contents: bytes) -> dict:
+    """Near-infrared style vein visualization from the green channel"""
+    img, ingest = read_image_from_upload(contents, image_ingest.MAX_SIDES["vein"])
+    if img is None:
+        return {"error": "Failed to process image", "status": "failed"}
+
+    img = cv2.resize(img, (600, int(600 * img.shape[0] / img.shape[1])))
+    b, g, r = cv2.split(img)
+    clahe = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(8, 8))
+    enhanced = clahe.apply(g)
+    enhanced = clahe.apply(enhanced)  # Double pass for X-ray look
+    inverted = cv2.bitwise_not(enhanced)
+    vein_overlay = cv2.applyColorMap(inverted, cv2.COLORMAP_OCEAN)
+    final_view = cv2.addWeighted(img, 0.6, vein_overlay, 0.4, 0)
+
+    img_str = image_to_base64(final_view)
+    return {"status": "success", "image": f"data:image/jpeg;base64,{img_str}", "ingest": ingest}
+
+
+def risk_projection(contents: bytes, days: int) -> dict:
+    """Heatmap that spreads from the image center as `days` grows"""
+    img, ingest = read_image_from_upload(contents, image_ingest.MAX_SIDES["projection"])
+    if img is None:
+        return {"error": "Failed to process image", "status": "failed"}
+
+    rows, cols, _ = img.shape
+    heatmap = np.zeros_like(img)
+    radius = int(min(rows, cols) * (0.1 + (days / 50.0)))
+    cv2.circle(heatmap, (cols // 2, rows // 2), radius, (0, 0, 255), -1)
+    heatmap = cv2.GaussianBlur(heatmap, (101, 101), 0)
+    alpha = min(0.1 + (days / 40.0), 0.8)
+    final_view = cv2.addWeighted(img, 1, heatmap, alpha, 0)
+
+    img_str = image_to_base64(final_view)
+    return {"status": "success", "image": f"data:image/jpeg;base64,{img_str}", "days": days, "ingest": ingest}
+
+
+def xray_fracture_scan(contents: bytes) -> dict:
+    """Sobel edge rows + peak analysis; returns fracture sites and attention targets"""
+    img, ingest = image_ingest.load(contents, image_ingest.MAX_SIDES["xray"], "L")
+    img_array = np.array(img)
+
+    # Sobel edge detection
+    dy = sobel(img_array, axis=0)
+    row_grad = np.mean(np.abs(dy), axis=1)
+    row_grad = row_grad / np.max(row_grad) if np.max(row_grad) > 0 else row_grad
+
+    peaks, properties = find_peaks(row_grad, prominence=0.15, distance=img.height * 0.03, width=5)
+
+    if len(peaks) > 0:
+        prominences = properties['prominences']
+        sort_idx = np.argsort(prominences)[::-1]
+        peaks = peaks[sort_idx]
+
+    # Attention targets
+    attention_targets = []
+    labels = ["Fracture Site", "Bone Fragment", "Cortical Break"]
+    col_mean = np.mean(img_array, axis=0)
+    bone_center_x = int(np.argmax(col_mean))
+
+    for i, peak_row in enumerate(peaks[:3]):
+        row_slice = np.abs(dy[peak_row, :])
+        edge_peaks, _ = find_peaks(row_slice, prominence=np.max(row_slice) * 0.15 if np.max(row_slice) > 0 else 0.1, distance=30, width=10)
+
+        if len(edge_peaks) >= 2:
+            x = float(np.mean(edge_peaks[:2]))
+        elif len(edge_peaks) == 1:
+            x = float(edge_peaks[0])
+        else:
+            x = float(np.argmax(row_slice)) if np.max(row_slice) > 0 else bone_center_x
+
+        if abs(x - bone_center_x) > img.width * 0.2:
+            x = bone_center_x
+
+        attention_targets.append({
+            "x": round((x / img.width) * 100, 1),
+            "y": round((peak_row / img.height) * 100, 1),
+            "label": labels[i % len(labels)]
+        })
+
+    return {"fracture_sites": int(len(peaks)), "attention_targets": attention_targets, "ingest": ingest}
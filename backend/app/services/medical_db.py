@@ -3,192 +3,178 @@ Medical Database Service — SQLite-based patient records, prescriptions, and le
 Ported from NEXUS_2 backend.
 """
 import os
+import json
+import base64
 import sqlite3
 import uuid
 import logging
+import threading
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
+from . import migrations
+from .sqlite_pool import SQLitePool
+from .ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 VAULT_BASE = os.getenv("VAULT_BASE", "./nexus_vault")
-os.makedirs(f"{VAULT_BASE}/prescriptions", exist_ok=True)
-os.makedirs(f"{VAULT_BASE}/records", exist_ok=True)
-
 DB_PATH = f"{VAULT_BASE}/medical_history.db"
 
+# Connection pool tuning (WAL mode lets reads proceed while a write is in flight)
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "32"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+# Assembled histories for the patients the dashboard keeps polling; every write below
+# invalidates its patient, the TTL covers writes made by other worker processes
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "256"))
+HISTORY_CACHE_TTL_S = float(os.getenv("HISTORY_CACHE_TTL_S", "30"))
+
+history_cache = TTLCache(HISTORY_CACHE_SIZE, HISTORY_CACHE_TTL_S)
+
+_pool: Optional[SQLitePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SQLitePool:
+    """The shared connection pool, created (and the schema migrated) on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                os.makedirs(f"{VAULT_BASE}/prescriptions", exist_ok=True)
+                os.makedirs(f"{VAULT_BASE}/records", exist_ok=True)
+                pool = SQLitePool(DB_PATH, size=SQLITE_POOL_SIZE, cache_size_mb=SQLITE_CACHE_MB,
+                                  mmap_size_mb=SQLITE_MMAP_MB)
+                migrations.migrate(pool)
+                _pool = pool
+    return _pool
+
+
+def __getattr__(name):
+    # `medical_db.pool` stays available without opening the database at import time
+    if name == "pool":
+        return get_pool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    """Standalone connection with the pool's pragmas, for long-running jobs (caller closes it)"""
+    return get_pool().connect()
 
 
 def init_database():
-    """Initialize SQLite database for medical history"""
-    conn = get_connection()
-    c = conn.cursor()
-
-    c.execute('''CREATE TABLE IF NOT EXISTS patients
-                (patient_id TEXT PRIMARY KEY,
-                 name TEXT,
-                 age INTEGER,
-                 gender TEXT,
-                 location TEXT,
-                 created_date TEXT,
-                 last_visit TEXT)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS prescriptions
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 patient_id TEXT,
-                 doctor_name TEXT,
-                 hospital_name TEXT,
-                 date TEXT,
-                 diagnosis TEXT,
-                 symptoms TEXT,
-                 duration_days INTEGER,
-                 follow_up_date TEXT,
-                 image_path TEXT,
-                 embedding_id TEXT,
-                 FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS medicines
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 prescription_id INTEGER,
-                 name TEXT,
-                 dosage TEXT,
-                 frequency TEXT,
-                 duration TEXT,
-                 instructions TEXT,
-                 FOREIGN KEY(prescription_id) REFERENCES prescriptions(id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS allergies
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 patient_id TEXT,
-                 allergen TEXT,
-                 reaction TEXT,
-                 severity TEXT,
-                 date_diagnosed TEXT,
-                 FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS chronic_conditions
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 patient_id TEXT,
-                 condition_name TEXT,
-                 diagnosed_date TEXT,
-                 status TEXT,
-                 notes TEXT,
-                 FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS learning_data
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 patient_id TEXT,
-                 input_text TEXT,
-                 diagnosis TEXT,
-                 confidence REAL,
-                 verified BOOLEAN,
-                 usage_count INTEGER DEFAULT 0,
-                 timestamp TEXT,
-                 embedding_id TEXT UNIQUE,
-                 FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''')
-
-    conn.commit()
-    conn.close()
+    """Open the database and apply pending schema migrations (called at app startup)"""
+    get_pool()
     logger.info("Medical database initialized successfully")
 
 
-def ensure_patient(patient_id: str, name: str = None, age: int = None, gender: str = None):
-    """Create or update patient record"""
-    conn = get_connection()
-    c = conn.cursor()
+def ensure_patient(patient_id: str, name: str = None, age: int = None, gender: str = None,
+                   location: str = None):
+    """Create or update patient record (details not passed keep their stored values)"""
     now = datetime.now().isoformat()
-    c.execute('''INSERT OR REPLACE INTO patients
-                (patient_id, name, age, gender, created_date, last_visit)
-                VALUES (?, ?, ?, ?, ?, ?)''',
-              (patient_id, name or "Unknown", age, gender, now, now))
-    conn.commit()
-    conn.close()
+    with get_pool().write() as conn:
+        conn.execute('''INSERT INTO patients
+                        (patient_id, name, age, gender, location, created_date, last_visit)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(patient_id) DO UPDATE SET
+                            name = CASE WHEN excluded.name != 'Unknown' THEN excluded.name ELSE patients.name END,
+                            age = COALESCE(excluded.age, patients.age),
+                            gender = COALESCE(excluded.gender, patients.gender),
+                            location = COALESCE(excluded.location, patients.location),
+                            last_visit = excluded.last_visit''',
+                     (patient_id, name or "Unknown", age, gender, location, now, now))
+    history_cache.invalidate(patient_id)
 
 
 def add_prescription(patient_id: str, doctor_name: str, hospital_name: str,
                      diagnosis: str, symptoms: str, medicines_list: List[Dict],
                      duration_days: int = 7, image_path: str = None, embedding_id: str = None):
     """Store a prescription with medicines"""
-    conn = get_connection()
-    c = conn.cursor()
     now = datetime.now().isoformat()
-
-    c.execute('''INSERT INTO prescriptions
-                (patient_id, doctor_name, hospital_name, date,
-                 diagnosis, symptoms, duration_days, image_path, embedding_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (patient_id, doctor_name, hospital_name, now,
-               diagnosis, symptoms, duration_days, image_path, embedding_id))
-    prescription_id = c.lastrowid
-
-    for med in medicines_list:
-        c.execute('''INSERT INTO medicines
-                    (prescription_id, name, dosage, frequency, duration, instructions)
-                    VALUES (?, ?, ?, ?, ?, ?)''',
-                  (prescription_id, med.get("name", ""), med.get("dosage", ""),
-                   med.get("frequency", ""), med.get("duration", ""), med.get("instructions", "")))
-
-    conn.commit()
-    conn.close()
+    with get_pool().write() as conn:
+        c = conn.execute('''INSERT INTO prescriptions
+                            (patient_id, doctor_name, hospital_name, date,
+                             diagnosis, symptoms, duration_days, image_path, embedding_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (patient_id, doctor_name, hospital_name, now,
+                          diagnosis, symptoms, duration_days, image_path, embedding_id))
+        prescription_id = c.lastrowid
+
+        conn.executemany('''INSERT INTO medicines
+                            (prescription_id, name, dosage, frequency, duration, instructions)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         [(prescription_id, med.get("name", ""), med.get("dosage", ""),
+                           med.get("frequency", ""), med.get("duration", ""), med.get("instructions", ""))
+                          for med in medicines_list])
+    history_cache.invalidate(patient_id)
     return prescription_id
 
 
 def add_learning_data(patient_id: str, input_text: str, diagnosis: str,
                       confidence: float, verified: bool, embedding_id: str):
     """Store learning data entry"""
-    conn = get_connection()
-    c = conn.cursor()
     now = datetime.now().isoformat()
-    c.execute('''INSERT INTO learning_data
-                (patient_id, input_text, diagnosis, confidence, verified, usage_count, timestamp, embedding_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-              (patient_id, input_text, diagnosis, confidence, verified, 0, now, embedding_id))
-    conn.commit()
-    conn.close()
+    with get_pool().write() as conn:
+        conn.execute('''INSERT INTO learning_data
+                        (patient_id, input_text, diagnosis, confidence, verified, usage_count, timestamp, embedding_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (patient_id, input_text, diagnosis, confidence, verified, 0, now, embedding_id))
+    history_cache.invalidate(patient_id)
 
 
 def get_medical_history(patient_id: str) -> Dict[str, Any]:
-    """Retrieve complete medical history for a patient"""
-    conn = get_connection()
-    c = conn.cursor()
-
-    c.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,))
-    patient = c.fetchone()
-
-    c.execute('SELECT * FROM prescriptions WHERE patient_id = ? ORDER BY date DESC', (patient_id,))
-    prescriptions_data = c.fetchall()
-
-    history = []
-    for pres in prescriptions_data:
-        c.execute('SELECT * FROM medicines WHERE prescription_id = ?', (pres[0],))
-        medicines = c.fetchall()
-
-        med_list = [{"name": m[2], "dosage": m[3], "frequency": m[4],
-                     "duration": m[5], "instructions": m[6]} for m in medicines]
-
-        history.append({
+    """
+    Retrieve complete medical history for a patient (served from history_cache when
+    fresh; treat the returned dict as read-only).
+    """
+    return history_cache.get_or_load(patient_id, lambda: _load_medical_history(patient_id))
+
+
+def _load_medical_history(patient_id: str) -> Dict[str, Any]:
+    """
+    Five indexed queries regardless of visit count: medicines for every prescription
+    come from one join on patient_id and are grouped in Python.
+    """
+    with get_pool().connection() as conn:
+        c = conn.cursor()
+
+        c.execute('SELECT patient_id, name, age, gender FROM patients WHERE patient_id = ?', (patient_id,))
+        patient = c.fetchone()
+
+        c.execute('''SELECT id, date, doctor_name, hospital_name, diagnosis, symptoms, duration_days
+                     FROM prescriptions WHERE patient_id = ? ORDER BY date DESC''', (patient_id,))
+        prescriptions_data = c.fetchall()
+
+        medicines: Dict[int, List[Dict[str, Any]]] = {pres[0]: [] for pres in prescriptions_data}
+        if medicines:
+            c.execute('''SELECT m.prescription_id, m.name, m.dosage, m.frequency, m.duration, m.instructions
+                         FROM prescriptions p JOIN medicines m ON m.prescription_id = p.id
+                         WHERE p.patient_id = ? ORDER BY m.id''', (patient_id,))
+            for m in c.fetchall():
+                medicines[m[0]].append({"name": m[1], "dosage": m[2], "frequency": m[3],
+                                        "duration": m[4], "instructions": m[5]})
+
+        history = [{
             "prescription_id": pres[0],
-            "date": pres[4],
+            "date": pres[1],
             "doctor_name": pres[2],
             "hospital_name": pres[3],
-            "diagnosis": pres[5],
-            "symptoms": pres[6],
-            "duration_days": pres[7],
-            "medicines": med_list
-        })
-
-    # Get allergies
-    c.execute('SELECT * FROM allergies WHERE patient_id = ?', (patient_id,))
-    allergies = [{"allergen": a[2], "reaction": a[3], "severity": a[4]} for a in c.fetchall()]
+            "diagnosis": pres[4],
+            "symptoms": pres[5],
+            "duration_days": pres[6],
+            "medicines": medicines[pres[0]]
+        } for pres in prescriptions_data]
 
-    # Get chronic conditions
-    c.execute('SELECT * FROM chronic_conditions WHERE patient_id = ?', (patient_id,))
-    conditions = [{"condition": cc[2], "diagnosed_date": cc[3], "status": cc[4]} for cc in c.fetchall()]
+        # Get allergies
+        c.execute('SELECT allergen, reaction, severity FROM allergies WHERE patient_id = ?', (patient_id,))
+        allergies = [{"allergen": a[0], "reaction": a[1], "severity": a[2]} for a in c.fetchall()]
 
-    conn.close()
+        # Get chronic conditions
+        c.execute('''SELECT condition_name, diagnosed_date, status
+                     FROM chronic_conditions WHERE patient_id = ?''', (patient_id,))
+        conditions = [{"condition": cc[0], "diagnosed_date": cc[1], "status": cc[2]} for cc in c.fetchall()]
 
     return {
         "patient_id": patient_id,
@@ -204,5 +190,93 @@ def get_medical_history(patient_id: str) -> Dict[str, Any]:
     }
 
 
-# Initialize on import
-init_database()
+
+# Column behind each projectable prescription field ("medicines" is loaded separately)
+PRESCRIPTION_COLUMNS = {
+    "prescription_id": "id",
+    "date": "date",
+    "doctor_name": "doctor_name",
+    "hospital_name": "hospital_name",
+    "diagnosis": "diagnosis",
+    "symptoms": "symptoms",
+    "duration_days": "duration_days",
+}
+PRESCRIPTION_FIELDS = tuple(PRESCRIPTION_COLUMNS) + ("medicines",)
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(date: str, prescription_id: int) -> str:
+    """Opaque keyset cursor: the (date, id) of the last row returned"""
+    raw = json.dumps([date, prescription_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        date, prescription_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return date, int(prescription_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def get_prescriptions_page(patient_id: str, limit: int = 20, cursor: Optional[str] = None,
+                           date_from: Optional[str] = None, date_to: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    One page of a patient's prescriptions, newest first, via keyset pagination on
+    (date, id): each page is an index range scan that starts where the last one ended,
+    so deep pages cost the same as the first. `fields` projects the returned keys and
+    skips the medicines query when "medicines" is not requested.
+    """
+    fields = list(fields or PRESCRIPTION_FIELDS)
+    unknown = set(fields) - set(PRESCRIPTION_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    clauses, params = ["patient_id = ?"], [patient_id]
+    if date_from:
+        clauses.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        # Dates are ISO timestamps, so a bare YYYY-MM-DD bound covers that whole day
+        clauses.append("date <= ?")
+        params.append(date_to + "\uffff")
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        # Row-value comparison lets SQLite seek straight into the (patient_id, date, id) index
+        clauses.append("(date, id) < (?, ?)")
+        params.extend([last_date, last_id])
+
+    columns = ", ".join(PRESCRIPTION_COLUMNS[f] for f in fields if f in PRESCRIPTION_COLUMNS)
+    with get_pool().connection() as conn:
+        rows = conn.execute(f'''SELECT id, date{", " + columns if columns else ""} FROM prescriptions
+                               WHERE {" AND ".join(clauses)}
+                               ORDER BY date DESC, id DESC LIMIT ?''', params + [limit + 1]).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        medicines: Dict[int, List[Dict[str, Any]]] = {row[0]: [] for row in rows}
+        if "medicines" in fields and rows:
+            placeholders = ",".join("?" * len(rows))
+            for m in conn.execute(f'''SELECT prescription_id, name, dosage, frequency, duration, instructions
+                                      FROM medicines WHERE prescription_id IN ({placeholders}) ORDER BY id''',
+                                  [row[0] for row in rows]):
+                medicines[m[0]].append({"name": m[1], "dosage": m[2], "frequency": m[3],
+                                        "duration": m[4], "instructions": m[5]})
+
+    selected = [f for f in fields if f in PRESCRIPTION_COLUMNS]
+    page = []
+    for row in rows:
+        item = dict(zip(selected, row[2:]))
+        if "medicines" in fields:
+            item["medicines"] = medicines[row[0]]
+        page.append(item)
+
+    return {
+        "patient_id": patient_id,
+        "prescriptions": page,
+        "count": len(page),
+        "next_cursor": encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None,
+    }
+
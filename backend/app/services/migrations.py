@@ -0,0 +1,292 @@
+"""
+Migrations — Versioned schema changes for medical_history.db.
+Each migration is an ordered list of SQL statements (or callables taking the
+connection) identified by a version number. `migrate()` applies every version above the
+one recorded in `schema_version` inside a single IMMEDIATE transaction, so concurrent
+workers starting together apply each migration exactly once.
+
+Add new migrations at the end of MIGRATIONS with the next version number; never edit
+one that has shipped.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable]
+
+# Lookup paths used by get_medical_history and the backfill/import jobs
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_date ON prescriptions(patient_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_medicines_prescription ON medicines(prescription_id)",
+    "CREATE INDEX IF NOT EXISTS idx_allergies_patient ON allergies(patient_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chronic_conditions_patient ON chronic_conditions(patient_id)",
+    "CREATE INDEX IF NOT EXISTS idx_learning_data_patient ON learning_data(patient_id)",
+)
+
+INITIAL_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS patients
+        (patient_id TEXT PRIMARY KEY,
+         name TEXT,
+         age INTEGER,
+         gender TEXT,
+         location TEXT,
+         created_date TEXT,
+         last_visit TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS prescriptions
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         patient_id TEXT,
+         doctor_name TEXT,
+         hospital_name TEXT,
+         date TEXT,
+         diagnosis TEXT,
+         symptoms TEXT,
+         duration_days INTEGER,
+         follow_up_date TEXT,
+         image_path TEXT,
+         embedding_id TEXT,
+         FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''',
+    '''CREATE TABLE IF NOT EXISTS medicines
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         prescription_id INTEGER,
+         name TEXT,
+         dosage TEXT,
+         frequency TEXT,
+         duration TEXT,
+         instructions TEXT,
+         FOREIGN KEY(prescription_id) REFERENCES prescriptions(id))''',
+    '''CREATE TABLE IF NOT EXISTS allergies
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         patient_id TEXT,
+         allergen TEXT,
+         reaction TEXT,
+         severity TEXT,
+         date_diagnosed TEXT,
+         FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''',
+    '''CREATE TABLE IF NOT EXISTS chronic_conditions
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         patient_id TEXT,
+         condition_name TEXT,
+         diagnosed_date TEXT,
+         status TEXT,
+         notes TEXT,
+         FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''',
+    '''CREATE TABLE IF NOT EXISTS learning_data
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         patient_id TEXT,
+         input_text TEXT,
+         diagnosis TEXT,
+         confidence REAL,
+         verified BOOLEAN,
+         usage_count INTEGER DEFAULT 0,
+         timestamp TEXT,
+         embedding_id TEXT UNIQUE,
+         FOREIGN KEY(patient_id) REFERENCES patients(patient_id))''',
+)
+
+# Population analytics rollups (see services/analytics.py). Age bands are lower bounds
+AGE_BANDS = ((60, "60+"), (45, "45-59"), (30, "30-44"), (15, "15-29"), (5, "5-14"), (0, "0-4"))
+
+
+def age_band_sql(column: str) -> str:
+    cases = " ".join(f"WHEN {column} >= {low} THEN '{label}'" for low, label in AGE_BANDS)
+    return f"CASE WHEN {column} IS NULL THEN 'unknown' {cases} ELSE 'unknown' END"
+
+
+def week_sql(column: str) -> str:
+    """Monday of the column's ISO week, as YYYY-MM-DD"""
+    return f"COALESCE(date({column}, '-6 days', 'weekday 1'), 'unknown')"
+
+
+def _prescription_rollup_key(row: str) -> str:
+    # district, week, diagnosis, age_band for one prescription row joined to its patient
+    return (f"COALESCE(p.location, ''), {week_sql(row + '.date')}, COALESCE({row}.diagnosis, ''), "
+            f"{age_band_sql('p.age')}")
+
+
+def _prescription_rollup_trigger(name: str, event: str, row: str, delta: int) -> str:
+    # "FROM (SELECT 1) LEFT JOIN" still counts prescriptions whose patient row is missing
+    source = f"FROM (SELECT 1) LEFT JOIN patients p ON p.patient_id = {row}.patient_id"
+    prune = (f'''DELETE FROM prescription_rollup WHERE count <= 0
+                AND (district, week, diagnosis, age_band) = (SELECT {_prescription_rollup_key(row)} {source});'''
+             if delta < 0 else "")
+    return f'''CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON prescriptions
+        BEGIN
+            INSERT INTO prescription_rollup (district, week, diagnosis, age_band, count)
+            SELECT {_prescription_rollup_key(row)}, {delta} {source}
+            WHERE true
+            ON CONFLICT(district, week, diagnosis, age_band) DO UPDATE SET count = count + ({delta});
+            {prune}
+        END'''
+
+
+PRESCRIPTION_ROLLUP_REBUILD = f'''INSERT INTO prescription_rollup (district, week, diagnosis, age_band, count)
+    SELECT {_prescription_rollup_key('pr')}, COUNT(*)
+    FROM prescriptions pr LEFT JOIN patients p ON p.patient_id = pr.patient_id
+    GROUP BY 1, 2, 3, 4'''
+
+ANALYTICS_ROLLUPS = (
+    '''CREATE TABLE IF NOT EXISTS diagnosis_rollup
+        (district TEXT NOT NULL,
+         week TEXT NOT NULL,
+         icd10 TEXT NOT NULL,
+         risk_level TEXT NOT NULL,
+         age_band TEXT NOT NULL,
+         count INTEGER NOT NULL,
+         PRIMARY KEY (district, week, icd10, risk_level, age_band)) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS prescription_rollup
+        (district TEXT NOT NULL,
+         week TEXT NOT NULL,
+         diagnosis TEXT NOT NULL,
+         age_band TEXT NOT NULL,
+         count INTEGER NOT NULL,
+         PRIMARY KEY (district, week, diagnosis, age_band)) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_diagnosis_rollup_week ON diagnosis_rollup(week)",
+    "CREATE INDEX IF NOT EXISTS idx_prescription_rollup_week ON prescription_rollup(week)",
+    _prescription_rollup_trigger("trg_prescription_rollup_insert", "INSERT", "NEW", 1),
+    _prescription_rollup_trigger("trg_prescription_rollup_delete", "DELETE", "OLD", -1),
+    _prescription_rollup_trigger("trg_prescription_rollup_update_old",
+                                 "UPDATE OF patient_id, date, diagnosis", "OLD", -1),
+    _prescription_rollup_trigger("trg_prescription_rollup_update_new",
+                                 "UPDATE OF patient_id, date, diagnosis", "NEW", 1),
+    "DELETE FROM prescription_rollup",
+    PRESCRIPTION_ROLLUP_REBUILD,
+)
+
+# Full-text index (see services/text_search.py). One row per prescription (rowid = id * 2,
+# medicines folded into one column) and per learning_data entry (rowid = id * 2 + 1)
+_MEDICINE_TEXT = "COALESCE(name, '') || ' ' || COALESCE(instructions, '')"
+
+
+def _medicines_text(prescription_id: str) -> str:
+    return (f"COALESCE((SELECT group_concat({_MEDICINE_TEXT}, ' ') FROM medicines "
+            f"WHERE prescription_id = {prescription_id}), '')")
+
+
+def _refresh_medicines(prescription_id: str) -> str:
+    return (f"UPDATE search_index SET medicines = {_medicines_text(prescription_id)} "
+            f"WHERE rowid = {prescription_id} * 2;")
+
+
+FULLTEXT_SEARCH = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5
+        (diagnosis, symptoms, medicines,
+         kind UNINDEXED, ref_id UNINDEXED, patient_id UNINDEXED, date UNINDEXED,
+         prefix = '2 3', tokenize = 'unicode61 remove_diacritics 2')''',
+    # Picks up medicines written before the prescription (bulk import), so each row is indexed once
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_prescription_insert AFTER INSERT ON prescriptions
+        BEGIN
+            INSERT INTO search_index (rowid, diagnosis, symptoms, medicines, kind, ref_id, patient_id, date)
+            VALUES (NEW.id * 2, COALESCE(NEW.diagnosis, ''), COALESCE(NEW.symptoms, ''), {_medicines_text("NEW.id")},
+                    'prescription', NEW.id, NEW.patient_id, NEW.date);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_prescription_update
+        AFTER UPDATE OF patient_id, date, diagnosis, symptoms ON prescriptions
+        BEGIN
+            UPDATE search_index SET diagnosis = COALESCE(NEW.diagnosis, ''), symptoms = COALESCE(NEW.symptoms, ''),
+                                    patient_id = NEW.patient_id, date = NEW.date
+            WHERE rowid = NEW.id * 2;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_prescription_delete AFTER DELETE ON prescriptions
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2;
+        END''',
+    # Inserts append (add_prescription writes medicines after the prescription); updates and deletes re-aggregate
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_medicine_insert AFTER INSERT ON medicines
+        WHEN EXISTS (SELECT 1 FROM prescriptions WHERE id = NEW.prescription_id)
+        BEGIN
+            UPDATE search_index
+            SET medicines = ltrim(medicines || ' ' || COALESCE(NEW.name, '') || ' ' || COALESCE(NEW.instructions, ''))
+            WHERE rowid = NEW.prescription_id * 2;
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_medicine_update AFTER UPDATE ON medicines
+        BEGIN
+            {_refresh_medicines("OLD.prescription_id")}
+            {_refresh_medicines("NEW.prescription_id")}
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_medicine_delete AFTER DELETE ON medicines
+        BEGIN
+            {_refresh_medicines("OLD.prescription_id")}
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_learning_insert AFTER INSERT ON learning_data
+        BEGIN
+            INSERT INTO search_index (rowid, diagnosis, symptoms, medicines, kind, ref_id, patient_id, date)
+            VALUES (NEW.id * 2 + 1, COALESCE(NEW.diagnosis, ''), COALESCE(NEW.input_text, ''), '',
+                    'learning', NEW.id, NEW.patient_id, NEW.timestamp);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_learning_update
+        AFTER UPDATE OF patient_id, timestamp, diagnosis, input_text ON learning_data
+        BEGIN
+            UPDATE search_index SET diagnosis = COALESCE(NEW.diagnosis, ''), symptoms = COALESCE(NEW.input_text, ''),
+                                    patient_id = NEW.patient_id, date = NEW.timestamp
+            WHERE rowid = NEW.id * 2 + 1;
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_search_learning_delete AFTER DELETE ON learning_data
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+        END''',
+    "DELETE FROM search_index",
+    f'''INSERT INTO search_index (rowid, diagnosis, symptoms, medicines, kind, ref_id, patient_id, date)
+        SELECT id * 2, COALESCE(diagnosis, ''), COALESCE(symptoms, ''), {_medicines_text("prescriptions.id")},
+               'prescription', id, patient_id, date
+        FROM prescriptions''',
+    '''INSERT INTO search_index (rowid, diagnosis, symptoms, medicines, kind, ref_id, patient_id, date)
+        SELECT id * 2 + 1, COALESCE(diagnosis, ''), COALESCE(input_text, ''), '', 'learning', id, patient_id, timestamp
+        FROM learning_data''',
+    "INSERT INTO search_index (search_index) VALUES ('optimize')",
+)
+
+# One row per diagnosis (diagnosis_rollup has one per ICD-10 code, so it can only be
+# summed per code). Diagnoses recorded before this migration are only in
+# diagnosis_rollup; `python -m app.services.analytics rebuild` fills them in from the audit log.
+DIAGNOSIS_CASE_ROLLUP = (
+    '''CREATE TABLE IF NOT EXISTS diagnosis_case_rollup
+        (district TEXT NOT NULL,
+         week TEXT NOT NULL,
+         risk_level TEXT NOT NULL,
+         age_band TEXT NOT NULL,
+         count INTEGER NOT NULL,
+         PRIMARY KEY (district, week, risk_level, age_band)) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_diagnosis_case_rollup_week ON diagnosis_case_rollup(week)",
+)
+
+# (version, name, steps) in apply order. Version 1 uses IF NOT EXISTS so databases
+# created before migrations existed are adopted as-is.
+MIGRATIONS: List[Tuple[int, str, Sequence[Step]]] = [
+    (1, "initial schema", INITIAL_SCHEMA),
+    (2, "patient lookup indexes", INDEXES),
+    (3, "population analytics rollups", ANALYTICS_ROLLUPS),
+    (4, "full-text search index", FULLTEXT_SEARCH),
+    (5, "per-diagnosis analytics rollup", DIAGNOSIS_CASE_ROLLUP),
+]
+
+
+def current_version(conn) -> int:
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     name TEXT NOT NULL,
+                     applied_at TEXT NOT NULL)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(pool, migrations: Sequence[Tuple[int, str, Sequence[Step]]] = MIGRATIONS) -> List[int]:
+    """Apply pending migrations; returns the versions applied by this call"""
+    applied = []
+    with pool.write() as conn:
+        # Take the database write lock before reading the version (other processes may be migrating too)
+        conn.execute("BEGIN IMMEDIATE")
+        version = current_version(conn)
+        for number, name, steps in sorted(migrations, key=lambda m: m[0]):
+            if number <= version:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                         (number, name, datetime.now().isoformat()))
+            applied.append(number)
+            logger.info(f"Applied migration {number}: {name}")
+    return applied
@@ -21,22 +21,72 @@ class OllamaService:
             return self._fallback_story(medical_diagnosis, language)
         
         try:
-            # Create prompt for farm story generation
-            language_names = {
-                "en": "English",
-                "hi": "Hindi (हिंदी)",
-                "te": "Telugu (తెలుగు)",
-                "ta": "Tamil (தமிழ்)",
-                "kn": "Kannada (ಕನ್ನಡ)",
-                "ml": "Malayalam (മലയാളം)"
-            }
-            lang_name = language_names.get(language, "English")
+            prompt, lang_name = self._farm_story_prompt(medical_diagnosis, language)
+
+            response = ollama.chat(
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}]
+            )
             
-            diseases = ', '.join([d['name'] for d in medical_diagnosis.get('diseases', [])])
-            risk_level = medical_diagnosis.get('risk_level', 'medium')
-            treatment = ', '.join([m['name'] for m in medical_diagnosis.get('treatment_plan', {}).get('medications', [])])
+            story = response['message']['content']
+            print(f"✅ Farm story generated in {lang_name}")
+            return story
             
-            prompt = f"""You are a village elder (Uncle ji) in rural India. A farmer has come to you for health advice.
+        except Exception as e:
+            print(f"❌ Ollama story generation error: {str(e)}")
+            return self._fallback_story(medical_diagnosis, language)
+    
+    def stream_farm_story(self, medical_diagnosis: dict, language: str = "en", on_token=None,
+                          cancelled=None) -> str:
+        """
+        Same story as generate_farm_story, token-streamed: `on_token(text)` is called for each
+        chunk as Ollama produces it. Returns the full story (the fallback when unavailable).
+        Setting the `cancelled` event stops reading the stream and returns what was read.
+        Raises if the stream fails, so the caller can report its fallback as one.
+        """
+        if not self.available:
+            return self._fallback_story(medical_diagnosis, language)
+
+        chunks = []
+        prompt, lang_name = self._farm_story_prompt(medical_diagnosis, language)
+        stream = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], stream=True)
+        try:
+            for part in stream:
+                if cancelled is not None and cancelled.is_set():
+                    print(f"⏹️ Farm story stream stopped after {len(chunks)} chunks")
+                    return "".join(chunks)
+                text = part['message']['content']
+                if text:
+                    chunks.append(text)
+                    if on_token is not None:
+                        on_token(text)
+            print(f"✅ Farm story streamed in {lang_name}")
+            return "".join(chunks)
+        except Exception as e:
+            print(f"❌ Ollama story streaming error after {len(chunks)} chunks: {str(e)}")
+            raise
+        finally:
+            # Closes the HTTP response when we stop early
+            stream.close()
+
+    def _farm_story_prompt(self, medical_diagnosis: dict, language: str):
+        """Prompt for the farm story and the display name of its language"""
+        # Create prompt for farm story generation
+        language_names = {
+            "en": "English",
+            "hi": "Hindi (हिंदी)",
+            "te": "Telugu (తెలుగు)",
+            "ta": "Tamil (தமிழ்)",
+            "kn": "Kannada (ಕನ್ನಡ)",
+            "ml": "Malayalam (മലയാളം)"
+        }
+        lang_name = language_names.get(language, "English")
+        
+        diseases = ', '.join([d['name'] for d in medical_diagnosis.get('diseases', [])])
+        risk_level = medical_diagnosis.get('risk_level', 'medium')
+        treatment = ', '.join([m['name'] for m in medical_diagnosis.get('treatment_plan', {}).get('medications', [])])
+        
+        prompt = f"""You are a village elder (Uncle ji) in rural India. A farmer has come to you for health advice.
 
 Medical Diagnosis:
 - Health Problem: {diseases or 'General checkup'}
@@ -65,20 +115,8 @@ Example (English): "Bhai, your sugar is high, jaise tyohaar mein mithai zyada kh
 ak sabzi, dahi. Avoid: white chawal, aloo, mithai, cold drinks. Walk 2 km daily like going to the field."
 
 Now create a similar story in {lang_name}:"""
+        return prompt, lang_name
 
-            response = ollama.chat(
-                model=self.model,
-                messages=[{'role': 'user', 'content': prompt}]
-            )
-            
-            story = response['message']['content']
-            print(f"✅ Farm story generated in {lang_name}")
-            return story
-            
-        except Exception as e:
-            print(f"❌ Ollama story generation error: {str(e)}")
-            return self._fallback_story(medical_diagnosis, language)
-    
     def _fallback_story(self, diagnosis: dict, language: str) -> str:
         """Fallback story when Ollama is not available"""
         stories = {
@@ -0,0 +1,255 @@
+"""
+Prescription Import — Bulk-load digitized historical prescriptions into medical_history.db.
+Streams a CSV or JSONL file, validates each row, and writes valid rows in large
+transactions: patients are upserted once per batch, each prescription takes its id from
+its own insert, and the batch's medicines go in with one executemany. Bad rows are
+skipped and reported with their line number.
+
+Columns / keys: patient_id, date (ISO-8601) are required; doctor_name, hospital_name,
+diagnosis, symptoms, duration_days, patient_name, age, gender, district are optional. `medicines`
+is a JSON list of {name, dosage, frequency, duration, instructions} (in CSV, a JSON
+string or a ";"-separated list of names).
+
+Imported rows have no embedding yet; run the vector backfill afterwards to make them
+searchable.
+
+Usage (from backend/):
+    python -m app.services.prescription_import records.csv
+    python -m app.services.prescription_import records.jsonl --batch-size 10000 --rejects rejected.jsonl
+"""
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from . import medical_db
+
+logger = logging.getLogger(__name__)
+
+MEDICINE_FIELDS = ("name", "dosage", "frequency", "duration", "instructions")
+MAX_REJECT_SAMPLES = 100
+
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line number, raw record) pairs; JSON decode errors are yielded as the exception"""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, ValueError(f"Invalid JSON: {e}")
+
+
+def _parse_medicines(value) -> List[Dict[str, str]]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return [{"name": name.strip()} for name in value.split(";") if name.strip()]
+    if not isinstance(value, list):
+        raise ValueError("medicines must be a list")
+    medicines = []
+    for med in value:
+        if isinstance(med, str):
+            med = {"name": med}
+        if not isinstance(med, dict) or not med.get("name"):
+            raise ValueError("every medicine needs a name")
+        medicines.append(med)
+    return medicines
+
+
+def _optional_int(value, field: str) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+
+
+def validate_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalized row, or ValueError describing why it is rejected"""
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+    patient_id = str(record.get("patient_id") or "").strip()
+    if not patient_id:
+        raise ValueError("missing patient_id")
+    date = str(record.get("date") or "").strip()
+    if not date:
+        raise ValueError("missing date")
+    try:
+        date = datetime.fromisoformat(date).isoformat()
+    except ValueError:
+        raise ValueError(f"invalid date {date!r}")
+    duration_days = _optional_int(record.get("duration_days"), "duration_days")
+    return {
+        "patient_id": patient_id,
+        "patient_name": record.get("patient_name") or None,
+        "age": _optional_int(record.get("age"), "age"),
+        "gender": record.get("gender") or None,
+        "district": record.get("district") or None,
+        "doctor_name": record.get("doctor_name") or "",
+        "hospital_name": record.get("hospital_name") or "",
+        "date": date,
+        "diagnosis": record.get("diagnosis") or "",
+        "symptoms": record.get("symptoms") or "",
+        "duration_days": 7 if duration_days is None else duration_days,
+        "medicines": _parse_medicines(record.get("medicines")),
+    }
+
+
+def write_batch(rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """One transaction for the whole batch; returns (patients upserted, medicines written)"""
+    patients: Dict[str, Tuple] = {}
+    for row in rows:
+        pid = row["patient_id"]
+        prev = patients.get(pid, (pid, None, None, None, None, row["date"], row["date"]))
+        patients[pid] = (pid, row["patient_name"] or prev[1], row["age"] or prev[2], row["gender"] or prev[3],
+                         row["district"] or prev[4], min(prev[5], row["date"]), max(prev[6], row["date"]))
+
+    with medical_db.pool.write() as conn:
+        # Same effect as ensure_patient, but keeps existing details and the earliest/latest visit
+        conn.executemany('''INSERT INTO patients (patient_id, name, age, gender, location, created_date, last_visit)
+                            VALUES (?, COALESCE(?, 'Unknown'), ?, ?, ?, ?, ?)
+                            ON CONFLICT(patient_id) DO UPDATE SET
+                                name = CASE WHEN excluded.name != 'Unknown' THEN excluded.name ELSE patients.name END,
+                                age = COALESCE(excluded.age, patients.age),
+                                gender = COALESCE(excluded.gender, patients.gender),
+                                location = COALESCE(excluded.location, patients.location),
+                                created_date = MIN(COALESCE(patients.created_date, excluded.created_date),
+                                                   excluded.created_date),
+                                last_visit = MAX(COALESCE(patients.last_visit, ''), excluded.last_visit)''',
+                         list(patients.values()))
+
+        # Ids come from SQLite (AUTOINCREMENT never reuses a deleted row's id)
+        medicines = []
+        for row in rows:
+            prescription_id = conn.execute('''INSERT INTO prescriptions
+                                              (patient_id, doctor_name, hospital_name, date,
+                                               diagnosis, symptoms, duration_days)
+                                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                           (row["patient_id"], row["doctor_name"], row["hospital_name"], row["date"],
+                                            row["diagnosis"], row["symptoms"], row["duration_days"])).lastrowid
+            medicines.extend((prescription_id, *(str(med.get(field, "") or "") for field in MEDICINE_FIELDS))
+                             for med in row["medicines"])
+        conn.executemany('''INSERT INTO medicines
+                            (prescription_id, name, dosage, frequency, duration, instructions)
+                            VALUES (?, ?, ?, ?, ?, ?)''', medicines)
+    for patient_id in patients:
+        medical_db.history_cache.invalidate(patient_id)
+    return len(patients), len(medicines)
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.patient_upserts = 0
+        self.medicines = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.rejected_samples: List[Dict[str, Any]] = []
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.rejected_samples) < MAX_REJECT_SAMPLES:
+            self.rejected_samples.append({"line": line, "error": error})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows_read": self.rows_read,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "patient_upserts": self.patient_upserts,
+            "medicines": self.medicines,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 2),
+            "rows_per_sec": round(self.imported / self.seconds, 1) if self.seconds else 0.0,
+            "rejected_samples": self.rejected_samples,
+        }
+
+
+def import_prescriptions(lines: Iterable[str], fmt: str = "csv", batch_size: int = 5000,
+                         rejects_path: Optional[str] = None) -> Dict[str, Any]:
+    """Import a stream of CSV/JSONL lines; memory stays bounded by `batch_size`"""
+    report = ImportReport()
+    started = time.perf_counter()
+    rejects = open(rejects_path, "w") if rejects_path else None
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        patients, medicines = write_batch(batch)
+        report.imported += len(batch)
+        report.patient_upserts += patients
+        report.medicines += medicines
+        report.batches += 1
+        batch.clear()
+        logger.info(f"Imported {report.imported} prescriptions ({report.rejected} rejected)")
+
+    try:
+        for line_num, record in read_rows(lines, fmt):
+            report.rows_read += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                batch.append(validate_row(record))
+            except ValueError as e:
+                report.reject(line_num, str(e))
+                if rejects:
+                    rejects.write(json.dumps({"line": line_num, "error": str(e),
+                                              "record": record if isinstance(record, dict) else None},
+                                             default=str) + "\n")
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if rejects:
+            rejects.close()
+        report.seconds = time.perf_counter() - started
+    return report.to_dict()
+
+
+def import_file(path: str, fmt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return import_prescriptions(f, fmt or detect_format(path), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import historical prescriptions from CSV/JSONL")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--rejects", help="write rejected rows (with errors) to this JSONL file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+    report = import_file(args.path, args.format, batch_size=args.batch_size, rejects_path=args.rejects)
+    if report["imported"]:
+        from .text_search import optimize
+        optimize()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
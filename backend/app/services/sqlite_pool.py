@@ -0,0 +1,105 @@
+"""
+SQLite Pool — Reusable, tuned SQLite connections shared across threads.
+Connections run in WAL mode so readers never wait for a writer, keep a prepared
+statement cache, and are handed out from a bounded LIFO pool instead of being
+opened per call. Writes are serialized in-process through a single writer lock,
+which avoids SQLITE_BUSY retries between our own threads.
+"""
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePool:
+    def __init__(self, path: str, size: int = 8, cache_size_mb: int = 32, mmap_size_mb: int = 256,
+                 busy_timeout_ms: int = 5000, cached_statements: int = 256):
+        self.path = path
+        self.size = size
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+
+    def connect(self) -> sqlite3.Connection:
+        """A new connection with the pool's pragmas (callers own and close it)"""
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_mb * 1024}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size_mb * 1024 * 1024}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return self.connect()
+        started = time.perf_counter()
+        conn = self._idle.get()
+        with self._lock:
+            self.waits += 1
+            self.total_wait_ms += (time.perf_counter() - started) * 1000
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for reads; any open transaction is rolled back on return"""
+        conn = self._acquire()
+        self.checkouts += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection under the writer lock; commits on success, rolls back on error"""
+        with self._write_lock, self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "open": self._opened,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "avg_wait_ms": round(self.total_wait_ms / self.waits, 2) if self.waits else 0.0,
+        }
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
@@ -0,0 +1,111 @@
+"""
+Stage Graph — Run a request pipeline as a small DAG of async stages.
+Each stage starts as soon as the stages it depends on have finished, so independent
+calls (LLM translation, Ollama farm story, audit write) overlap instead of queueing
+behind each other. A stage can have its own deadline and a fallback: when it times out
+or fails, the fallback fills in its result and the rest of the response is unaffected.
+A stage without a fallback is required; its error fails the whole run.
+
+Cancelling a stage that is running in a thread pool cannot interrupt the thread. The
+call finishes in the background and its result is dropped; a call still queued for a
+worker is never started. Stages with a deadline should use run_model, whose bounded
+pool caps how many abandoned calls can pile up, so they never hold run_io workers.
+"""
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+StageCallback = Callable[[str, Any, Dict[str, Any]], None]
+
+
+class Stage:
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Any]], after: Iterable[str] = (),
+                 timeout: Optional[float] = None, fallback: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class StageGraph:
+    """
+    Stages read the request context and earlier results from a shared dict and their
+    own result is stored in it under the stage name. Dependencies must be declared
+    before the stages that use them, which keeps the graph acyclic.
+    """
+
+    def __init__(self, name: str, stages: List[Stage]):
+        self.name = name
+        self.stages = stages
+        seen = set()
+        for stage in stages:
+            missing = [dep for dep in stage.after if dep not in seen]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on undeclared stage(s) {', '.join(missing)}")
+            seen.add(stage.name)
+        self._lock = threading.Lock()
+        self._counters = {stage.name: {"runs": 0, "timeouts": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+                          for stage in stages}
+
+    async def run(self, context: Dict[str, Any], on_stage: Optional[StageCallback] = None
+                  ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        (context with every stage's result, per-stage {status, ms}); status is ok, timeout or
+        error. `on_stage(name, result, report)` is called as each stage finishes, e.g. to
+        stream partial results.
+        """
+        report: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.create_task(self._run_stage(stage, context, tasks, report, on_stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return context, report
+
+    async def _run_stage(self, stage: Stage, context: Dict[str, Any], tasks: Dict[str, asyncio.Task],
+                         report: Dict[str, Any], on_stage: Optional[StageCallback]):
+        if stage.after:
+            await asyncio.gather(*(tasks[dep] for dep in stage.after))
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            context[stage.name] = await asyncio.wait_for(stage.run(context), stage.timeout)
+        except Exception as e:
+            if stage.fallback is None:
+                raise
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            logger.warning(f"{self.name}/{stage.name} {status} after {(time.perf_counter() - started) * 1000:.0f} ms"
+                           f"{'' if status == 'timeout' else f' ({e})'}; using fallback")
+            context[stage.name] = stage.fallback(context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        report[stage.name] = {"status": status, "ms": round(elapsed_ms, 1)}
+        with self._lock:
+            counters = self._counters[stage.name]
+            counters["runs"] += 1
+            counters["timeouts"] += status == "timeout"
+            counters["errors"] += status == "error"
+            counters["total_ms"] += elapsed_ms
+            counters["max_ms"] = max(counters["max_ms"], elapsed_ms)
+        if on_stage is not None:
+            on_stage(stage.name, context[stage.name], report[stage.name])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "runs": c["runs"],
+                    "timeouts": c["timeouts"],
+                    "errors": c["errors"],
+                    "avg_ms": round(c["total_ms"] / (c["runs"] or 1), 2),
+                    "max_ms": round(c["max_ms"], 2),
+                }
+                for name, c in self._counters.items()
+            }
@@ -0,0 +1,110 @@
+"""
+Text Search — Ranked full-text search over prescriptions and learning data (SQLite FTS5).
+Complements the embedding search for exact terms such as drug names, strengths and lab
+tests ("Metformin 500", "HbA1c"). The `search_index` table is created by migration 4
+and kept in sync by triggers on prescriptions, medicines and learning_data.
+
+Queries are built from word tokens only (user input is never passed through as FTS
+syntax); every token must match and the last one is a prefix, so the box can search
+as the doctor types. The index stores two- and three-character prefixes.
+
+Every match is scored with bm25 and only the requested page is kept (SQLite's top-N
+sort for ORDER BY ... LIMIT), so results are the best over the whole index, not over
+some subset of it. That makes the cost proportional to the number of matches, so a
+last token shorter than MIN_PREFIX_CHARS is matched as a whole word: "m" or "me" as a
+prefix would score most of the index on every keystroke.
+"""
+import re
+import json
+import base64
+import logging
+from typing import Dict, Any, List, Optional
+
+from . import medical_db
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("prescription", "learning")
+MAX_PAGE_SIZE = 50
+MIN_PREFIX_CHARS = 3
+# bm25 weights for diagnosis, symptoms, medicines (the UNINDEXED columns are ignored)
+COLUMN_WEIGHTS = (3.0, 1.0, 2.0)
+SNIPPET_TOKENS = 12
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def query_tokens(query: str) -> List[str]:
+    return _TOKEN.findall(query or "")
+
+
+def build_match(query: str, prefix: bool = True, match_all: bool = True) -> Optional[str]:
+    """FTS5 MATCH expression for free text (all tokens, or any with match_all=False), or None if it has no tokens"""
+    tokens = query_tokens(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix and len(tokens[-1]) >= MIN_PREFIX_CHARS:
+        terms[-1] += "*"
+    return (" " if match_all else " OR ").join(terms)
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def search(query: str, limit: int = 10, cursor: Optional[str] = None, patient_id: Optional[str] = None,
+           kind: Optional[str] = None, prefix: bool = True) -> Dict[str, Any]:
+    """Best-first page of matches; pass `next_cursor` back as `cursor` for the next page"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = _decode_cursor(cursor) if cursor else 0
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+
+    match = build_match(query, prefix)
+    if match is None:
+        return {"query": query, "results": [], "count": 0, "next_cursor": None}
+
+    clauses, params = ["search_index MATCH ?"], [match]
+    if patient_id:
+        clauses.append("patient_id = ?")
+        params.append(patient_id)
+    if kind:
+        clauses.append("kind = ?")
+        params.append(kind)
+
+    with medical_db.get_pool().connection() as conn:
+        rows = conn.execute(f'''SELECT kind, ref_id, patient_id, date, diagnosis,
+                                     snippet(search_index, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}),
+                                     bm25(search_index, {", ".join(map(str, COLUMN_WEIGHTS))}) AS score
+                              FROM search_index WHERE {" AND ".join(clauses)}
+                              ORDER BY score LIMIT ? OFFSET ?''', params + [limit + 1, offset]).fetchall()
+
+    results: List[Dict[str, Any]] = [
+        {"kind": row[0], "id": row[1], "patient_id": row[2], "date": row[3], "diagnosis": row[4],
+         "snippet": row[5], "score": round(-row[6], 4)}
+        for row in rows[:limit]
+    ]
+    has_more = len(rows) > limit
+    return {
+        "query": query,
+        "results": results,
+        "count": len(results),
+        "next_cursor": _encode_cursor(offset + limit) if has_more else None,
+    }
+
+
+def optimize():
+    """Merge the index b-trees (after large imports)"""
+    with medical_db.get_pool().write() as conn:
+        conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
@@ -0,0 +1,225 @@
+"""
+Vector Backfill — Bulk-embed prescriptions and learning data already stored in SQLite.
+Pages through medical_history.db by primary key, batch-encodes each page with the same
+text format as the upload endpoints and writes it to the vector store in one chunk.
+Progress is checkpointed after every page, so an interrupted run resumes where it stopped.
+Every vector carries the row's embedding_id (`<table>:<id>` for rows that had none), and
+rows whose id is already in the store are skipped, so replaying a page after a crash
+between the vector write and the checkpoint does not duplicate vectors.
+
+The store files belong to the process that opened them: while the API server is up the
+CLI refuses to start, run the backfill through POST /api/vector-db/backfill instead.
+
+Usage (from backend/):
+    python -m app.services.vector_backfill            # rows that have no embedding yet
+    python -m app.services.vector_backfill --rebuild  # clear the store and re-embed everything
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import Dict, Any, List, Optional
+
+from . import medical_db
+from .vector_db import (VAULT_BASE, get_vector_db, encode_batch, prescription_embedding_text,
+                        prescription_metadata, learning_metadata)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = f"{VAULT_BASE}/embeddings/backfill_checkpoint.json"
+TABLES = ("prescriptions", "learning_data")
+
+
+def _load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _prescription_page(conn, after_id: int, limit: int, missing_only: bool) -> List[Dict[str, Any]]:
+    where = "id > ?" + (" AND embedding_id IS NULL" if missing_only else "")
+    rows = conn.execute(f'''SELECT id, patient_id, doctor_name, date, diagnosis, symptoms, embedding_id
+                            FROM prescriptions WHERE {where} ORDER BY id LIMIT ?''',
+                        (after_id, limit)).fetchall()
+    if not rows:
+        return []
+
+    medicines: Dict[int, List[Dict[str, str]]] = {row[0]: [] for row in rows}
+    placeholders = ",".join("?" * len(rows))
+    for m in conn.execute(f'''SELECT prescription_id, name, dosage, frequency, duration, instructions
+                              FROM medicines WHERE prescription_id IN ({placeholders}) ORDER BY id''',
+                          [row[0] for row in rows]):
+        medicines[m[0]].append({"name": m[1] or "", "dosage": m[2] or "", "frequency": m[3] or "",
+                                "duration": m[4] or "", "instructions": m[5] or ""})
+
+    page = []
+    for pid, patient_id, doctor_name, date, diagnosis, symptoms, embedding_id in rows:
+        meds = medicines[pid]
+        page.append({
+            "id": pid,
+            "embedding_id": embedding_id,
+            "text": prescription_embedding_text(symptoms, diagnosis, meds),
+            "metadata": prescription_metadata(patient_id, diagnosis, symptoms, meds, doctor_name, date,
+                                              embedding_id or f"prescriptions:{pid}"),
+        })
+    return page
+
+
+def _learning_page(conn, after_id: int, limit: int, missing_only: bool) -> List[Dict[str, Any]]:
+    where = "id > ?" + (" AND embedding_id IS NULL" if missing_only else "")
+    rows = conn.execute(f'''SELECT id, patient_id, input_text, diagnosis, confidence, timestamp, embedding_id
+                            FROM learning_data WHERE {where} ORDER BY id LIMIT ?''',
+                        (after_id, limit)).fetchall()
+    return [{
+        "id": lid,
+        "embedding_id": embedding_id,
+        "text": input_text or "",
+        "metadata": learning_metadata(patient_id, input_text, diagnosis, confidence, timestamp,
+                                      embedding_id or f"learning_data:{lid}"),
+    } for lid, patient_id, input_text, diagnosis, confidence, timestamp, embedding_id in rows]
+
+
+PAGE_READERS = {"prescriptions": _prescription_page, "learning_data": _learning_page}
+
+
+class BackfillJob:
+    """
+    One backfill run. `rebuild=False` only embeds rows without an embedding_id (e.g.
+    imported history); `rebuild=True` clears the vector store and re-embeds every row.
+    """
+
+    def __init__(self, rebuild: bool = False, page_size: int = 1000, encode_batch_size: int = 64,
+                 resume: bool = True, checkpoint_path: str = CHECKPOINT_PATH):
+        self.rebuild = rebuild
+        self.page_size = page_size
+        self.encode_batch_size = encode_batch_size
+        self.resume = resume
+        self.checkpoint_path = checkpoint_path
+        self.state = "pending"
+        self.error = None
+        self.progress = {table: {"rows": 0, "last_id": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+                         for table in TABLES}
+
+    def report(self) -> Dict[str, Any]:
+        total_rows = sum(p["rows"] for p in self.progress.values())
+        total_seconds = sum(p["seconds"] for p in self.progress.values())
+        return {
+            "state": self.state,
+            "mode": "rebuild" if self.rebuild else "missing",
+            "tables": self.progress,
+            "rows": total_rows,
+            "seconds": round(total_seconds, 2),
+            "rows_per_sec": round(total_rows / total_seconds, 1) if total_seconds else 0.0,
+            "error": self.error,
+        }
+
+    def run(self) -> Dict[str, Any]:
+        self.state = "running"
+        try:
+            self._run()
+            self.state = "completed"
+        except Exception as e:
+            logger.error(f"Vector backfill failed: {e}")
+            self.state = "failed"
+            self.error = str(e)
+        return self.report()
+
+    def _run(self):
+        mode = "rebuild" if self.rebuild else "missing"
+        checkpoint = _load_checkpoint(self.checkpoint_path) if self.resume else None
+        if checkpoint is None or checkpoint.get("mode") != mode:
+            checkpoint = {"mode": mode, **{table: 0 for table in TABLES}}
+            if self.rebuild:
+                get_vector_db().clear()
+            _save_checkpoint(self.checkpoint_path, checkpoint)
+        else:
+            logger.info(f"Resuming vector backfill from checkpoint {checkpoint}")
+
+        for table in TABLES:
+            self._backfill_table(table, checkpoint)
+
+        get_vector_db().compact()
+        os.remove(self.checkpoint_path)
+
+    def _backfill_table(self, table: str, checkpoint: Dict[str, Any]):
+        progress = self.progress[table]
+        started = time.perf_counter()
+        conn = medical_db.get_connection()
+        try:
+            while True:
+                page = PAGE_READERS[table](conn, checkpoint[table], self.page_size, not self.rebuild)
+                if not page:
+                    break
+
+                # A replayed page (crash before the checkpoint) already has some of its vectors
+                stored = get_vector_db().existing_embedding_ids([row["metadata"]["embedding_id"] for row in page])
+                pending = [row for row in page if row["metadata"]["embedding_id"] not in stored]
+                if pending:
+                    embeddings = encode_batch([row["text"] for row in pending], batch_size=self.encode_batch_size)
+                    get_vector_db().add_many(embeddings, [row["metadata"] for row in pending])
+
+                # Record the embedding id on rows that were imported without one
+                new_ids = [(row["metadata"]["embedding_id"], row["id"]) for row in page if not row["embedding_id"]]
+                if new_ids:
+                    with medical_db.pool.write() as writer:
+                        writer.executemany(f"UPDATE {table} SET embedding_id = ? WHERE id = ?", new_ids)
+
+                checkpoint[table] = page[-1]["id"]
+                _save_checkpoint(self.checkpoint_path, checkpoint)
+
+                elapsed = time.perf_counter() - started
+                progress["rows"] += len(page)
+                progress["last_id"] = checkpoint[table]
+                progress["seconds"] = round(elapsed, 2)
+                progress["rows_per_sec"] = round(progress["rows"] / elapsed, 1) if elapsed else 0.0
+                logger.info(f"Backfill {table}: {progress['rows']} rows ({progress['rows_per_sec']} rows/sec)")
+        finally:
+            conn.close()
+
+
+_current_job: Optional[BackfillJob] = None
+_job_lock = threading.Lock()
+
+
+def start_backfill(**kwargs) -> BackfillJob:
+    """Start a backfill on a background thread unless one is already running"""
+    global _current_job
+    with _job_lock:
+        if _current_job is not None and _current_job.state == "running":
+            return _current_job
+        _current_job = BackfillJob(**kwargs)
+        _current_job.state = "running"
+        threading.Thread(target=_current_job.run, name="vector-backfill", daemon=True).start()
+        return _current_job
+
+
+def current_backfill() -> Optional[BackfillJob]:
+    return _current_job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-embed medical_history.db into the vector store")
+    parser.add_argument("--rebuild", action="store_true", help="clear the vector store and re-embed every row")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--encode-batch-size", type=int, default=64)
+    parser.add_argument("--no-resume", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    job = BackfillJob(rebuild=args.rebuild, page_size=args.page_size,
+                      encode_batch_size=args.encode_batch_size, resume=not args.no_resume)
+    print(json.dumps(job.run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,58 @@ Vector Database Service — Semantic search using SentenceTransformer embeddings
 Ported from NEXUS_2 backend.
 """
 import os
+import time
+import atexit
 import pickle
+import threading
 import numpy as np
 import logging
 from typing import List, Dict, Any, Optional
-from sklearn.metrics.pairwise import cosine_similarity
+
+from .vector_store import VectorStore, normalize_rows
+from .ann_index import IVFIndex, top_k_indices
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .vector_metadata import MetadataStore, validate_filters
+from .vector_wal import WriteAheadLog
+from .vector_quantization import ScalarQuantizer
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per store is assumed
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
 VAULT_BASE = os.getenv("VAULT_BASE", "./nexus_vault")
-os.makedirs(f"{VAULT_BASE}/embeddings", exist_ok=True)
+
+# "exact" scans every row; "ivf" uses the approximate inverted-file index
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "exact")
+IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0")) or None
+IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
+
+# "float32" scans the full-precision matrix; "int8" scans 8-bit scalar-quantized codes
+# and re-ranks the best top_k * VECTOR_RERANK candidates exactly (0 disables re-ranking)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK", "4"))
+
+# Hybrid search: reciprocal-rank fusion of the vector and lexical (bm25) rankings, each
+# contributing its best max(top_k * HYBRID_CANDIDATES_FACTOR, HYBRID_MIN_CANDIDATES) rows
+SIMILARITY_CUTOFF = 0.3
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES_FACTOR = int(os.getenv("HYBRID_CANDIDATES_FACTOR", "4"))
+HYBRID_MIN_CANDIDATES = int(os.getenv("HYBRID_MIN_CANDIDATES", "50"))
+
+# Write-ahead log group commit and background compaction
+WAL_FSYNC_BATCH = int(os.getenv("VECTOR_WAL_FSYNC_BATCH", "64"))
+WAL_FSYNC_MS = float(os.getenv("VECTOR_WAL_FSYNC_MS", "50"))
+COMPACT_INTERVAL_S = float(os.getenv("VECTOR_COMPACT_INTERVAL_S", "30"))
+COMPACT_RECORDS = int(os.getenv("VECTOR_COMPACT_RECORDS", "5000"))
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
 
 # Lazy-load SentenceTransformer to avoid slow import on startup
 _embedder = None
@@ -21,70 +63,524 @@ def get_embedder():
     global _embedder
     if _embedder is None:
         from sentence_transformers import SentenceTransformer
-        _embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        _embedder = SentenceTransformer(EMBEDDING_MODEL)
         logger.info("SentenceTransformer loaded successfully")
     return _embedder
 
+def encode_batch(texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+    """Encode several texts in one model call"""
+    return get_embedder().encode(texts, batch_size=batch_size or len(texts))
+
+
+def prescription_embedding_text(symptoms: str, diagnosis: str, medicines: List[Dict]) -> str:
+    """Text embedded for a prescription (shared by upload and bulk backfill)"""
+    return f"Symptoms: {symptoms} Diagnosis: {diagnosis} Medicines: {', '.join([m['name'] for m in medicines])}"
+
+
+def prescription_metadata(patient_id: str, diagnosis: str, symptoms: str, medicines: List[Dict],
+                          doctor_name: str, date: str, embedding_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "patient_id": patient_id, "diagnosis": diagnosis, "symptoms": symptoms,
+        "medicines": medicines, "doctor_name": doctor_name,
+        "date": date, "type": "prescription",
+        "precautions": [m.get("instructions", "") for m in medicines],
+        "embedding_id": embedding_id
+    }
+
+
+def learning_metadata(patient_id: str, input_text: str, diagnosis: str, confidence: float,
+                      timestamp: str, embedding_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "patient_id": patient_id, "input_text": input_text,
+        "diagnosis": diagnosis, "confidence": confidence,
+        "timestamp": timestamp, "type": "learning_data",
+        "embedding_id": embedding_id
+    }
+
+embedding_batcher = EmbeddingBatcher(encode_batch, max_batch_size=EMBED_MAX_BATCH,
+                                     max_wait_ms=EMBED_MAX_WAIT_MS)
+
+# Disk-backed singletons are opened on first use, not at import
+_embedding_cache = None
+_vector_db = None
+_singleton_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _singleton_lock:
+            if _embedding_cache is None:
+                os.makedirs(f"{VAULT_BASE}/embeddings", exist_ok=True)
+                _embedding_cache = EmbeddingCache(f"{VAULT_BASE}/embeddings/cache.db", EMBEDDING_MODEL,
+                                                  capacity=EMBED_CACHE_SIZE)
+    return _embedding_cache
+
+
+def get_vector_db() -> "VectorDatabase":
+    global _vector_db
+    if _vector_db is None:
+        with _singleton_lock:
+            if _vector_db is None:
+                _vector_db = VectorDatabase()
+    return _vector_db
+
+
+def __getattr__(name):
+    # `from .vector_db import vector_db` keeps working but loads the store lazily
+    if name == "vector_db":
+        return get_vector_db()
+    if name == "embedding_cache":
+        return get_embedding_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def generate_embedding(text: str) -> List[float]:
     """Generate vector embedding for text"""
-    embedder = get_embedder()
-    embedding = embedder.encode(text)
-    return embedding.tolist()
+    cache = get_embedding_cache()
+    embedding = cache.get(text)
+    if embedding is None:
+        embedding = embedding_batcher.embed(text)
+        cache.put(text, embedding)
+    return embedding
+
+async def generate_embedding_async(text: str) -> List[float]:
+    """Generate vector embedding for text without blocking the event loop"""
+    cache = get_embedding_cache()
+    embedding = cache.get(text)
+    if embedding is None:
+        embedding = await embedding_batcher.embed_async(text)
+        cache.put(text, embedding)
+    return embedding
+
+
+class StoreLockedError(RuntimeError):
+    """The vector store files are held by another process"""
 
 
 class VectorDatabase:
-    def __init__(self, db_path=None):
-        self.db_path = db_path or f"{VAULT_BASE}/embeddings/vectors.pkl"
-        self.vectors = []
-        self.metadata = []
+    """
+    Inserts are appended to a write-ahead log (`<db_path>.wal`) and applied in memory,
+    so `add()` is constant-time. A background compactor periodically folds the log into
+    the main segment (vector matrix, metadata, ANN index) and truncates it; startup
+    replays whatever the last compaction did not cover.
+
+    The store files are owned by one process at a time (an exclusive lock on
+    `<db_path>.lock`); opening a store another process holds raises StoreLockedError.
+    The API therefore runs as a single uvicorn worker (see Dockerfile.backend).
+    """
+
+    def __init__(self, db_path=None, index_type=None, storage=None):
+        # Base path: vectors live in `<db_path>.f32`, metadata in `<db_path>.meta.db`
+        self.db_path = db_path or f"{VAULT_BASE}/embeddings/vectors"
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.metadata_path = f"{self.db_path}.meta.db"
+        self.index_type = index_type or VECTOR_INDEX
+        self.storage = storage or VECTOR_STORAGE
+        self.store = None
+        self.index = None
+        self.quantizer = None
+        self.wal = None
+        self.metadata_store = None
+        self._lock_file = None
+
+        self._lock = threading.RLock()
+        self._compact_lock = threading.RLock()  # one compaction at a time; taken before _lock
+        self._compact_event = threading.Event()
+        self._index_retrain_pending = False
+        self._quantizer_retrain_pending = False
+        self._generation = 0  # bumped by clear(), so an in-flight retrain is discarded
+        self._compactor = None
+        self.compactions = 0
+        self.last_compaction_ms = 0.0
         self.load()
 
+    def __len__(self):
+        return len(self.store)
+
     def add(self, vector, metadata):
-        self.vectors.append(vector)
-        self.metadata.append(metadata)
-        self.save()
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self.wal.append(len(self.store), vector, metadata)
+            self._apply(vector, metadata)
+        if self.wal.records >= COMPACT_RECORDS:
+            self._compact_event.set()
+
+    def add_many(self, vectors, metadatas: List[Dict[str, Any]]):
+        """Bulk insert: one WAL write and one matrix append for the whole chunk"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) != len(metadatas):
+            raise ValueError("vectors and metadatas must have the same length")
+        if len(vectors) == 0:
+            return
+        with self._lock:
+            self.wal.append_many(len(self.store), vectors, metadatas)
+            self._apply(vectors, metadatas)
+        if self.wal.records >= COMPACT_RECORDS:
+            self._compact_event.set()
 
-    def search(self, query_vector, top_k=5):
-        if len(self.vectors) == 0:
+    def _apply(self, vectors, metadatas):
+        if isinstance(metadatas, dict):
+            metadatas = [metadatas]
+        start = self.store.append(vectors)
+        self.metadata_store.add_many(start, metadatas)
+        self._index_rows(start)
+
+    def search(self, query_vector, top_k=5, nprobe=None, filters=None):
+        """
+        Top-k most similar rows. `filters` (patient_id, type, doctor_name, date_from,
+        date_to) are resolved through the metadata store first, and only the matching
+        rows are scored exactly, so the result is the true top-k within that subset.
+        Metadata is read from disk for the returned hits only.
+        """
+        matrix = self.store.matrix  # one snapshot for the whole search; inserts carry on
+        if len(matrix) == 0:
             return []
 
-        similarities = cosine_similarity([query_vector], self.vectors)[0]
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        query = normalize_rows(np.array(query_vector, dtype=np.float32, ndmin=2))[0]
+        top_indices, scores = self._vector_ranking(query, matrix, top_k, nprobe, validate_filters(filters))
 
+        keep = scores > SIMILARITY_CUTOFF
+        top_indices, scores = top_indices[keep], scores[keep]
         results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.3:
+        for metadata, score in zip(self.metadata_store.get_many(top_indices), scores):
+            if metadata is not None:
                 results.append({
-                    "metadata": self.metadata[idx],
-                    "similarity": float(similarities[idx])
+                    "metadata": metadata,
+                    "similarity": float(score)
                 })
         return results
 
+    def hybrid_search(self, query_text: str, query_vector, top_k=5, nprobe=None, filters=None,
+                      vector_weight: float = 1.0, lexical_weight: float = 1.0):
+        """
+        Vector and bm25 rankings merged with reciprocal-rank fusion:
+        score = sum(weight / (HYBRID_RRF_K + rank)). Exact medicine names and rare terms
+        can surface a row whose embedding is below the vector cutoff; rows found only by
+        the vector ranking still need a similarity above it.
+        """
+        matrix = self.store.matrix
+        if len(matrix) == 0:
+            return []
+
+        filters = validate_filters(filters)
+        query = normalize_rows(np.array(query_vector, dtype=np.float32, ndmin=2))[0]
+        depth = max(top_k * HYBRID_CANDIDATES_FACTOR, HYBRID_MIN_CANDIDATES)
+        vector_ids, vector_scores = self._vector_ranking(query, matrix, depth, nprobe, filters)
+        lexical_ids, lexical_scores = self.metadata_store.lexical_search(query_text, depth, filters)
+        in_store = lexical_ids < len(matrix)
+        lexical_ids, lexical_scores = lexical_ids[in_store], lexical_scores[in_store]
+
+        fused: Dict[int, float] = {}
+        for weight, ids in ((vector_weight, vector_ids), (lexical_weight, lexical_ids)):
+            for rank, row_id in enumerate(ids.tolist(), start=1):
+                fused[row_id] = fused.get(row_id, 0.0) + weight / (HYBRID_RRF_K + rank)
+        similarity = dict(zip(vector_ids.tolist(), vector_scores.tolist()))
+        lexical = dict(zip(lexical_ids.tolist(), lexical_scores.tolist()))
+        # Rows only the lexical side found still report their cosine similarity
+        missing = [row_id for row_id in lexical if row_id not in similarity]
+        if missing:
+            similarity.update(zip(missing, (matrix[missing] @ query).tolist()))
+
+        ranked = sorted((row_id for row_id in fused if row_id in lexical or similarity[row_id] > SIMILARITY_CUTOFF),
+                        key=lambda row_id: -fused[row_id])[:top_k]
+        results = []
+        for row_id, metadata in zip(ranked, self.metadata_store.get_many(ranked)):
+            if metadata is not None:
+                results.append({
+                    "metadata": metadata,
+                    "similarity": float(similarity[row_id]),
+                    "lexical_score": round(float(lexical.get(row_id, 0.0)), 4),
+                    "score": round(fused[row_id], 6),
+                })
+        return results
+
+    def _vector_ranking(self, query, matrix, top_k, nprobe, filters):
+        """
+        Top-k rows of `matrix` (a snapshot of the store) by cosine similarity (no cutoff),
+        restricted to `filters` when given
+        """
+        index = self.index
+        if filters:
+            candidates = self.metadata_store.select(filters)
+            candidates = candidates[candidates < len(matrix)]
+            if len(candidates) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        elif index is not None and index.is_trained:
+            candidates = index.candidates(query, len(matrix), nprobe)
+        else:
+            candidates = None
+        return self._rank(query, matrix, candidates, top_k)
+
+    def get_metadata(self, row_id: int) -> Optional[Dict[str, Any]]:
+        return self.metadata_store.get(row_id)
+
+    def existing_embedding_ids(self, embedding_ids: List[str]) -> set:
+        """Which of these embedding ids already have a vector"""
+        return self.metadata_store.existing_embedding_ids(embedding_ids)
+
+    def _rank(self, query, matrix, candidates, top_k):
+        """Top-k of the candidate rows (every row when None) as (row ids, similarities)"""
+        quantizer = self.quantizer  # a retrain swaps in a new one
+        quantized = quantizer is not None and quantizer.is_trained and len(quantizer) >= len(matrix)
+        if not quantized:
+            scores = matrix @ query if candidates is None else matrix[candidates] @ query
+            best = top_k_indices(scores, top_k)
+            return (best if candidates is None else candidates[best]), scores[best]
+
+        approx = quantizer.scores(query, candidates, rows=len(matrix))
+        shortlist = top_k_indices(approx, top_k * max(RERANK_FACTOR, 1))
+        ids = shortlist if candidates is None else candidates[shortlist]
+        if not RERANK_FACTOR:
+            return ids, approx[shortlist]
+        exact = matrix[ids] @ query
+        best = top_k_indices(exact, top_k)
+        return ids[best], exact[best]
+
+    def _index_rows(self, start):
+        """Bring the ANN index and quantized codes up to date with newly appended rows"""
+        # Training is O(N), so the compactor does it; searches keep the current codes and
+        # centroids (or the exact scan) meanwhile
+        if self.quantizer is not None:
+            self.quantizer.add(self.store.matrix)
+            if not self._quantizer_retrain_pending and self.quantizer.needs_training(len(self.store)):
+                self._quantizer_retrain_pending = True
+                self._compact_event.set()
+        if self.index is None:
+            return
+        if self.index.is_trained:
+            self.index.add(self.store.matrix, start)
+        if not self._index_retrain_pending and self.index.needs_training(len(self.store)):
+            self._index_retrain_pending = True
+            self._compact_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": len(self.store),
+            "dim": self.store.dim,
+            "index": self.index.stats() if self.index is not None else {"type": "exact"},
+            "storage": self.quantizer.stats() if self.quantizer is not None else {"type": "float32"},
+            "float_bytes": self.store.nbytes,
+            "wal": {
+                "pending_records": self.wal.records,
+                "bytes": self.wal.size_bytes,
+                "fsyncs": self.wal.fsyncs,
+            },
+            "compactions": self.compactions,
+            "last_compaction_ms": self.last_compaction_ms,
+        }
+
     def save(self):
+        self.compact()
+
+    def compact(self):
+        """
+        Fold the WAL into the main segment, then drop the folded records. Only the
+        snapshot (row counts, index lists, WAL position) is taken under the lock; the
+        flush and index save run while inserts and searches carry on, and records
+        appended meanwhile stay in the WAL for the next compaction.
+        """
+        with self._compact_lock:
+            started = time.perf_counter()
+            try:
+                with self._lock:
+                    rows = len(self.store)
+                    codes = len(self.quantizer) if self.quantizer is not None else None
+                    index = self.index.snapshot() if self.index is not None else None
+                    wal_mark = self.wal.mark()
+                self.wal.sync()
+                self.metadata_store.checkpoint()
+                self.store.flush(rows)
+                if self.quantizer is not None:
+                    self.quantizer.flush(codes)
+                if index is not None:
+                    self.index.save(index)
+                self.wal.truncate(wal_mark)
+            except Exception as e:
+                logger.error(f"Failed to save vector DB: {e}")
+                return
+            self.compactions += 1
+            self.last_compaction_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _write_segment(self):
+        """Flush the vector matrix and metadata (does not touch the WAL)"""
+        self.metadata_store.checkpoint()
+        self.store.flush()
+
+    def _compactor_loop(self):
+        last_compaction = time.monotonic()
+        while True:
+            triggered = self._compact_event.wait(timeout=self.wal.fsync_interval)
+            self._compact_event.clear()
+            # Group commit for an idle tail that never filled a whole fsync batch
+            self.wal.sync()
+            if self._quantizer_retrain_pending:
+                self._retrain_quantizer()
+            if self._index_retrain_pending:
+                self._retrain_index()
+            if self.wal.records and (triggered or time.monotonic() - last_compaction >= COMPACT_INTERVAL_S):
+                self.compact()
+                last_compaction = time.monotonic()
+
+    def _retrain_quantizer(self):
+        """Encode a snapshot of the rows with fresh parameters on side files off-lock, then swap them in"""
+        with self._lock:
+            matrix = self.store.matrix
+            generation = self._generation
+            fresh = self.quantizer.untrained_copy()
+        try:
+            fresh.train(matrix)
+        except Exception as e:
+            logger.error(f"Quantizer retrain failed: {e}")
+            self._quantizer_retrain_pending = False
+            return
+        # The compaction lock keeps a flush of the old codes from racing the rename
+        with self._compact_lock, self._lock:
+            self._quantizer_retrain_pending = False
+            if generation != self._generation:
+                return  # cleared while training
+            fresh.add(self.store.matrix)  # rows appended during training
+            fresh.replace(self.quantizer)
+            self.quantizer = fresh
+
+    def _retrain_index(self):
+        """Train a fresh IVF index on a snapshot of the rows off-lock, then swap it in"""
+        with self._lock:
+            matrix = self.store.matrix
+            generation = self._generation
+            fresh = self.index.untrained_copy()
         try:
-            with open(self.db_path, 'wb') as f:
-                pickle.dump({'vectors': self.vectors, 'metadata': self.metadata}, f)
+            fresh.train(matrix)
         except Exception as e:
-            logger.error(f"Failed to save vector DB: {e}")
+            logger.error(f"IVF retrain failed: {e}")
+            self._index_retrain_pending = False
+            return
+        with self._lock:
+            self._index_retrain_pending = False
+            if generation != self._generation:
+                return  # cleared while training
+            fresh.add(self.store.matrix, len(matrix))  # rows appended during training
+            self.index = fresh
+        self.compact()
+
+    def _replay_wal(self):
+        replayed = 0
+        for row_id, vector, metadata in self.wal.replay():
+            if row_id < len(self.store):
+                continue  # already folded in before the last crash
+            if row_id != len(self.store):
+                logger.error(f"Vector WAL gap at row {row_id} (store has {len(self.store)}); stopping replay")
+                break
+            self._apply(vector, metadata)
+            replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} vectors from the WAL")
+        self.compact()
+
+    def close(self):
+        if self.wal is not None:
+            self.wal.sync()
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the flock
+            self._lock_file = None
+
+    def _acquire_process_lock(self):
+        """Exclusive cross-process lock on the store files (memmap, WAL, metadata)"""
+        lock_file = open(f"{self.db_path}.lock", "a+")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.seek(0)
+            owner = lock_file.read().strip() or "unknown"
+            lock_file.close()
+            raise StoreLockedError(f"Vector store {self.db_path} is open in another process (pid {owner}); "
+                                   f"the API runs as a single worker, and the backfill goes through "
+                                   f"POST /api/vector-db/backfill on that server")
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return lock_file
 
     def load(self):
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.vectors = data['vectors']
-                    self.metadata = data['metadata']
-                logger.info(f"Vector DB loaded: {len(self.vectors)} vectors")
-            except Exception as e:
-                logger.error(f"Failed to load vector DB: {e}")
-                self.vectors = []
-                self.metadata = []
+        if self._lock_file is None:
+            self._lock_file = self._acquire_process_lock()
+        self.store = VectorStore(self.db_path)
+        self.wal = WriteAheadLog(f"{self.db_path}.wal", fsync_batch=WAL_FSYNC_BATCH,
+                                 fsync_interval_ms=WAL_FSYNC_MS)
+        self.metadata_store = MetadataStore(self.metadata_path)
+        if os.path.exists(f"{self.db_path}.meta.pkl"):
+            self._import_metadata_pickle()
+        elif len(self.store) == 0:
+            self._import_legacy_pickle()
 
-    def clear(self):
-        self.vectors = []
-        self.metadata = []
-        self.save()
+        # A crash between flushing vectors and metadata can leave them out of step
+        metadata_count = self.metadata_store.count()
+        if len(self.store) != metadata_count:
+            logger.warning(f"Vector DB out of sync ({len(self.store)} vectors, "
+                           f"{metadata_count} metadata); truncating to the shorter")
+            self.store.count = min(len(self.store), metadata_count)
+            self.metadata_store.truncate(self.store.count)
+            self._write_segment()
 
+        if self.storage == "int8":
+            self.quantizer = ScalarQuantizer(self.db_path, self.store.dim)
+            if len(self.quantizer) > len(self.store):
+                self.quantizer.reset()
+        if self.index_type == "ivf":
+            self.index = IVFIndex(f"{self.db_path}.ivf.npz", nlist=IVF_NLIST, nprobe=IVF_NPROBE)
+            if self.index.count > len(self.store):
+                self.index.reset()
+        # Catch up on rows written after the index/codes were last saved
+        self._index_rows(self.index.count if self.index is not None else len(self.store))
+
+        self._replay_wal()
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compactor_loop, name="vector-compactor", daemon=True)
+            self._compactor.start()
+            atexit.register(self.close)
+        logger.info(f"Vector DB loaded: {len(self.store)} vectors")
+
+    def _import_legacy_pickle(self):
+        """One-time migration from the old `vectors.pkl` list-of-lists format"""
+        legacy_path = f"{self.db_path}.pkl"
+        if not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, 'rb') as f:
+                data = pickle.load(f)
+            if data['vectors']:
+                self.store.append(data['vectors'])
+            self.metadata_store.add_many(0, data['metadata'])
+            self._write_segment()
+            logger.info(f"Migrated {len(data['metadata'])} vectors from {legacy_path}")
+        except Exception as e:
+            logger.error(f"Failed to migrate legacy vector DB: {e}")
+            self.store.clear()
+            self.metadata_store.clear()
+
+    def _import_metadata_pickle(self):
+        """One-time migration of the in-memory metadata list pickled next to the vectors"""
+        pickle_path = f"{self.db_path}.meta.pkl"
+        try:
+            with open(pickle_path, 'rb') as f:
+                metadata = pickle.load(f)
+            self.metadata_store.clear()
+            self.metadata_store.add_many(0, metadata)
+            os.remove(pickle_path)
+            logger.info(f"Moved {len(metadata)} metadata records from {pickle_path} to {self.metadata_path}")
+        except Exception as e:
+            logger.error(f"Failed to migrate vector metadata: {e}")
+
+    def clear(self):
+        with self._compact_lock, self._lock:
+            self._generation += 1
+            self.store.clear()
+            self.metadata_store.clear()
+            if self.index is not None:
+                self.index.reset()
+            if self.quantizer is not None:
+                self.quantizer.reset()
+            self.compact()
 
-# Singleton instance
-vector_db = VectorDatabase()
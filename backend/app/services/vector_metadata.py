@@ -0,0 +1,219 @@
+"""
+Vector Metadata Store — On-disk metadata for VectorDatabase rows, keyed by row id.
+Documents live in SQLite with the filterable fields (patient_id, type, doctor_name,
+date) broken out into indexed columns, so filters are answered by the database and
+search only hydrates the final top-k hits.
+
+The searchable text of each document (symptoms, diagnosis, medicines, precautions) is
+also kept in an FTS5 table with the same row ids, written in the same transaction as
+the metadata, for the lexical half of hybrid search.
+"""
+import json
+import sqlite3
+import logging
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from .text_search import build_match, query_tokens
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ("patient_id", "type", "doctor_name")
+RANGE_FILTERS = ("date_from", "date_to")
+TEXT_FIELDS = ("symptoms", "diagnosis", "input_text")
+# Lexical queries only use terms found in at most this many documents in total (rarest
+# first), which bounds bm25 scoring however common the other query words are. Document
+# frequencies are counted up to the budget and cached, since they drift slowly.
+LEXICAL_POSTINGS_BUDGET = 5000
+TERM_COUNT_CACHE_SIZE = 8192
+TERM_COUNT_TTL_S = 300
+
+
+def record_date(metadata: Dict[str, Any]) -> str:
+    """Prescriptions carry `date`, learning data carries `timestamp` (both ISO-8601)"""
+    return metadata.get("date") or metadata.get("timestamp") or ""
+
+
+def document_text(metadata: Dict[str, Any]) -> str:
+    """Text indexed for lexical search"""
+    parts = [str(metadata.get(field) or "") for field in TEXT_FIELDS]
+    for med in metadata.get("medicines") or []:
+        parts.append(str(med.get("name", "")) if isinstance(med, dict) else str(med))
+    parts.extend(str(p) for p in metadata.get("precautions") or [] if p)
+    return " ".join(p for p in parts if p)
+
+
+def validate_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Drop empty values and reject fields that are not indexed"""
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
+    unknown = set(filters) - set(INDEXED_FIELDS) - set(RANGE_FILTERS)
+    if unknown:
+        raise ValueError(f"Unsupported filter fields: {', '.join(sorted(unknown))}")
+    return filters
+
+
+class MetadataStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._term_counts = TTLCache(TERM_COUNT_CACHE_SIZE, TERM_COUNT_TTL_S)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS vector_metadata
+                            (row_id INTEGER PRIMARY KEY,
+                             patient_id TEXT,
+                             type TEXT,
+                             doctor_name TEXT,
+                             date TEXT,
+                             document TEXT NOT NULL,
+                             embedding_id TEXT)''')
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(vector_metadata)")}
+        if "embedding_id" not in columns:
+            self._conn.execute("ALTER TABLE vector_metadata ADD COLUMN embedding_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_vector_metadata_embedding_id "
+                           "ON vector_metadata(embedding_id)")
+        for field in INDEXED_FIELDS + ("date",):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_vector_metadata_{field} "
+                               f"ON vector_metadata({field}, row_id)")
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS vector_text USING fts5"
+                           "(text, tokenize = 'unicode61 remove_diacritics 2')")
+        self._conn.commit()
+        self._index_missing_text()
+
+    def _index_missing_text(self):
+        """Index documents written before the text table existed"""
+        with self._lock:
+            indexed = self._conn.execute("SELECT COALESCE(MAX(rowid), -1) FROM vector_text").fetchone()[0]
+            rows = self._conn.execute("SELECT row_id, document FROM vector_metadata WHERE row_id > ?",
+                                      (indexed,)).fetchall()
+            if rows:
+                self._conn.executemany("INSERT INTO vector_text (rowid, text) VALUES (?, ?)",
+                                       [(row_id, document_text(json.loads(doc))) for row_id, doc in rows])
+                self._conn.commit()
+                logger.info(f"Indexed text of {len(rows)} vector metadata records")
+
+    def count(self) -> int:
+        """Rows [0, count) are expected to be present"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(row_id) FROM vector_metadata").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def add_many(self, first_row_id: int, metadatas: List[Dict[str, Any]]):
+        rows = [(first_row_id + i, m.get("patient_id"), m.get("type"), m.get("doctor_name"),
+                 record_date(m), json.dumps(m, default=str), m.get("embedding_id"))
+                for i, m in enumerate(metadatas)]
+        with self._lock:
+            self._conn.executemany('''INSERT OR REPLACE INTO vector_metadata
+                                    (row_id, patient_id, type, doctor_name, date, document, embedding_id)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+            self._conn.execute("DELETE FROM vector_text WHERE rowid >= ? AND rowid < ?",
+                               (first_row_id, first_row_id + len(rows)))
+            self._conn.executemany("INSERT INTO vector_text (rowid, text) VALUES (?, ?)",
+                                   [(first_row_id + i, document_text(m)) for i, m in enumerate(metadatas)])
+            self._conn.commit()
+
+    def get_many(self, row_ids) -> List[Optional[Dict[str, Any]]]:
+        """Documents for the given row ids, in the same order"""
+        row_ids = [int(r) for r in row_ids]
+        if not row_ids:
+            return []
+        placeholders = ",".join("?" * len(row_ids))
+        with self._lock:
+            found = dict(self._conn.execute(
+                f"SELECT row_id, document FROM vector_metadata WHERE row_id IN ({placeholders})", row_ids))
+        return [json.loads(found[r]) if r in found else None for r in row_ids]
+
+    def get(self, row_id: int) -> Optional[Dict[str, Any]]:
+        return self.get_many([row_id])[0]
+
+    def existing_embedding_ids(self, embedding_ids: List[str]) -> set:
+        """The subset of `embedding_ids` already stored"""
+        if not embedding_ids:
+            return set()
+        placeholders = ",".join("?" * len(embedding_ids))
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                f"SELECT embedding_id FROM vector_metadata WHERE embedding_id IN ({placeholders})",
+                list(embedding_ids))}
+
+    @staticmethod
+    def _filter_clauses(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        clauses, params = [], []
+        for field in INDEXED_FIELDS:
+            if field in filters:
+                clauses.append(f"{field} = ?")
+                params.append(filters[field])
+        if "date_from" in filters:
+            clauses.append("date >= ?")
+            params.append(str(filters["date_from"]))
+        if "date_to" in filters:
+            # Dates are ISO strings, so a bare YYYY-MM-DD bound covers that whole day
+            clauses.append("date <= ?")
+            params.append(str(filters["date_to"]) + "\uffff")
+        return clauses, params
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted row ids satisfying every filter (equality fields AND date range)"""
+        clauses, params = self._filter_clauses(validate_filters(filters))
+        where = " AND ".join(clauses) or "1"
+        with self._lock:
+            rows = self._conn.execute(f"SELECT row_id FROM vector_metadata WHERE {where} ORDER BY row_id",
+                                      params).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def _document_frequency(self, term: str) -> int:
+        """Documents containing `term`, counted up to just past the postings budget (caller holds the lock)"""
+        return self._conn.execute("SELECT COUNT(*) FROM (SELECT rowid FROM vector_text WHERE vector_text MATCH ? LIMIT ?)",
+                                  (build_match(term, prefix=False), LEXICAL_POSTINGS_BUDGET + 1)).fetchone()[0]
+
+    def lexical_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]] = None
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """Best bm25 matches of any query term as (row ids, scores), best first"""
+        terms = sorted({token.lower() for token in query_tokens(query)})
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        clauses, params = self._filter_clauses(validate_filters(filters))
+        with self._lock:
+            frequencies = [(term, self._term_counts.get_or_load(term, lambda: self._document_frequency(term)))
+                           for term in terms]
+            # Rarest terms first; they carry the signal the embedding misses
+            selected, postings = [], 0
+            for term, doc_count in sorted(frequencies, key=lambda f: f[1]):
+                if doc_count == 0:
+                    continue
+                if postings + doc_count > LEXICAL_POSTINGS_BUDGET:
+                    break
+                selected.append(term)
+                postings += doc_count
+            if not selected:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            where = "".join(f" AND m.{clause}" for clause in clauses)
+            rows = self._conn.execute(f'''SELECT t.rowid, bm25(vector_text) AS score FROM vector_text t
+                                          {"JOIN vector_metadata m ON m.row_id = t.rowid" if clauses else ""}
+                                          WHERE vector_text MATCH ?{where}
+                                          ORDER BY score LIMIT ?''',
+                                      [build_match(" ".join(selected), prefix=False, match_all=False)]
+                                      + params + [limit]).fetchall()
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        # bm25() is lower-is-better; flip it so larger means more relevant
+        scores = np.fromiter((-r[1] for r in rows), dtype=np.float32, count=len(rows))
+        return ids, scores
+
+    def truncate(self, count: int):
+        """Drop rows at or beyond `count` (metadata that outlived its vectors)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM vector_metadata WHERE row_id >= ?", (count,))
+            self._conn.execute("DELETE FROM vector_text WHERE rowid >= ?", (count,))
+            self._term_counts.clear()
+            self._conn.commit()
+
+    def checkpoint(self):
+        """Make committed rows durable in the main database file"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def clear(self):
+        self.truncate(0)
@@ -0,0 +1,146 @@
+"""
+Vector Quantization — Scalar 8-bit codes for the embedding matrix.
+Each dimension is mapped onto 256 levels between its trained min and max, cutting the
+scanned matrix to a quarter of its float32 size. Queries stay in float32 (asymmetric
+distance), and the best candidates can be re-ranked against the exact float rows.
+"""
+import os
+import logging
+import numpy as np
+from typing import Optional
+
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension uint8 quantizer with its own memory-mapped code matrix
+    (`<path>.sq8.u8`), kept row-aligned with the float32 VectorStore.
+
+    Should be trained (`needs_training`) once `min_train_size` rows exist and retrained,
+    re-encoding every row, after the store grows `retrain_factor` times; values outside
+    the trained range are clipped in between. The owner trains a copy on side files
+    (`untrained_copy`) off its lock and then moves it over this one (`replace`).
+    """
+
+    def __init__(self, path: str, dim: int, min_train_size: int = 1000, retrain_factor: int = 8,
+                 chunk_size: int = 16384):
+        self.path = path
+        self.params_path = f"{path}.sq8.npz"
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.chunk_size = chunk_size
+        self.codes = VectorStore(f"{path}.sq8", dim, dtype=np.uint8, normalize=False)
+        self.vmin = None
+        self.scale = None
+        self.trained_size = 0
+        self.load()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.vmin is not None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def stats(self) -> dict:
+        return {
+            "type": "sq8",
+            "trained": self.is_trained,
+            "encoded_rows": len(self.codes),
+            "code_bytes": self.codes.nbytes,
+        }
+
+    def train(self, matrix: np.ndarray, sample_size: int = 100000, seed: int = 42):
+        n = len(matrix)
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, min(n, sample_size), replace=False))])
+        self.vmin = sample.min(axis=0).astype(np.float32)
+        vmax = sample.max(axis=0).astype(np.float32)
+        self.scale = np.maximum(vmax - self.vmin, 1e-6).astype(np.float32) / 255.0
+        self.trained_size = n
+        np.savez(self.params_path, vmin=self.vmin, scale=self.scale, trained_size=n)
+
+        self.codes.count = 0
+        self.add(matrix)
+        self.codes.flush()
+        logger.info(f"Scalar quantizer trained on {n} rows")
+
+    def needs_training(self, n: int) -> bool:
+        """Whether a store of `n` rows has crossed the (re)training thresholds"""
+        if n < self.min_train_size:
+            return False
+        return not self.is_trained or n >= self.trained_size * self.retrain_factor
+
+    def untrained_copy(self) -> "ScalarQuantizer":
+        """Empty quantizer with the same settings on side files (`<path>.retrain.sq8.*`)"""
+        fresh = ScalarQuantizer(f"{self.path}.retrain", self.codes.dim, min_train_size=self.min_train_size,
+                                retrain_factor=self.retrain_factor, chunk_size=self.chunk_size)
+        fresh.reset()  # leftovers of a retrain that never finished
+        return fresh
+
+    def replace(self, other: "ScalarQuantizer"):
+        """
+        Move this quantizer's files over `other`'s and take its paths. Readers still holding
+        `other` keep scanning its mapping, which stays valid after the rename.
+        """
+        for attr in ("data_path", "header_path"):
+            os.replace(getattr(self.codes, attr), getattr(other.codes, attr))
+            setattr(self.codes, attr, getattr(other.codes, attr))
+        os.replace(self.params_path, other.params_path)
+        self.params_path = other.params_path
+        self.path = other.path
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint((rows - self.vmin) / self.scale), 0, 255).astype(np.uint8)
+
+    def add(self, matrix: np.ndarray):
+        """Encode rows the code matrix has not seen yet"""
+        if not self.is_trained:
+            return
+        for start in range(len(self.codes), len(matrix), self.chunk_size):
+            self.codes.append(self.encode(np.asarray(matrix[start:start + self.chunk_size])))
+
+    def scores(self, query: np.ndarray, ids: Optional[np.ndarray] = None,
+               rows: Optional[int] = None) -> np.ndarray:
+        """
+        Approximate cosine similarity of a normalized float query against the codes
+        (the first `rows` of them when scanning): q·x ≈ q·vmin + (q*scale)·code. The full
+        scan runs in chunks so the float conversion never materializes the whole matrix.
+        """
+        weighted = (query * self.scale).astype(np.float32)
+        bias = float(query @ self.vmin)
+        if ids is not None:
+            return self.codes.matrix[ids].astype(np.float32) @ weighted + bias
+
+        codes = self.codes.matrix[:rows]
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_size):
+            out[start:start + self.chunk_size] = codes[start:start + self.chunk_size].astype(np.float32) @ weighted
+        out += bias
+        return out
+
+    def flush(self, count: Optional[int] = None):
+        self.codes.flush(count)
+
+    def load(self):
+        if not os.path.exists(self.params_path):
+            return
+        try:
+            with np.load(self.params_path) as data:
+                self.vmin = data["vmin"]
+                self.scale = data["scale"]
+                self.trained_size = int(data["trained_size"])
+        except Exception as e:
+            logger.error(f"Failed to load quantizer parameters, it will be retrained: {e}")
+            self.reset()
+
+    def reset(self):
+        self.vmin = None
+        self.scale = None
+        self.trained_size = 0
+        self.codes.clear()
+        if os.path.exists(self.params_path):
+            os.remove(self.params_path)
@@ -0,0 +1,134 @@
+"""
+Vector Store — Contiguous float32 embedding matrix backing VectorDatabase.
+Rows are L2-normalized on insert so cosine similarity is a single matrix-vector product.
+"""
+import os
+import json
+import logging
+import threading
+import numpy as np
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# all-MiniLM-L6-v2 output size
+EMBEDDING_DIM = 384
+
+# File suffix per row dtype
+DTYPE_SUFFIXES = {np.dtype(np.float32): "f32", np.dtype(np.uint8): "u8"}
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place (zero rows are left as zeros)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+class VectorStore:
+    """
+    Growable, memory-mapped matrix of normalized float32 embeddings (or, with
+    `dtype=np.uint8, normalize=False`, raw quantization codes).
+
+    `<path>.f32` holds `capacity x dim` rows; `<path>.json` records the dimension
+    and the number of committed rows. Capacity doubles whenever it runs out, so
+    appends are amortized O(1) and startup only maps the file.
+    """
+
+    def __init__(self, path: str, dim: int = EMBEDDING_DIM, initial_capacity: int = 1024,
+                 dtype=np.float32, normalize: bool = True):
+        self.dtype = np.dtype(dtype)
+        self.normalize = normalize
+        self.data_path = f"{path}.{DTYPE_SUFFIXES[self.dtype]}"
+        self.header_path = f"{path}.json"
+        self.dim = dim
+        self.count = 0
+        self.initial_capacity = initial_capacity
+        self._matrix = None
+        self._header_lock = threading.Lock()
+        self.open()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the committed rows"""
+        return self.count * self.dim * self.dtype.itemsize
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        View of the committed rows. Readers without the writer's lock should take it once
+        and use it (and its length) for the whole operation: the count is read before the
+        mapping, and a mapping is never smaller than a count published before it.
+        """
+        count = self.count
+        return self._matrix[:count]
+
+    def open(self):
+        if os.path.exists(self.header_path):
+            with open(self.header_path) as f:
+                header = json.load(f)
+            self.dim = header["dim"]
+            self.count = header["count"]
+
+        row_bytes = self.dim * self.dtype.itemsize
+        if not os.path.exists(self.data_path) or os.path.getsize(self.data_path) < row_bytes:
+            with open(self.data_path, "wb") as f:
+                f.truncate(self.initial_capacity * row_bytes)
+        capacity = os.path.getsize(self.data_path) // row_bytes
+        if capacity < self.count:
+            logger.error(f"Vector store truncated: header says {self.count} rows, file holds {capacity}")
+            self.count = capacity
+        self._map(capacity)
+
+    def _map(self, capacity: int):
+        self._matrix = np.memmap(self.data_path, dtype=self.dtype, mode="r+",
+                                 shape=(capacity, self.dim))
+
+    def _grow(self, needed: int):
+        new_capacity = max(needed, self.capacity * 2)
+        self._matrix.flush()
+        with open(self.data_path, "r+b") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        # Readers holding the old mapping keep using it; new ones see the bigger one
+        self._map(new_capacity)
+
+    def append(self, vectors) -> int:
+        """Normalize and append one or more rows; returns the first new row id"""
+        rows = np.array(vectors, dtype=self.dtype, ndmin=2)
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {rows.shape[1]}")
+        if self.normalize:
+            normalize_rows(rows)
+
+        start = self.count
+        end = start + len(rows)
+        if end > self.capacity:
+            self._grow(end)
+        self._matrix[start:end] = rows
+        self.count = end
+        return start
+
+    def flush(self, count: Optional[int] = None):
+        """
+        Sync mapped rows to disk, then atomically publish the row count. `count` (default:
+        the current one) lets a caller publish a snapshot while appends continue.
+        """
+        count = self.count if count is None else count
+        self._matrix.flush()
+        with self._header_lock:
+            tmp_path = f"{self.header_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"dim": self.dim, "count": count, "dtype": self.dtype.name}, f)
+            os.replace(tmp_path, self.header_path)
+
+    def clear(self):
+        self.count = 0
+        self.flush()
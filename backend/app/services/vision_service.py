@@ -3,8 +3,9 @@ import json
 import re
 import base64
 import google.generativeai as genai
-from PIL import Image
-import io
+
+from .executors import run_io
+from . import image_ingest
 
 class VisionService:
     def __init__(self):
@@ -27,8 +28,9 @@ class VisionService:
         try:
             print("📸 Analyzing image with Gemini 1.5 Flash (fast multimodal)...")
             
-            # Convert image bytes to PIL Image for Gemini
-            pil_image = Image.open(io.BytesIO(image_bytes))
+            # Convert image bytes to PIL Image for Gemini (downscaled on decode, Gemini tiles it smaller anyway)
+            pil_image, ingest = await run_io(image_ingest.load, image_bytes, image_ingest.MAX_SIDES["vision"])
+            print(f"📐 Report image {ingest['source_size']} -> {ingest['decoded_size']} in {ingest['decode_ms']} ms")
             
             language_names = {
                 "en": "English", "hi": "Hindi", "te": "Telugu",
@@ -63,7 +65,7 @@ Return ONLY valid JSON (no markdown, no code blocks):
 }}"""
 
             # Send image + prompt to Gemini (multimodal call)
-            response = self.model.generate_content([prompt, pil_image])
+            response = await run_io(self.model.generate_content, [prompt, pil_image])
             text = response.text
             
             print(f"✅ Gemini vision response received ({len(text)} chars)")
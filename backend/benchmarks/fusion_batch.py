@@ -0,0 +1,81 @@
+"""
+MultiModalFusion throughput: scalar predict() loop against predict_batch().
+
+Generates synthetic screening-camp vitals, scores them both ways, checks that every
+patient's batch result equals the scalar prediction, and reports patients/sec for the
+columnar scores and for the full per-patient expansion (batch_rows).
+
+Usage (from backend/):
+    python benchmarks/fusion_batch.py --patients 10000 100000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.fusion_model import MultiModalFusion
+
+
+def synthetic_vitals(n, rng):
+    return {
+        "glucose": rng.uniform(60, 420, n).round(0),
+        "heart_rate": rng.uniform(50, 170, n).round(0),
+        "spo2": rng.uniform(75, 100, n).round(0),
+        "systolic": rng.uniform(95, 190, n).round(0),
+    }
+
+
+def patient_data(vitals, lab_abnormal, i):
+    return {
+        "vitals": {
+            "glucose": float(vitals["glucose"][i]),
+            "heart_rate": float(vitals["heart_rate"][i]),
+            "spo2": float(vitals["spo2"][i]),
+            "blood_pressure": {"systolic": float(vitals["systolic"][i]), "diastolic": 80.0},
+        },
+        "lab_data": {"abnormal": bool(lab_abnormal[i])},
+    }
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>12,.0f} patients/s  ({seconds * 1000:9.1f} ms)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    model = MultiModalFusion()
+    rng = np.random.default_rng(21)
+    for n in args.patients:
+        vitals = synthetic_vitals(n, rng)
+        lab_abnormal = rng.random(n) < 0.15
+        patients = [patient_data(vitals, lab_abnormal, i) for i in range(n)]
+
+        started = time.perf_counter()
+        scalar = [model.predict(None, p) for p in patients]
+        scalar_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = model.predict_batch(vitals, lab_abnormal=lab_abnormal)
+        batch_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows = model.batch_rows(batch)
+        rows_s = time.perf_counter() - started
+
+        assert rows == scalar, "batch results differ from predict()"
+        assert batch["treatment_cost"].tolist() == [p["treatment_cost"] for p in scalar]
+
+        print(f"{n} patients (identical to scalar path)")
+        print(f"  {'predict() loop':<24}{rate(n, scalar_s)}")
+        print(f"  {'predict_batch() columns':<24}{rate(n, batch_s)}")
+        print(f"  {'+ batch_rows()':<24}{rate(n, batch_s + rows_s)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Hybrid (vector + bm25) search latency against the pure-vector path.
+
+Fills a throwaway VectorDatabase with synthetic prescriptions (clustered embeddings,
+symptom text drawn from a shared vocabulary, one medicine per row from a long tail of
+names) and times `search` and `hybrid_search` on the same queries. Each query also names
+one medicine; "term hits" is how many of the top-k results actually contain it.
+
+Usage (from backend/):
+    python benchmarks/hybrid_search.py --rows 200000 --queries 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_VAULT = tempfile.mkdtemp()
+os.environ["VAULT_BASE"] = TMP_VAULT
+
+from app.services.vector_db import VectorDatabase, prescription_metadata  # noqa: E402  (VAULT_BASE must be set first)
+
+SYMPTOMS = ("fever", "cough", "headache", "fatigue", "nausea", "rash", "chest pain", "dizziness",
+            "joint pain", "breathlessness", "abdominal pain", "thirst", "weight loss", "blurred vision")
+DIAGNOSES = ("Viral fever", "Type 2 diabetes", "Hypertension", "Tuberculosis", "Anemia", "Asthma",
+             "Typhoid", "Dengue", "Malaria", "Gastritis")
+
+
+def clustered_embeddings(rows, dim, clusters, rng):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + rng.normal(scale=0.6, size=(rows, dim)).astype(np.float32)
+
+
+def synthetic_metadata(row, rng, medicines):
+    symptoms = ", ".join(rng.choice(SYMPTOMS, size=3, replace=False))
+    medicine = medicines[int(rng.zipf(1.3)) % len(medicines)]
+    return prescription_metadata(f"PAT-{row % 5000:05d}", DIAGNOSES[row % len(DIAGNOSES)], symptoms,
+                                 [{"name": medicine, "instructions": "after food"}], "Dr. Rao", "2024-05-01")
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--medicines", type=int, default=5000, help="distinct medicine names")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    medicines = [f"Drug{i:05d} {rng.choice([250, 500, 650])}mg" for i in range(args.medicines)]
+    try:
+        db = VectorDatabase(db_path=f"{TMP_VAULT}/vectors")
+        started = time.perf_counter()
+        chunk = 20000
+        for start in range(0, args.rows, chunk):
+            count = min(chunk, args.rows - start)
+            db.add_many(clustered_embeddings(count, args.dim, 64, rng),
+                        [synthetic_metadata(start + i, rng, medicines) for i in range(count)])
+        db.compact()
+        print(f"loaded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        queries = clustered_embeddings(args.queries, args.dim, 64, rng)
+        terms = [medicines[int(i)] for i in rng.integers(0, len(medicines), args.queries)]
+        texts = [f"{', '.join(rng.choice(SYMPTOMS, size=2, replace=False))} on {term}" for term in terms]
+
+        for name, run in (("vector", lambda q, t: db.search(q, top_k=args.top_k)),
+                          ("hybrid", lambda q, t: db.hybrid_search(t, q, top_k=args.top_k))):
+            latencies, hits = [], 0
+            for query, text, term in zip(queries, texts, terms):
+                started = time.perf_counter()
+                results = run(query, text)
+                latencies.append(time.perf_counter() - started)
+                hits += sum(any(m["name"] == term for m in r["metadata"]["medicines"]) for r in results)
+            print(f"{name:<7} p50 {percentile_ms(latencies, 50):8.3f} ms  p95 {percentile_ms(latencies, 95):8.3f} ms  "
+                  f"term hits {hits / (args.queries * args.top_k):.2%}")
+        db.close()
+    finally:
+        shutil.rmtree(TMP_VAULT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Upload decode cost: full-resolution decode against image_ingest downscale-on-decode.
+
+Encodes a synthetic phone photo (smooth gradients plus noise, JPEG quality 90), then
+for each consumer size times the old path (PIL open + convert + np.array at full
+resolution) against image_ingest.decode, and reports the decoded array size and how
+far the fusion model's brightness risk moves.
+
+Usage (from backend/):
+    python benchmarks/image_ingest.py --megapixels 12 --repeat 10
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import image_ingest
+from app.models.fusion_model import MultiModalFusion
+
+
+def synthetic_photo(megapixels, rng):
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 200, y / height * 180, (x + y) / (width + height) * 220], axis=-1)
+    pixels = np.clip(base + rng.normal(scale=12, size=base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue(), (width, height)
+
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    data, size = synthetic_photo(args.megapixels, np.random.default_rng(23))
+    print(f"{size[0]}x{size[1]} JPEG, {len(data) / 1e6:.1f} MB encoded")
+
+    full_ms, full = best_ms(lambda: np.array(Image.open(io.BytesIO(data)).convert("RGB")), args.repeat)
+    print(f"  {'full decode':<12}{full_ms:8.1f} ms  {full.nbytes / 1e6:7.1f} MB  {full.shape}")
+
+    for consumer, max_side in image_ingest.MAX_SIDES.items():
+        ms, (array, report) = best_ms(lambda: image_ingest.decode(data, max_side), args.repeat)
+        print(f"  {consumer:<12}{ms:8.1f} ms  {array.nbytes / 1e6:7.1f} MB  {array.shape}"
+              f"  draft={report['draft']}  {full_ms / ms:5.1f}x")
+
+    fusion, _ = image_ingest.decode(data, image_ingest.MAX_SIDES["fusion"])
+    drift = abs(MultiModalFusion.image_risk(fusion) - MultiModalFusion.image_risk(full))
+    print(f"fusion brightness risk drift vs full resolution: {drift:.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+get_medical_history latency on a large synthetic database.
+
+Builds a throwaway medical_history.db with `--prescriptions` rows spread over
+`--patients` patients, plus one chronic patient with `--chronic-visits` visits, then
+times the indexed join path against the old per-prescription (N+1) lookup, the
+latter with and without the indexes.
+
+Usage (from backend/):
+    python benchmarks/medical_history.py --prescriptions 1000000
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_VAULT = tempfile.mkdtemp()
+os.environ["VAULT_BASE"] = TMP_VAULT
+
+from app.services import medical_db, migrations  # noqa: E402  (VAULT_BASE must be set first)
+
+CHRONIC_ID = "PAT-CHRONIC"
+
+
+def populate(conn, prescriptions: int, patients: int, chronic_visits: int, meds_per_visit: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    conn.executemany("INSERT INTO patients (patient_id, name, created_date, last_visit) VALUES (?, ?, '', '')",
+                     [(f"PAT-{i:06d}", f"Patient {i}") for i in range(patients)] + [(CHRONIC_ID, "Chronic")])
+
+    owners = rng.integers(0, patients, prescriptions - chronic_visits)
+    owner_ids = [f"PAT-{i:06d}" for i in owners] + [CHRONIC_ID] * chronic_visits
+    rng.shuffle(owner_ids)
+    chunk = 100000
+    for start in range(0, prescriptions, chunk):
+        rows = [(start + i + 1, pid, "Dr. Rao", "PHC", f"2024-{(start + i) % 12 + 1:02d}-{(start + i) % 28 + 1:02d}",
+                 "Fever", "fever, cough", 7)
+                for i, pid in enumerate(owner_ids[start:start + chunk])]
+        conn.executemany('''INSERT INTO prescriptions (id, patient_id, doctor_name, hospital_name, date,
+                            diagnosis, symptoms, duration_days) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        conn.executemany('''INSERT INTO medicines (prescription_id, name, dosage, frequency, duration, instructions)
+                            VALUES (?, 'Paracetamol', '500mg', 'TID', '5 days', 'after food')''',
+                         [(row[0],) for row in rows for _ in range(meds_per_visit)])
+    conn.executemany("INSERT INTO allergies (patient_id, allergen) VALUES (?, 'Penicillin')", [(CHRONIC_ID,)] * 2)
+    conn.executemany("INSERT INTO chronic_conditions (patient_id, condition_name) VALUES (?, 'Diabetes')",
+                     [(CHRONIC_ID,)])
+    conn.commit()
+
+
+def legacy_history(conn, patient_id: str) -> int:
+    """The pre-index implementation: one medicines query per prescription"""
+    c = conn.cursor()
+    c.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,))
+    c.fetchone()
+    c.execute('SELECT * FROM prescriptions WHERE patient_id = ? ORDER BY date DESC', (patient_id,))
+    rows = c.fetchall()
+    for pres in rows:
+        c.execute('SELECT * FROM medicines WHERE prescription_id = ?', (pres[0],))
+        c.fetchall()
+    c.execute('SELECT * FROM allergies WHERE patient_id = ?', (patient_id,))
+    c.fetchall()
+    c.execute('SELECT * FROM chronic_conditions WHERE patient_id = ?', (patient_id,))
+    c.fetchall()
+    return len(rows)
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prescriptions", type=int, default=1000000)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--chronic-visits", type=int, default=300)
+    parser.add_argument("--meds-per-visit", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-unindexed", action="store_true", help="skip the (slow) N+1 run without indexes")
+    args = parser.parse_args()
+
+    try:
+        medical_db.init_database()
+        conn = sqlite3.connect(medical_db.DB_PATH)
+        for statement in migrations.INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
+
+        started = time.perf_counter()
+        populate(conn, args.prescriptions, args.patients, args.chronic_visits, args.meds_per_visit)
+        print(f"populated {args.prescriptions} prescriptions / {args.patients} patients "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        if not args.skip_unindexed:
+            ms = timed(lambda: legacy_history(conn, CHRONIC_ID), 1)
+            print(f"{'N+1, no indexes':<22}: {ms:10.2f} ms  ({args.chronic_visits} visits)")
+
+        started = time.perf_counter()
+        for statement in migrations.INDEXES:
+            conn.execute(statement)
+        conn.commit()
+        print(f"indexes built in {time.perf_counter() - started:.1f}s")
+
+        ms = timed(lambda: legacy_history(conn, CHRONIC_ID), args.repeat)
+        print(f"{'N+1, indexed':<22}: {ms:10.2f} ms")
+        history = medical_db.get_medical_history(CHRONIC_ID)
+        assert history["total_prescriptions"] == args.chronic_visits
+        assert all(len(p["medicines"]) == args.meds_per_visit for p in history["prescriptions"])
+        # _load_medical_history bypasses the history cache, so this times the queries
+        ms = timed(lambda: medical_db._load_medical_history(CHRONIC_ID), args.repeat)
+        print(f"{'join, indexed':<22}: {ms:10.2f} ms")
+        ms = timed(lambda: medical_db._load_medical_history("PAT-000001"), args.repeat)
+        print(f"{'join, typical patient':<22}: {ms:10.2f} ms")
+        conn.close()
+    finally:
+        shutil.rmtree(TMP_VAULT, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Recall-vs-latency benchmark: IVF index against the exact scan.
+
+Usage (from backend/):
+    python benchmarks/vector_index.py --rows 1000000 --queries 200
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_store import VectorStore, normalize_rows
+from app.services.ann_index import IVFIndex, top_k_indices
+
+
+def clustered_embeddings(rows, dim, clusters, rng):
+    """Synthetic embeddings with topic structure, similar to symptom/diagnosis texts"""
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    return centers[labels] + rng.normal(scale=0.6, size=(rows, dim)).astype(np.float32)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, "vectors"), dim=args.dim)
+        for start in range(0, args.rows, 100000):
+            count = min(100000, args.rows - start)
+            store.append(clustered_embeddings(count, args.dim, 500, rng))
+        queries = normalize_rows(clustered_embeddings(args.queries, args.dim, 500, rng))
+        matrix = store.matrix
+
+        exact_times, truth = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            truth.append(set(top_k_indices(matrix @ q, args.top_k).tolist()))
+            exact_times.append(time.perf_counter() - t0)
+        print(f"rows={args.rows} dim={args.dim} top_k={args.top_k}")
+        print(f"exact      p50={percentile_ms(exact_times, 50)}ms p95={percentile_ms(exact_times, 95)}ms recall=1.000")
+
+        index = IVFIndex(os.path.join(tmp, "vectors.ivf.npz"), nlist=args.nlist, min_train_size=0)
+        t0 = time.perf_counter()
+        index.train(matrix)
+        print(f"ivf train  {time.perf_counter() - t0:.1f}s nlist={index.stats()['nlist']}")
+
+        for nprobe in args.nprobe:
+            times, hits = [], 0
+            for q, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                ids, _ = index.search(q, matrix, args.top_k, nprobe)
+                times.append(time.perf_counter() - t0)
+                hits += len(expected & set(ids.tolist()))
+            recall = hits / (len(queries) * args.top_k)
+            print(f"ivf np={nprobe:<3} p50={percentile_ms(times, 50)}ms p95={percentile_ms(times, 95)}ms recall={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory saved vs. recall lost for int8 scalar quantization of the embedding matrix.
+
+Runs on the vectors already in the vault (our data) when present, otherwise on
+synthetic clustered embeddings. Queries are sampled rows with added noise.
+
+Usage (from backend/):
+    VAULT_BASE=./nexus_vault python benchmarks/vector_quantization.py --queries 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vector_store import VectorStore, normalize_rows
+from app.services.vector_quantization import ScalarQuantizer
+from app.services.ann_index import top_k_indices
+
+
+def load_vectors(vault: str, synthetic_rows: int, dim: int, rng) -> tuple:
+    base = os.path.join(vault, "embeddings", "vectors")
+    if os.path.exists(f"{base}.json"):
+        store = VectorStore(base)
+        if len(store):
+            return np.array(store.matrix), f"vault ({base})"
+    centers = rng.normal(size=(500, dim)).astype(np.float32)
+    rows = centers[rng.integers(0, 500, synthetic_rows)] + rng.normal(scale=0.6, size=(synthetic_rows, dim)).astype(np.float32)
+    return normalize_rows(rows), "synthetic"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vault", default=os.getenv("VAULT_BASE", "./nexus_vault"))
+    parser.add_argument("--synthetic-rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 2, 4, 8])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    matrix, source = load_vectors(args.vault, args.synthetic_rows, 384, rng)
+    n, dim = matrix.shape
+    picks = rng.choice(n, min(args.queries, n), replace=False)
+    queries = normalize_rows(matrix[picks] + rng.normal(scale=0.05, size=(len(picks), dim)).astype(np.float32))
+
+    tmp = tempfile.mkdtemp()
+    try:
+        quantizer = ScalarQuantizer(os.path.join(tmp, "vectors"), dim, min_train_size=0)
+        quantizer.train(matrix)
+
+        float_bytes = matrix.nbytes
+        code_bytes = quantizer.codes.nbytes
+        print(f"source={source} rows={n} dim={dim} top_k={args.top_k}")
+        print(f"float32 matrix {float_bytes / 2**20:.1f} MiB, int8 codes {code_bytes / 2**20:.1f} MiB "
+              f"(saves {100 * (1 - code_bytes / float_bytes):.0f}%)")
+
+        truth, exact_times = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            truth.append(set(top_k_indices(matrix @ q, args.top_k).tolist()))
+            exact_times.append(time.perf_counter() - t0)
+        print(f"float32    recall=1.000 p50={np.median(exact_times) * 1000:.2f}ms")
+
+        for factor in args.rerank:
+            hits, times = 0, []
+            for q, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                approx = quantizer.scores(q)
+                ids = top_k_indices(approx, args.top_k * max(factor, 1))
+                if factor:
+                    ids = ids[top_k_indices(matrix[ids] @ q, args.top_k)]
+                times.append(time.perf_counter() - t0)
+                hits += len(expected & set(ids[:args.top_k].tolist()))
+            label = f"rerank x{factor}" if factor else "no rerank"
+            print(f"int8 {label:<10} recall={hits / (len(queries) * args.top_k):.3f} p50={np.median(times) * 1000:.2f}ms")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Stores opened by the app under test never land in ./nexus_vault
+os.environ.setdefault("VAULT_BASE", tempfile.mkdtemp(prefix="nexus_vault_test_"))
+
+from app.services import medical_db, migrations  # noqa: E402
+from app.services.sqlite_pool import SQLitePool  # noqa: E402
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """A migrated medical_history.db of its own, used by everything that calls medical_db.get_pool()"""
+    pool = SQLitePool(str(tmp_path / "medical_history.db"), size=2)
+    migrations.migrate(pool)
+    monkeypatch.setattr(medical_db, "get_pool", lambda: pool)
+    medical_db.history_cache.clear()
+    return pool
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    from app import main
+    return main
+
+
+@pytest.fixture
+def client(app_module, pool):
+    """TestClient without the startup hooks (the pool fixture stands in for the database)"""
+    from fastapi.testclient import TestClient
+    return TestClient(app_module.app)
@@ -0,0 +1,17 @@
+from app.services import analytics
+
+
+def diagnosis(risk, *codes):
+    return {"risk_level": risk, "diseases": [{"name": code, "icd10": code} for code in codes]}
+
+
+def test_multi_code_diagnosis_counts_once_outside_by_icd10(pool):
+    timestamp = analytics.datetime.now().isoformat()
+    analytics.record_diagnosis(diagnosis("MEDIUM", "E11.65", "R09.02"), "Guntur", 52, timestamp)
+    analytics.record_diagnosis(diagnosis("MEDIUM", "E11.65"), "Guntur", 47, timestamp)
+
+    counts = analytics.dashboard("Guntur")["diagnoses"]
+    assert counts["by_risk_level"] == [{"risk_level": "MEDIUM", "count": 2}]
+    assert sum(row["count"] for row in counts["by_age_band"]) == 2
+    assert sum(row["count"] for row in counts["by_week"]) == 2
+    assert {row["icd10"]: row["count"] for row in counts["by_icd10"]} == {"E11.65": 2, "R09.02": 1}
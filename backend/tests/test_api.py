@@ -0,0 +1,174 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.services import medical_db, vector_db
+from app.services.vector_db import VectorDatabase
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A vector store of its own in place of the app's singleton (which would hold VAULT_BASE's lock)"""
+    db = VectorDatabase(db_path=str(tmp_path / "vectors"))
+    monkeypatch.setattr(vector_db, "_vector_db", db)
+    yield db
+    db.close()
+
+
+def test_metrics_open_stores_off_the_event_loop(client, store, monkeypatch):
+    opened_on = []
+    get_embedding_cache = vector_db.get_embedding_cache
+
+    def recording_get_embedding_cache():
+        opened_on.append(threading.current_thread().name)
+        return get_embedding_cache()
+
+    monkeypatch.setattr(vector_db, "get_embedding_cache", recording_get_embedding_cache)
+    metrics = client.get("/api/metrics").json()
+
+    assert opened_on and all(name.startswith("io") for name in opened_on)
+    assert {"vector_db", "embedding_cache", "executors"} <= set(metrics)
+    assert set(metrics["executors"]) == {"io", "model", "cpu"}
+
+
+def add_prescriptions(pool, patient_id, dates):
+    with pool.write() as conn:
+        ids = [conn.execute("INSERT INTO prescriptions (patient_id, date, diagnosis) VALUES (?, ?, ?)",
+                            (patient_id, date, f"visit {i}")).lastrowid for i, date in enumerate(dates)]
+        conn.executemany("INSERT INTO medicines (prescription_id, name) VALUES (?, ?)",
+                         [(pid, f"med {pid}") for pid in ids])
+    return ids
+
+
+def test_keyset_pages_cover_every_prescription_once_including_same_date_ties(client, pool):
+    # Three rows share a timestamp, so the id tie-break decides where a page ends
+    dates = [f"2024-01-{day:02d}T09:00:00" for day in range(1, 8)] + ["2024-01-05T09:00:00"] * 2
+    ids = add_prescriptions(pool, "P1", dates)
+    add_prescriptions(pool, "P2", ["2024-01-03T09:00:00"])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "fields": "prescription_id,date,medicines", **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/medical-history/P1/prescriptions", params=params).json()
+        assert "error" not in page and len(page["prescriptions"]) <= 2
+        seen += page["prescriptions"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(p["prescription_id"] for p in seen) == sorted(ids)
+    keys = [(p["date"], p["prescription_id"]) for p in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert all(p["medicines"] == [{"name": f"med {p['prescription_id']}", "dosage": None, "frequency": None,
+                                   "duration": None, "instructions": None}] for p in seen)
+
+    january_5 = client.get("/api/medical-history/P1/prescriptions",
+                           params={"date_from": "2024-01-05", "date_to": "2024-01-05", "fields": "date"}).json()
+    assert [p["date"] for p in january_5["prescriptions"]] == ["2024-01-05T09:00:00"] * 3
+
+    bad = client.get("/api/medical-history/P1/prescriptions", params={"fields": "date,password"}).json()
+    assert bad["prescriptions"] == [] and "Unknown fields" in bad["error"]
+
+
+def test_ndjson_stream_reads_every_page(client, pool):
+    ids = add_prescriptions(pool, "P1", [f"2024-02-{day:02d}T10:00:00" for day in range(1, 26)])
+
+    response = client.get("/api/medical-history/P1/stream", params={"page_size": 4, "fields": "prescription_id,diagnosis"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["prescription_id"] for row in rows] == sorted(ids, reverse=True)
+    assert set(rows[0]) == {"prescription_id", "diagnosis"}
+
+
+class FakeFusionModel:
+    def predict(self, image, patient_data):
+        return {
+            "risk_level": "MEDIUM", "risk_score": 5, "confidence": 0.8, "triage": "YELLOW",
+            "diseases": [{"name": "Type 2 diabetes", "probability": 0.7, "icd10": "E11.9"}],
+            "feature_importance": {"glucose": 0.6}, "treatment_plan": {"steps": []}, "treatment_cost": 5000,
+        }
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def stubbed_models(app_module, monkeypatch):
+    """Diagnosis, LLM and Ollama stand-ins; the story stub records whether it was told to stop"""
+    calls = {"story_stopped": threading.Event(), "story_started": threading.Event()}
+    monkeypatch.setattr(app_module, "fusion_model", FakeFusionModel())
+
+    def analyze_and_translate(diagnosis, patient_data, language):
+        time.sleep(calls.get("translation_delay", 0.1))
+        return {"explanation": "translated", "diet_tips": ["millets"], "medication_guide": "after food"}
+
+    def stream_farm_story(diagnosis, language, on_token, cancelled):
+        calls["story_started"].set()
+        for token in ("Once ", "upon"):
+            on_token(token)
+        if calls.get("story_blocks") and cancelled.wait(5):
+            calls["story_stopped"].set()
+        return "Once upon"
+
+    monkeypatch.setattr(app_module.llm_service, "analyze_and_translate", analyze_and_translate)
+    monkeypatch.setattr(app_module.ollama_service, "stream_farm_story", stream_farm_story)
+    return calls
+
+
+def test_diagnose_stream_sends_triage_then_model_text(client, stubbed_models):
+    response = client.post("/api/diagnose/stream", data={"language": "en", "symptoms": "thirst"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+
+    assert names[0] == "triage" and names[-1] == "done"
+    assert events[0][1]["risk"] == "MEDIUM" and events[0][1]["diseases"][0]["icd10"] == "E11.9"
+    assert names.index("triage") < names.index("explanation")
+    tokens = [data["text"] for name, data in events if name == "farmStoryToken"]
+    assert tokens == ["Once ", "upon"] and names.index("farmStoryToken") < names.index("farmStory")
+    explanation = dict(events)["explanation"]
+    assert explanation["explanation"] == "translated" and explanation["status"] == "ok"
+    assert dict(events)["farmStory"] == {"farmStory": "Once upon", "status": "ok"}
+    assert {stage["status"] for stage in dict(events)["done"]["stages"].values()} == {"ok"}
+
+
+def test_diagnose_stream_uses_the_fallback_when_translation_misses_its_deadline(
+        client, app_module, stubbed_models, monkeypatch):
+    translation = next(s for s in app_module.diagnose_stream_graph.stages if s.name == "translation")
+    monkeypatch.setattr(translation, "timeout", 0.05)
+    stubbed_models["translation_delay"] = 0.5
+
+    events = dict(parse_sse(client.post("/api/diagnose/stream", data={"language": "hi"}).text))
+
+    assert events["explanation"]["status"] == "timeout"
+    fallback = app_module.llm_service._smart_mock_response(FakeFusionModel().predict(None, None), "hi")
+    assert events["explanation"]["explanation"] == fallback["explanation"]
+    assert events["done"]["stages"]["translation"]["status"] == "timeout"
+    assert events["done"]["stages"]["farm_story"]["status"] == "ok"
+
+
+def test_diagnose_stream_stops_the_story_when_the_client_disconnects(app_module, pool, stubbed_models):
+    stubbed_models["story_blocks"] = True
+
+    async def main():
+        response = await app_module.diagnose_stream(
+            image=None, lab_report=None, glucose=120, heart_rate=80, systolic=120, diastolic=80, spo2=98,
+            temperature=98.6, age=45, gender="Female", symptoms="", income=25000, language="en", district="")
+        body = response.body_iterator
+        first = await body.__anext__()
+        assert first.startswith("event: triage")
+        while not stubbed_models["story_started"].is_set():
+            await asyncio.sleep(0.01)
+        # What Starlette does when the client goes away mid-stream
+        await body.aclose()
+        return await asyncio.get_running_loop().run_in_executor(None, stubbed_models["story_stopped"].wait, 2)
+
+    assert asyncio.run(main())
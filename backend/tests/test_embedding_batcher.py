@@ -0,0 +1,68 @@
+import time
+import asyncio
+import threading
+
+import numpy as np
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def slow_encoder(release: threading.Event):
+    def encode(texts):
+        release.wait(5)
+        return np.array([[float(len(text))] for text in texts])
+    return encode
+
+
+def test_cancelled_waiter_does_not_stop_the_worker():
+    release = threading.Event()
+    batcher = EmbeddingBatcher(slow_encoder(release), max_wait_ms=1)
+
+    async def scenario():
+        # First caller gives up while its batch is still encoding
+        try:
+            await asyncio.wait_for(batcher.embed_async("first"), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        release.set()
+        return await asyncio.wait_for(batcher.embed_async("second!"), 5)
+
+    assert asyncio.run(scenario()) == [7.0]
+    assert batcher._thread.is_alive()
+
+
+def test_waiter_cancelled_while_queued_is_skipped():
+    release = threading.Event()
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        release.wait(5)
+        return np.array([[float(len(text))] for text in texts])
+
+    batcher = EmbeddingBatcher(encode, max_wait_ms=1)
+    busy = batcher.submit("busy")
+    time.sleep(0.05)
+    queued = batcher.submit("dropped")
+    assert queued.cancel()
+    release.set()
+
+    assert busy.result(5) == [4.0]
+    assert batcher.embed("kept") == [4.0]
+    assert ["dropped"] not in calls
+
+
+def test_encoder_failure_is_reported_and_worker_survives():
+    def encode(texts):
+        if "boom" in texts:
+            raise RuntimeError("encoder down")
+        return np.array([[1.0] for _ in texts])
+
+    batcher = EmbeddingBatcher(encode, max_wait_ms=1)
+    failed = batcher.submit("boom")
+    try:
+        failed.result(5)
+        raise AssertionError("expected the encoder error")
+    except RuntimeError as e:
+        assert "encoder down" in str(e)
+    assert batcher.embed("fine") == [1.0]
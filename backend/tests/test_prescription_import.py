@@ -0,0 +1,45 @@
+import json
+
+from app.services import medical_db, prescription_import, text_search
+
+CSV = (
+    "patient_id,date,doctor_name,diagnosis,symptoms,medicines,patient_name\r\n"
+    'P1,2024-03-01,Dr. Rao,Type 2 diabetes,thirst,"[{""name"": ""Metformin"", ""dosage"": ""500mg""}]",Ramesh\r\n'
+    "P2,2024-03-02,Dr. Rao,Hypertension,headache,Amlodipine;Telmisartan,Lakshmi\r\n"
+    "P3,not-a-date,Dr. Rao,Fever,,,\r\n"
+    "P4,2024-03-04,Dr. Rao,Anaemia,fatigue,Ferrous sulphate,Sūrya\r\n"
+)
+
+
+def test_import_endpoint_reads_the_multipart_upload(client):
+    response = client.post("/api/prescriptions/import", files={"file": ("records.csv", CSV.encode("utf-8"))},
+                           data={"batch_size": "2"}).json()
+
+    assert response["success"], response
+    assert (response["imported"], response["rejected"], response["batches"]) == (3, 1, 2)
+    assert response["rejected_samples"] == [{"line": 4, "error": "invalid date 'not-a-date'"}]
+
+    history = medical_db.get_medical_history("P2")
+    assert [m["name"] for m in history["prescriptions"][0]["medicines"]] == ["Amlodipine", "Telmisartan"]
+    assert medical_db.get_medical_history("P4")["patient_info"]["name"] == "Sūrya"
+    # Medicines written after their prescription still reach the search index
+    hits = text_search.search("telmisartan")["results"]
+    assert [(hit["kind"], hit["patient_id"]) for hit in hits] == [("prescription", "P2")]
+
+
+def test_imported_ids_never_reuse_a_deleted_prescription(pool):
+    deleted = medical_db.add_prescription("P1", "Dr. Rao", "PHC", "Cough", "cough", [{"name": "Syrup"}])
+    with pool.write() as conn:
+        conn.execute("DELETE FROM medicines WHERE prescription_id = ?", (deleted,))
+        conn.execute("DELETE FROM prescriptions WHERE id = ?", (deleted,))
+
+    lines = [json.dumps({"patient_id": "P9", "date": "2024-01-0%d" % day, "medicines": ["Paracetamol"]})
+             for day in (1, 2)]
+    report = prescription_import.import_prescriptions(lines, "jsonl")
+    assert report["imported"] == 2
+
+    with pool.connection() as conn:
+        rows = conn.execute('''SELECT p.id, m.name FROM prescriptions p
+                               JOIN medicines m ON m.prescription_id = p.id ORDER BY p.id''').fetchall()
+    assert [name for _, name in rows] == ["Paracetamol", "Paracetamol"]
+    assert all(prescription_id > deleted for prescription_id, _ in rows)
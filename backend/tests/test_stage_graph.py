@@ -0,0 +1,94 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import executors
+from app.services.executors import ManagedPool
+from app.services.stage_graph import Stage, StageGraph
+
+
+async def value(v, delay=0.0):
+    await asyncio.sleep(delay)
+    return v
+
+
+async def fail(ctx):
+    raise RuntimeError("backend down")
+
+
+def test_timeout_and_error_use_fallbacks_and_keep_the_rest():
+    graph = StageGraph("t", [
+        Stage("diagnosis", lambda ctx: value("flu")),
+        Stage("translation", lambda ctx: value("slow", 5), after=["diagnosis"], timeout=0.05,
+              fallback=lambda ctx: "untranslated " + ctx["diagnosis"]),
+        Stage("story", fail, after=["diagnosis"], fallback=lambda ctx: None),
+        Stage("audit", lambda ctx: value("saved"), after=["diagnosis"]),
+    ])
+    seen = []
+    context, report = asyncio.run(graph.run({}, on_stage=lambda name, result, r: seen.append((name, r["status"]))))
+
+    assert context["translation"] == "untranslated flu"
+    assert context["story"] is None
+    assert context["audit"] == "saved"
+    assert {name: r["status"] for name, r in report.items()} == {
+        "diagnosis": "ok", "translation": "timeout", "story": "error", "audit": "ok"}
+    assert report["translation"]["ms"] < 1000
+    assert seen[0] == ("diagnosis", "ok") and len(seen) == 4
+    stats = graph.stats()
+    assert stats["translation"]["timeouts"] == 1 and stats["story"]["errors"] == 1
+
+
+def test_required_stage_error_fails_the_run():
+    graph = StageGraph("t", [
+        Stage("diagnosis", fail),
+        Stage("translation", lambda ctx: value("x"), after=["diagnosis"], fallback=lambda ctx: None),
+    ])
+    with pytest.raises(RuntimeError, match="backend down"):
+        asyncio.run(graph.run({}))
+
+
+def test_undeclared_dependency_is_rejected():
+    with pytest.raises(ValueError, match="undeclared"):
+        StageGraph("t", [Stage("translation", lambda ctx: value("x"), after=["diagnosis"])])
+
+
+def test_abandoned_model_calls_do_not_hold_io_workers(monkeypatch):
+    release = threading.Event()
+    started_calls = []
+
+    def slow_model_call():
+        started_calls.append(1)
+        release.wait(5)
+
+    model_pool = ManagedPool("model", lambda: ThreadPoolExecutor(max_workers=2), 2)
+    io_pool = ManagedPool("io", lambda: ThreadPoolExecutor(max_workers=2), 2)
+    monkeypatch.setattr(executors, "model_pool", model_pool)
+    monkeypatch.setattr(executors, "io_pool", io_pool)
+
+    graph = StageGraph("t", [
+        Stage("story", lambda ctx: executors.run_model(slow_model_call), timeout=0.05, fallback=lambda ctx: None),
+    ])
+
+    async def main():
+        # More abandoned calls than either pool has workers
+        for _ in range(4):
+            _, report = await graph.run({})
+            assert report["story"]["status"] == "timeout"
+        started = time.perf_counter()
+        assert await executors.run_io(lambda: "io") == "io"
+        return time.perf_counter() - started
+
+    try:
+        assert asyncio.run(main()) < 1
+        # Calls still queued when their stage timed out were cancelled, not left to run
+        assert model_pool.stats()["in_flight"] == 0
+        release.set()
+        time.sleep(0.2)
+        assert len(started_calls) == 2
+    finally:
+        release.set()
+        model_pool.shutdown()
+        io_pool.shutdown()
@@ -0,0 +1,31 @@
+from app.services import medical_db, text_search
+
+
+def test_ranks_every_match_and_pages_through_all_of_them(pool):
+    best = medical_db.add_prescription("P1", "Dr. Rao", "PHC", "Metformin intolerance", "nausea on metformin",
+                                       [{"name": "Metformin", "dosage": "500mg"}])
+    for i in range(30):
+        medical_db.add_learning_data(f"P{i + 2}", f"fever and cough for {i} days, earlier on metformin",
+                                     "Viral fever", 0.7, False, None)
+
+    first = text_search.search("metformin", limit=10)
+    assert (first["results"][0]["kind"], first["results"][0]["id"]) == ("prescription", best)
+
+    seen, cursor = [], None
+    while True:
+        page = text_search.search("metformin", limit=10, cursor=cursor)
+        seen += [(row["kind"], row["id"]) for row in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 31
+
+
+def test_short_last_token_is_matched_as_a_word_not_a_prefix(pool):
+    medical_db.add_learning_data("P1", "metformin since march", "Type 2 diabetes", 0.8, False, None)
+    medical_db.add_learning_data("P2", "me too, mild fever", "Viral fever", 0.7, False, None)
+
+    assert text_search.build_match("metformin me") == '"metformin" "me"'
+    assert text_search.build_match("met") == '"met"*'
+    assert [row["patient_id"] for row in text_search.search("me")["results"]] == ["P2"]
+    assert [row["patient_id"] for row in text_search.search("met")["results"]] == ["P1"]
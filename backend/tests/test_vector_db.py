@@ -0,0 +1,174 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.ann_index import IVFIndex
+from app.services.vector_db import StoreLockedError, VectorDatabase
+from app.services.vector_quantization import ScalarQuantizer
+from app.services.vector_store import EMBEDDING_DIM
+
+
+def rows(n, seed):
+    return np.random.default_rng(seed).random((n, EMBEDDING_DIM), dtype=np.float32)
+
+
+def test_inserts_proceed_during_compaction_and_survive_reopen(tmp_path):
+    path = str(tmp_path / "vectors")
+    db = VectorDatabase(db_path=path)
+    db.add_many(rows(3, 1), [{"type": "prescription", "patient_id": f"P{i}"} for i in range(3)])
+
+    flushing, release = threading.Event(), threading.Event()
+    flush = db.store.flush
+
+    def slow_flush(count=None):
+        flushing.set()
+        release.wait(5)
+        flush(count)
+
+    db.store.flush = slow_flush
+    compaction = threading.Thread(target=db.compact)
+    compaction.start()
+    assert flushing.wait(5)
+
+    # The flush is stalled: an insert must not wait for it
+    inserted = threading.Thread(target=db.add, args=(rows(1, 2)[0], {"type": "prescription", "patient_id": "P3"}))
+    inserted.start()
+    inserted.join(2)
+    assert not inserted.is_alive()
+
+    release.set()
+    compaction.join(5)
+    assert db.wal.records == 1  # the insert after the snapshot stays in the WAL
+    db.close()
+
+    reopened = VectorDatabase(db_path=path)
+    assert len(reopened) == 4
+    assert reopened.get_metadata(3)["patient_id"] == "P3"
+    reopened.close()
+
+
+def test_ivf_trains_in_the_background(tmp_path, monkeypatch):
+    training, release = threading.Event(), threading.Event()
+    train = IVFIndex.train
+
+    def slow_train(self, matrix, *args, **kwargs):
+        training.set()
+        release.wait(5)
+        train(self, matrix, *args, **kwargs)
+
+    monkeypatch.setattr(IVFIndex, "train", slow_train)
+    db = VectorDatabase(db_path=str(tmp_path / "vectors"), index_type="ivf")
+    n = db.index.min_train_size
+    vectors = rows(n, 3)
+    db.add_many(vectors, [{"type": "learning_data"} for _ in range(n)])
+    assert training.wait(5)
+
+    # Training is stalled: inserts and (exact) searches still go through
+    db.add(rows(1, 4)[0], {"type": "learning_data", "patient_id": "late"})
+    assert not db.index.is_trained
+    assert db.search(vectors[0], top_k=1)[0]["similarity"] > 0.99
+
+    release.set()
+    for _ in range(100):
+        if db.index.is_trained:
+            break
+        time.sleep(0.05)
+    assert db.index.is_trained and db.index.count == n + 1
+    assert db.search(vectors[0], top_k=1)[0]["similarity"] > 0.99
+    db.close()
+
+
+def test_searches_during_grow_see_a_consistent_matrix(tmp_path):
+    db = VectorDatabase(db_path=str(tmp_path / "vectors"), index_type="exact", storage="float32")
+    vectors = rows(4096, 5)
+    db.add(vectors[0], {"type": "learning_data"})
+    errors, done = [], threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                db.search(vectors[0], top_k=3)
+                db.search(vectors[0], top_k=3, filters={"type": "learning_data"})
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    # Capacity starts at 1024 rows and doubles, so this grows the mapping several times
+    for start in range(1, len(vectors), 8):
+        db.add_many(vectors[start:start + 8], [{"type": "learning_data"}] * len(vectors[start:start + 8]))
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert db.store.capacity >= len(vectors)
+    db.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_quantizer_retrains_in_the_background_and_swaps_codes_in(tmp_path, monkeypatch):
+    gate = threading.Semaphore(0)
+    train = ScalarQuantizer.train
+
+    def gated_train(self, matrix, *args, **kwargs):
+        gate.acquire(timeout=5)
+        train(self, matrix, *args, **kwargs)
+
+    monkeypatch.setattr(ScalarQuantizer, "train", gated_train)
+    path = str(tmp_path / "vectors")
+    db = VectorDatabase(db_path=path, index_type="exact", storage="int8")
+    n = db.quantizer.min_train_size
+    vectors = rows(2 * n, 6)
+    db.add_many(vectors[:n], [{"type": "learning_data"}] * n)
+    gate.release()
+    assert wait_for(lambda: db.quantizer.is_trained and not db._quantizer_retrain_pending)
+    first = db.quantizer
+    assert first.trained_size == n and len(first) == n
+
+    # Crossing retrain_factor schedules a retrain; it is stalled, and meanwhile the
+    # current codes keep up with inserts and serve quantized searches
+    first.retrain_factor = 2
+    db.add_many(vectors[n:], [{"type": "learning_data"}] * n)
+    assert wait_for(lambda: db._quantizer_retrain_pending)
+    assert db.quantizer is first and len(first) == 2 * n
+    assert first.trained_size == n
+    hit = db.search(vectors[n + 7], top_k=1)[0]
+    assert hit["similarity"] > 0.99
+
+    gate.release()
+    assert wait_for(lambda: db.quantizer is not first and not db._quantizer_retrain_pending)
+    assert db.quantizer.trained_size == 2 * n and len(db.quantizer) == 2 * n
+    assert db.quantizer.params_path == first.params_path
+    assert not list(tmp_path.glob("*.retrain.*"))
+    db.compact()
+    db.close()
+
+    reopened = VectorDatabase(db_path=path, index_type="exact", storage="int8")
+    assert reopened.quantizer.trained_size == 2 * n and len(reopened.quantizer) == 2 * n
+    assert reopened.search(vectors[3], top_k=1)[0]["similarity"] > 0.99
+    reopened.close()
+
+
+def test_second_worker_refuses_to_start_while_the_store_is_held(app_module, pool, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.services import vector_db
+
+    monkeypatch.setattr(vector_db, "_vector_db", None)
+    owner = VectorDatabase()  # the first worker's store (default path under VAULT_BASE)
+    try:
+        with pytest.raises(StoreLockedError):
+            with TestClient(app_module.app):
+                pass
+    finally:
+        owner.close()
+    assert vector_db._vector_db is None